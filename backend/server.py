@@ -1,26 +1,54 @@
 from fastapi import FastAPI, APIRouter, File, UploadFile, HTTPException
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.responses import JSONResponse, FileResponse, PlainTextResponse, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from bson import ObjectId
 import os
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, Tuple
 import uuid
 from datetime import datetime
 import pandas as pd
 import numpy as np
-from sklearn.cluster import KMeans, DBSCAN, AgglomerativeClustering
+from sklearn.cluster import KMeans, MiniBatchKMeans, DBSCAN, AgglomerativeClustering, Birch
 from sklearn.mixture import GaussianMixture
 from sklearn.preprocessing import StandardScaler, RobustScaler
 from sklearn.decomposition import PCA
-from sklearn.metrics import silhouette_score, davies_bouldin_score, calinski_harabasz_score
+from sklearn.neighbors import NearestNeighbors
+from sklearn.metrics import silhouette_samples, davies_bouldin_score, calinski_harabasz_score, adjusted_rand_score
+from sklearn.metrics.pairwise import euclidean_distances
+from sklearn import config_context
 from sklearn.model_selection import cross_val_score
 import io
 import json
+import orjson
+import asyncio
+import shutil
+import functools
+import hashlib
+import base64
+import multiprocessing
+from multiprocessing import shared_memory
+import contextlib
+import resource
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+from contextvars import ContextVar
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from threadpoolctl import threadpool_limits
+from starlette.concurrency import run_in_threadpool
+import pyarrow as pa
+import pyarrow.parquet as pq
 from scipy import stats
+from scipy.cluster.hierarchy import linkage, fcluster, dendrogram
+from scipy.optimize import minimize
+from scipy.special import gammaln, hyp2f1
 from scipy.stats import zscore
 import warnings
 warnings.filterwarnings('ignore')
@@ -39,6 +67,122 @@ app = FastAPI(title="Retail Analytics & Customer Segmentation Platform", version
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
 
+# Ingestion settings
+UPLOAD_CHUNK_ROWS = int(os.environ.get('UPLOAD_CHUNK_ROWS', '50000'))
+CUSTOMER_MERGE_FANOUT = int(os.environ.get('CUSTOMER_MERGE_FANOUT', '8'))
+REQUIRED_COLUMNS = ['customer_id', 'order_id', 'order_date', 'product_id', 'quantity', 'unit_price', 'total_amount']
+ID_COLUMN_DTYPES = {'customer_id': str, 'order_id': str, 'product_id': str}
+NUMERIC_COLUMNS = ['quantity', 'unit_price', 'total_amount']
+
+# Columnar dataset store (one directory of Parquet files per dataset)
+DATASET_STORE_DIR = Path(os.environ.get('DATASET_STORE_DIR', ROOT_DIR / 'dataset_store'))
+
+# Column types and value sets for loaded datasets
+DATA_DICTIONARY_PATH = Path(os.environ.get('DATA_DICTIONARY_PATH', ROOT_DIR.parent / 'data_dictionary.json'))
+
+# Clustering settings
+ANALYSIS_MAX_WORKERS = int(os.environ.get('ANALYSIS_MAX_WORKERS', os.cpu_count() or 1))
+KMEANS_K_RANGE = range(2, 11)
+MINIBATCH_KMEANS_THRESHOLD = int(os.environ.get('MINIBATCH_KMEANS_THRESHOLD', '100000'))
+KMEANS_MODES = ['auto', 'full', 'minibatch', 'streaming']
+DEFAULT_N_CLUSTERS = 5
+CLUSTERING_METHODS = ['kmeans', 'hierarchical', 'dbscan', 'gmm']
+GMM_SAMPLE_SIZE = int(os.environ.get('GMM_SAMPLE_SIZE', '100000'))
+
+# Hierarchical clustering settings
+HIERARCHICAL_EXACT_MAX = int(os.environ.get('HIERARCHICAL_EXACT_MAX', '10000'))
+HIERARCHICAL_MODES = ['auto', 'exact', 'birch', 'streaming']
+BIRCH_THRESHOLD = float(os.environ.get('BIRCH_THRESHOLD', '0.5'))
+BIRCH_SAMPLE_SIZE = int(os.environ.get('BIRCH_SAMPLE_SIZE', '200000'))
+BIRCH_MAX_SUBCLUSTERS = int(os.environ.get('BIRCH_MAX_SUBCLUSTERS', '2000'))
+DENDROGRAM_LEAVES = 30
+
+# Streaming clustering settings
+STREAMING_BATCH_SIZE = int(os.environ.get('STREAMING_BATCH_SIZE', '100000'))
+STREAMING_SAMPLE_SIZE = int(os.environ.get('STREAMING_SAMPLE_SIZE', '100000'))
+STREAMING_MAX_BIRCH_PASSES = 5
+
+# Density clustering settings
+DBSCAN_MIN_SAMPLES = 5
+DBSCAN_SAMPLE_SIZE = int(os.environ.get('DBSCAN_SAMPLE_SIZE', '20000'))
+DBSCAN_EPS_FACTORS = [0.5, 0.75, 1.0, 1.25, 1.5]
+DBSCAN_MAX_NOISE_FRACTION = 0.5
+DBSCAN_SWEEP_SILHOUETTE_SAMPLE = 5000
+DBSCAN_MAX_MEAN_NEIGHBORS = int(os.environ.get('DBSCAN_MAX_MEAN_NEIGHBORS', '200'))
+DBSCAN_DENSITY_PROBES = 200
+K_DISTANCE_POINTS = 200
+
+# Cluster quality metrics settings
+SILHOUETTE_EXACT_MAX = int(os.environ.get('SILHOUETTE_EXACT_MAX', '20000'))
+SILHOUETTE_SAMPLE_SIZE = int(os.environ.get('SILHOUETTE_SAMPLE_SIZE', '10000'))
+METRICS_WORKING_MEMORY_MB = int(os.environ.get('METRICS_WORKING_MEMORY_MB', '256'))
+METRICS_MODES = ['auto', 'exact', 'sampled']
+MAX_BOOTSTRAP_SAMPLES = int(os.environ.get('MAX_BOOTSTRAP_SAMPLES', '10000'))
+
+# Partitioned RFM aggregation settings
+RFM_PARTITIONS = min(int(os.environ.get('RFM_PARTITIONS', ANALYSIS_MAX_WORKERS)), 2 ** 16)
+RFM_PARTITION_MIN_ROWS = int(os.environ.get('RFM_PARTITION_MIN_ROWS', '500000'))
+
+# RFM snapshot settings
+RFM_SNAPSHOT_INTERVALS = {
+    'week': pd.DateOffset(weeks=1),
+    'month': pd.DateOffset(months=1),
+    'quarter': pd.DateOffset(months=3)
+}
+RFM_MAX_SNAPSHOTS = 120
+
+# Background analysis settings
+ANALYSIS_MAX_CONCURRENCY = int(os.environ.get('ANALYSIS_MAX_CONCURRENCY', '2'))
+MAX_RETAINED_JOBS = int(os.environ.get('MAX_RETAINED_JOBS', '500'))
+
+# Analysis result cache settings
+ANALYSIS_CACHE_MAX_BYTES = int(os.environ.get('ANALYSIS_CACHE_MAX_BYTES', str(256 * 1024 * 1024)))
+
+# Legacy sales_data loading
+MONGO_BATCH_SIZE = int(os.environ.get('MONGO_BATCH_SIZE', '10000'))
+SALES_COLUMN_TYPES = {
+    'order_date': 'datetime',
+    'quantity': 'float',
+    'unit_price': 'float',
+    'total_amount': 'float'
+}
+
+# Listing pagination settings
+MAX_PAGE_SIZE = 1000
+ANALYSIS_LIST_EXCLUDED_FIELDS = ['response']
+
+# Segmentation model settings
+SEGMENTATION_MODEL_CACHE_SIZE = int(os.environ.get('SEGMENTATION_MODEL_CACHE_SIZE', '64'))
+
+# Customer lifetime value settings
+CLV_FIT_SAMPLE_SIZE = int(os.environ.get('CLV_FIT_SAMPLE_SIZE', '200000'))
+CLV_SCORING_CHUNK_SIZE = int(os.environ.get('CLV_SCORING_CHUNK_SIZE', '500000'))
+
+# Cluster label delivery settings
+CLUSTER_LABEL_FORMATS = ['json', 'ndjson', 'arrow']
+LABELS_MAX_PAGE_SIZE = 100000
+LABELS_STREAM_BATCH_SIZE = 65536
+
+# Quantile sketch settings
+QUANTILE_SKETCH_ERROR = float(os.environ.get('QUANTILE_SKETCH_ERROR', '0.005'))
+QUANTILE_SKETCH_K = max(8, int(np.ceil(4 / QUANTILE_SKETCH_ERROR)))
+QUANTILE_SKETCH_CHUNK_SIZE = 100000
+QUANTILE_MODES = ['exact', 'sketch']
+
+# Instrumentation settings
+STAGE_DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+STAGE_ROW_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000, 100000000)
+PEAK_RSS_BUCKETS = tuple(2 ** power * 1024 * 1024 for power in range(6, 16))
+STAGE_MEMORY_BUCKETS = tuple(4 ** power * 1024 * 1024 for power in range(8))
+STAGE_MEMORY_SAMPLE_SECONDS = float(os.environ.get('STAGE_MEMORY_SAMPLE_SECONDS', '0.01'))
+
+# Columns each analysis needs from the transactions table
+RFM_COLUMNS = ['customer_id', 'order_id', 'order_date', 'total_amount']
+ANALYSIS_COLUMNS = {
+    'rfm': RFM_COLUMNS,
+    'clustering': RFM_COLUMNS
+}
+
 # Pydantic Models
 class DatasetInfo(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -49,6 +193,7 @@ class DatasetInfo(BaseModel):
     date_range: Dict[str, str]
     columns: List[str]
     data_quality_score: float
+    data_version: int = 1
 
 class SegmentationResult(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -70,6 +215,26 @@ class RFMAnalysis(BaseModel):
     segment_characteristics: Dict[str, Any]
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
+class CustomerFeatures(BaseModel):
+    customer_id: str
+    recency: float
+    frequency: float
+    monetary: float
+
+class ScoringRequest(BaseModel):
+    customers: List[CustomerFeatures]
+
+class AnalysisJob(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    kind: str
+    dataset_id: str
+    parameters: Dict[str, Any]
+    status: str = 'queued'  # queued, running, completed, failed, cancelled
+    error: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
 class CustomerSegment(BaseModel):
     customer_id: str
     segment: str
@@ -80,74 +245,1134 @@ class CustomerSegment(BaseModel):
     clv_prediction: Optional[float] = None
     churn_probability: Optional[float] = None
 
+# Instrumentation
+# Each analysis request carries a StageTimer in a context variable. Stages run in the
+# analysis process pool are timed there and shipped back with the result. Memory is
+# the resident set size sampled while a stage runs, against its size at stage start;
+# stages of concurrent requests in one process share the process-wide samples.
+def peak_rss_bytes() -> int:
+    """High-water resident set size of this process"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def current_rss_bytes() -> int:
+    """Resident set size of this process now, or its high-water mark where /proc is unavailable"""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return peak_rss_bytes()
+
+class RssSampler:
+    """Background thread sampling this process's RSS into every open measurement window"""
+
+    def __init__(self, interval: float = STAGE_MEMORY_SAMPLE_SECONDS):
+        self.interval = interval
+        self._windows: List[Dict[str, int]] = []
+        self._lock = threading.Lock()
+        self._active = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def open(self) -> Dict[str, int]:
+        rss = current_rss_bytes()
+        window = {'start': rss, 'peak': rss}
+        with self._lock:
+            self._windows.append(window)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='rss-sampler', daemon=True)
+                self._thread.start()
+        self._active.set()
+        return window
+
+    def close(self, window: Dict[str, int]) -> Dict[str, int]:
+        rss = current_rss_bytes()
+        with self._lock:
+            self._windows = [open_window for open_window in self._windows if open_window is not window]
+            window['peak'] = max(window['peak'], rss)
+            if not self._windows:
+                self._active.clear()
+        return window
+
+    def _run(self):
+        while True:
+            self._active.wait()
+            time.sleep(self.interval)
+            rss = current_rss_bytes()
+            with self._lock:
+                for window in self._windows:
+                    window['peak'] = max(window['peak'], rss)
+
+rss_sampler = RssSampler()
+
+class StageTimer:
+    """Per-request record of stage durations, row counts and resident memory growth"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: List[Dict[str, Any]] = []
+
+    @contextlib.contextmanager
+    def stage(self, name: str, rows: Optional[int] = None):
+        record = {'stage': name, 'rows': rows}
+        window = rss_sampler.open()
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['seconds'] = time.perf_counter() - start
+            rss_sampler.close(window)
+            record['peak_rss_bytes'] = window['peak']
+            record['rss_delta_bytes'] = window['peak'] - window['start']
+            self.stages.append(record)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'total_seconds': time.perf_counter() - self.started,
+            'peak_rss_bytes': max([stage['peak_rss_bytes'] for stage in self.stages], default=current_rss_bytes()),
+            'stages': self.stages
+        }
+
+current_timer: ContextVar[Optional[StageTimer]] = ContextVar('current_timer', default=None)
+
+@contextlib.contextmanager
+def timed_stage(name: str, rows: Optional[int] = None):
+    """Time a stage of the current request; a no-op outside instrumented requests"""
+    timer = current_timer.get()
+    if timer is None:
+        yield {}
+        return
+    with timer.stage(name, rows) as record:
+        yield record
+
+def timed(name: str):
+    """Decorator form of timed_stage; rows are taken from the length of the first argument"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            rows = len(args[0]) if args and hasattr(args[0], '__len__') else None
+            with timed_stage(name, rows):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def call_with_timer(func, *args, **kwargs):
+    """Run func under a fresh StageTimer, returning its result and the recorded stages"""
+    timer = StageTimer()
+    token = current_timer.set(timer)
+    try:
+        return func(*args, **kwargs), timer.stages
+    finally:
+        current_timer.reset(token)
+
+class Histogram:
+    """Prometheus histogram keyed by label values"""
+
+    def __init__(self, name: str, documentation: str, labels: List[str], buckets):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self.series: Dict[tuple, List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels[label] for label in self.labels)
+        series = self.series.setdefault(key, [0] * (len(self.buckets) + 1) + [0.0])
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def exposition(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        for key, series in sorted(self.series.items()):
+            label_text = ','.join(f'{label}="{prometheus_escape(value)}"' for label, value in zip(self.labels, key))
+            prefix = label_text + ',' if label_text else ''
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series[:-1]):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(float(bound))
+                lines.append(f'{self.name}_bucket{{{prefix}le="{le}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{label_text}}} {series[-1]}')
+            lines.append(f'{self.name}_count{{{label_text}}} {cumulative}')
+        return lines
+
+def prometheus_escape(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+ANALYSIS_DURATION = Histogram('analysis_request_duration_seconds', 'Wall time of analysis requests',
+                              ['analysis', 'outcome'], STAGE_DURATION_BUCKETS)
+STAGE_DURATION = Histogram('analysis_stage_duration_seconds', 'Wall time of each analysis stage',
+                           ['analysis', 'stage'], STAGE_DURATION_BUCKETS)
+STAGE_ROWS = Histogram('analysis_stage_rows', 'Rows processed by each analysis stage',
+                       ['analysis', 'stage'], STAGE_ROW_BUCKETS)
+ANALYSIS_PEAK_RSS = Histogram('analysis_peak_rss_bytes', 'Peak resident memory of the processes serving a request',
+                              ['analysis'], PEAK_RSS_BUCKETS)
+STAGE_RSS_DELTA = Histogram('analysis_stage_rss_delta_bytes', 'Resident memory growth within each analysis stage',
+                            ['analysis', 'stage'], STAGE_MEMORY_BUCKETS)
+METRICS = [ANALYSIS_DURATION, STAGE_DURATION, STAGE_ROWS, ANALYSIS_PEAK_RSS, STAGE_RSS_DELTA]
+
+@contextlib.contextmanager
+def track_analysis(analysis: str):
+    """Instrument one analysis request and record its stages in the metrics histograms"""
+    timer = StageTimer()
+    token = current_timer.set(timer)
+    outcome = 'error'
+    try:
+        yield timer
+        outcome = 'ok'
+    finally:
+        current_timer.reset(token)
+        summary = timer.summary()
+        ANALYSIS_DURATION.observe(summary['total_seconds'], analysis=analysis, outcome=outcome)
+        ANALYSIS_PEAK_RSS.observe(summary['peak_rss_bytes'], analysis=analysis)
+        for stage in timer.stages:
+            STAGE_DURATION.observe(stage['seconds'], analysis=analysis, stage=stage['stage'])
+            STAGE_RSS_DELTA.observe(stage['rss_delta_bytes'], analysis=analysis, stage=stage['stage'])
+            if stage['rows'] is not None:
+                STAGE_ROWS.observe(stage['rows'], analysis=analysis, stage=stage['stage'])
+
+def with_timings(response: Dict[str, Any], timer: StageTimer, include: bool) -> Dict[str, Any]:
+    """Attach the per-stage breakdown without touching the (possibly cached) response"""
+    return {**response, 'timings': timer.summary()} if include else response
+
+# Schema-Driven Dtypes
+# data_dictionary.json declares each column's type and, for enumerations, its values.
+# Loaded frames use categoricals for enumerations and the group-by key, the narrowest
+# integer type for integer columns and float32 for non-currency floats; currency stays
+# float64. High-cardinality ids nobody groups on stay plain strings, since encoding them
+# costs more than it saves.
+CATEGORICAL_KEY_COLUMNS = ['customer_id']
+
+@functools.lru_cache(maxsize=1)
+def load_data_dictionary() -> Dict[str, Dict[str, Any]]:
+    """Column specs from the data dictionary, or none if it is missing"""
+    try:
+        return json.loads(DATA_DICTIONARY_PATH.read_text())['columns']
+    except (OSError, ValueError, KeyError):
+        logger.warning("Data dictionary not found at %s; loading without schema dtypes", DATA_DICTIONARY_PATH)
+        return {}
+
+def is_categorical_column(col: str, spec: Dict[str, Any]) -> bool:
+    """String columns loaded as categoricals: enumerations and the group-by key"""
+    return spec.get('data_type') == 'String' and ('values' in spec or col in CATEGORICAL_KEY_COLUMNS)
+
+def categorical_string_columns(columns: Optional[List[str]] = None) -> List[str]:
+    """Categorical string columns of the data dictionary, optionally restricted to columns"""
+    dictionary = load_data_dictionary()
+    return [col for col, spec in dictionary.items()
+            if is_categorical_column(col, spec) and (columns is None or col in columns)]
+
+def narrow_integer_dtype(low: int, high: int) -> np.dtype:
+    for dtype in (np.int8, np.int16, np.int32):
+        if np.iinfo(dtype).min <= low and high <= np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+def compact_column(series: pd.Series, spec: Dict[str, Any]) -> pd.Series:
+    """Convert one column to the compact dtype its data dictionary spec allows, without losing values"""
+    data_type = spec.get('data_type', '')
+    if data_type == 'String':
+        series = series if isinstance(series.dtype, pd.CategoricalDtype) else series.astype('category')
+        if 'values' in spec:
+            # Declared values first, then anything seen that the dictionary does not list
+            declared = list(spec['values'])
+            extra = sorted(set(series.cat.categories) - set(declared))
+            return series.cat.set_categories(declared + extra)
+        # Group-by keys: sorted categories keep groupby output in the same order as for plain strings
+        return series.cat.reorder_categories(series.cat.categories.sort_values())
+    if data_type.startswith('Date'):
+        return series if pd.api.types.is_datetime64_any_dtype(series) else pd.to_datetime(series, errors='coerce')
+    if data_type == 'Integer':
+        values = pd.to_numeric(series, errors='coerce')
+        if values.isna().any() or (values % 1 != 0).any():
+            # float32 holds every integer up to 2**24 exactly
+            return values.astype(np.float32) if values.abs().max() < 2 ** 24 else values.astype(np.float64)
+        if not len(values):
+            return values.astype(np.int8)
+        return values.astype(narrow_integer_dtype(int(values.min()), int(values.max())))
+    if data_type == 'Float':
+        values = pd.to_numeric(series, errors='coerce')
+        return values.astype(np.float64 if 'currency' in spec else np.float32)
+    return series
+
+def apply_schema_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """Compact every column the data dictionary describes, leaving non-categorical strings as they are"""
+    dictionary = load_data_dictionary()
+    for col in df.columns:
+        spec = dictionary.get(col)
+        if spec is not None and (spec.get('data_type') != 'String' or is_categorical_column(col, spec)):
+            df[col] = compact_column(df[col], spec)
+    return df
+
+def frame_memory(df: pd.DataFrame) -> Dict[str, int]:
+    return {col: int(size) for col, size in df.memory_usage(deep=True, index=False).items()}
+
+def memory_report(before: pd.DataFrame, after: pd.DataFrame) -> Dict[str, Any]:
+    """Per-column dtype and memory of a frame before and after schema dtypes"""
+    before_bytes, after_bytes = frame_memory(before), frame_memory(after)
+    total_before, total_after = sum(before_bytes.values()), sum(after_bytes.values())
+    return {
+        'rows': len(after),
+        'bytes_before': total_before,
+        'bytes_after': total_after,
+        'bytes_saved': total_before - total_after,
+        'reduction': 1 - total_after / total_before if total_before else 0.0,
+        'columns': {
+            col: {
+                'dtype_before': str(before[col].dtype),
+                'dtype_after': str(after[col].dtype),
+                'bytes_before': before_bytes[col],
+                'bytes_after': after_bytes[col]
+            } for col in after.columns
+        }
+    }
+
+# Columnar Dataset Store
+def dataset_store_path(dataset_id: str) -> Path:
+    """Directory holding all columnar files of a dataset"""
+    return DATASET_STORE_DIR / dataset_id
+
+def transactions_path(dataset_id: str) -> Path:
+    """Directory of Parquet parts holding a dataset's transactions"""
+    return dataset_store_path(dataset_id) / 'transactions'
+
+def customers_path(dataset_id: str) -> Path:
+    """Parquet file holding a dataset's per-customer aggregates"""
+    return dataset_store_path(dataset_id) / 'customers.parquet'
+
+def order_day_keys_path(dataset_id: str) -> Path:
+    """Parquet file holding the hashed (customer_id, order day) keys counted into order_days"""
+    return dataset_store_path(dataset_id) / 'order_day_keys.parquet'
+
+def quantile_sketches_path(dataset_id: str) -> Path:
+    """JSON file holding the quantile sketches of a dataset's customer aggregates"""
+    return dataset_store_path(dataset_id) / 'quantile_sketches.json'
+
+def has_columnar_store(dataset_id: str) -> bool:
+    return transactions_path(dataset_id).is_dir()
+
+def normalize_transactions(chunk: pd.DataFrame) -> pd.DataFrame:
+    """Coerce the required columns to stable types so every chunk shares one schema"""
+    chunk = chunk.copy()
+    chunk['order_date'] = pd.to_datetime(chunk['order_date'], errors='coerce')
+    for col in NUMERIC_COLUMNS:
+        chunk[col] = pd.to_numeric(chunk[col], errors='coerce').astype('float64')
+    return chunk
+
+class DatasetWriter:
+    """Write transaction chunks of one dataset into a Parquet part, one row group per chunk"""
+
+    def __init__(self, dataset_id: str, part: int = 0):
+        directory = transactions_path(dataset_id)
+        directory.mkdir(parents=True, exist_ok=True)
+        self.path = directory / f'part-{part:05d}.parquet'
+        self._tmp_path = directory / f'.part-{part:05d}.parquet.tmp'
+        self._schema: Optional[pa.Schema] = None
+        self._writer: Optional[pq.ParquetWriter] = None
+
+    def write_chunk(self, chunk: pd.DataFrame):
+        """Append a chunk already passed through normalize_transactions"""
+        if self._schema is None:
+            # Columns that are entirely empty in the first chunk default to strings
+            schema = pa.Schema.from_pandas(chunk, preserve_index=False)
+            for i, field in enumerate(schema):
+                if pa.types.is_null(field.type):
+                    schema = schema.set(i, field.with_type(pa.string()))
+            self._schema = schema
+            self._writer = pq.ParquetWriter(self._tmp_path, self._schema)
+        table = pa.Table.from_pandas(chunk, schema=self._schema, preserve_index=False)
+        self._writer.write_table(table)
+
+    def close(self):
+        """Finish the part and make it visible to readers"""
+        if self._writer is not None:
+            self._writer.close()
+            os.replace(self._tmp_path, self.path)
+
+    def abort(self):
+        if self._writer is not None:
+            self._writer.close()
+        self._tmp_path.unlink(missing_ok=True)
+
+def load_transactions(dataset_id: str, columns: Optional[List[str]] = None, typed: bool = True) -> pd.DataFrame:
+    """Load only the requested columns of a dataset's transactions, memory-mapping the Parquet parts
+    
+    With typed, categorical string columns are read straight from the Parquet
+    dictionaries and the rest are compacted by apply_schema_dtypes.
+    """
+    read_dictionary = categorical_string_columns(columns) if typed else None
+    table = pq.read_table(transactions_path(dataset_id), columns=columns, memory_map=True, read_dictionary=read_dictionary)
+    df = table.to_pandas(split_blocks=True, self_destruct=True)
+    return apply_schema_dtypes(df) if typed else df
+
+def write_customer_aggregates(dataset_id: str, customers: pd.DataFrame, order_days: Optional['OrderDayKeys'] = None):
+    """Atomically replace the per-customer aggregate table of a dataset, its quantile sketches and order day keys"""
+    for tmp_path, path in stage_customer_aggregates(dataset_id, customers, order_days):
+        os.replace(tmp_path, path)
+
+def stage_customer_aggregates(dataset_id: str, customers: pd.DataFrame,
+                              order_days: Optional['OrderDayKeys'] = None) -> List[Tuple[Path, Path]]:
+    """Write the aggregate table, its sketches and order day keys to temp files, returning (tmp, final) path pairs"""
+    path = customers_path(dataset_id)
+    tmp_path = path.with_name(f'.{path.name}.tmp')
+    pq.write_table(pa.Table.from_pandas(customers, preserve_index=True), tmp_path)
+    staged = [(tmp_path, path), stage_quantile_sketches(dataset_id, build_customer_sketches(customers))]
+    if order_days is not None:
+        path = order_day_keys_path(dataset_id)
+        tmp_path = path.with_name(f'.{path.name}.tmp')
+        pq.write_table(pa.table({'key': order_days.keys()}), tmp_path)
+        staged.append((tmp_path, path))
+    return staged
+
+def publish_staged_files(staged: List[Tuple[Path, Path]]) -> List[Tuple[Path, Optional[Path]]]:
+    """Move staged files into place, hard-linking each replaced file to a backup for restore_published_files"""
+    published = []
+    try:
+        for tmp_path, path in staged:
+            backup = None
+            if path.exists():
+                backup = path.with_name(f'.{path.name}.bak')
+                backup.unlink(missing_ok=True)
+                os.link(path, backup)
+            os.replace(tmp_path, path)
+            published.append((path, backup))
+    except Exception:
+        restore_published_files(published)
+        discard_staged_files(staged)
+        raise
+    return published
+
+def restore_published_files(published: List[Tuple[Path, Optional[Path]]]):
+    """Put back the files replaced by publish_staged_files"""
+    for path, backup in published:
+        if backup is None:
+            path.unlink(missing_ok=True)
+        else:
+            os.replace(backup, path)
+
+def discard_backups(published: List[Tuple[Path, Optional[Path]]]):
+    for _, backup in published:
+        if backup is not None:
+            backup.unlink(missing_ok=True)
+
+def discard_staged_files(staged: List[Tuple[Path, Path]]):
+    for tmp_path, _ in staged:
+        tmp_path.unlink(missing_ok=True)
+
+def customer_scores_path(dataset_id: str, analysis_id: str) -> Path:
+    """Parquet file holding the per-customer CLV and churn scores of one CLV analysis"""
+    return dataset_store_path(dataset_id) / 'customer_scores' / f'{analysis_id}.parquet'
+
+def cluster_labels_path(dataset_id: str, analysis_id: str) -> Path:
+    """Parquet file mapping customer_id to cluster for one clustering analysis"""
+    return dataset_store_path(dataset_id) / 'cluster_labels' / f'{analysis_id}.parquet'
+
+def write_cluster_labels(path: Path, customer_ids, cluster_labels: np.ndarray):
+    """Write labels keyed by customer_id, atomically"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    table = pa.table({
+        'customer_id': pa.array(np.asarray(customer_ids).astype(str)),
+        'cluster': pa.array(np.asarray(cluster_labels, dtype=np.int32))
+    })
+    tmp_path = path.with_name(f'.{path.name}.tmp')
+    pq.write_table(table, tmp_path, row_group_size=LABELS_STREAM_BATCH_SIZE)
+    os.replace(tmp_path, path)
+
+def load_customer_aggregates(dataset_id: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """Load the per-customer aggregate table of a dataset, indexed by customer_id"""
+    table = pq.read_table(customers_path(dataset_id), columns=columns, memory_map=True)
+    return table.to_pandas()
+
+def next_transactions_part(dataset_id: str) -> int:
+    return len(list(transactions_path(dataset_id).glob('part-*.parquet')))
+
+def remove_dataset_store(dataset_id: str):
+    shutil.rmtree(dataset_store_path(dataset_id), ignore_errors=True)
+
+def _columns_from_batch(batch: List[Dict[str, Any]], columns: List[str]) -> Dict[str, np.ndarray]:
+    return {col: _column_from_batch(batch, col) for col in columns}
+
+def build_sales_frame(column_chunks: Dict[str, List[np.ndarray]]) -> pd.DataFrame:
+    """Concatenate decoded batches into one frame with schema dtypes"""
+    return apply_schema_dtypes(pd.DataFrame({col: np.concatenate(chunks) for col, chunks in column_chunks.items()}))
+
+def _column_from_batch(batch: List[Dict[str, Any]], column: str) -> np.ndarray:
+    """Decode one column of a cursor batch into a typed array"""
+    values = [document.get(column) for document in batch]
+    column_type = SALES_COLUMN_TYPES.get(column)
+    if column_type == 'float':
+        return pd.to_numeric(pd.Series(values, dtype=object), errors='coerce').to_numpy(dtype=np.float64)
+    if column_type == 'datetime':
+        return pd.to_datetime(pd.Series(values, dtype=object), errors='coerce').to_numpy(dtype='datetime64[ns]')
+    return np.array(values, dtype=object)
+
+async def load_sales_columns(dataset_id: str, columns: List[str], batch_size: Optional[int] = None) -> pd.DataFrame:
+    """Stream projected sales_data documents batch by batch into typed columns
+    
+    At most two cursor batches of documents are alive at a time: each is decoded
+    into per-column arrays in the threadpool while the next one is fetched, and
+    the arrays are concatenated at the end.
+    """
+    batch_size = batch_size or MONGO_BATCH_SIZE
+    projection = {col: 1 for col in columns}
+    projection['_id'] = 0
+    cursor = db.sales_data.find({'dataset_id': dataset_id}, projection, batch_size=batch_size)
+    
+    column_chunks: Dict[str, List[np.ndarray]] = {col: [] for col in columns}
+    pending = None
+    with timed_stage('mongo_fetch') as stage:
+        try:
+            while True:
+                batch = await cursor.to_list(batch_size)
+                if pending is not None:
+                    for col, values in (await pending).items():
+                        column_chunks[col].append(values)
+                    pending = None
+                if not batch:
+                    break
+                pending = asyncio.ensure_future(run_in_threadpool(_columns_from_batch, batch, columns))
+        finally:
+            if pending is not None and not pending.done():
+                await asyncio.gather(pending, return_exceptions=True)
+        stage['rows'] = sum(len(chunk) for chunk in column_chunks[columns[0]])
+    
+    if not column_chunks[columns[0]]:
+        raise HTTPException(status_code=404, detail="Dataset not found")
+    with timed_stage('build_frame', stage.get('rows')):
+        return await run_in_threadpool(build_sales_frame, column_chunks)
+
+async def load_sales_frame(dataset_id: str, columns: List[str]) -> pd.DataFrame:
+    """Load transactions from the columnar store, falling back to sales_data for legacy uploads"""
+    if has_columnar_store(dataset_id):
+        with timed_stage('load_transactions') as stage:
+            df = await run_in_threadpool(load_transactions, dataset_id, columns)
+            stage['rows'] = len(df)
+            stage['memory_bytes'] = int(df.memory_usage(deep=True).sum())
+        return df
+    return await load_sales_columns(dataset_id, columns)
+
+async def load_rfm_frame(dataset_id: str, columns: List[str] = RFM_COLUMNS, quantiles: str = 'exact') -> pd.DataFrame:
+    """Outlier-filtered RFM table, starting from the customer aggregates when they exist
+    
+    With quantiles='sketch', the outlier bounds come from the dataset's stored sketches.
+    """
+    if customers_path(dataset_id).exists():
+        with timed_stage('load_customers') as stage:
+            customers = await run_in_threadpool(load_customer_aggregates, dataset_id)
+            stage['rows'] = len(customers)
+        bounds = None
+        if quantiles == 'sketch':
+            with timed_stage('load_sketches'):
+                sketches = await run_in_threadpool(load_quantile_sketches, dataset_id)
+                bounds = await run_in_threadpool(sketch_outlier_bounds, sketches)
+        with timed_stage('rfm_metrics', len(customers)):
+            return await run_in_threadpool(rfm_without_outliers, customers, bounds)
+    
+    # Legacy datasets only have raw transactions
+    df = await load_sales_frame(dataset_id, columns)
+    return await calculate_rfm_metrics_partitioned(df)
+
 # Data Processing Functions
-def calculate_rfm_metrics(df: pd.DataFrame) -> pd.DataFrame:
-    """Calculate RFM metrics with statistical rigor"""
-    # Ensure proper data types
-    df['order_date'] = pd.to_datetime(df['order_date'])
-    df['total_amount'] = pd.to_numeric(df['total_amount'], errors='coerce')
+class IngestSummary:
+    """Running dataset summary built up chunk by chunk during ingestion"""
+
+    def __init__(self):
+        self.columns: Optional[List[str]] = None
+        self.total_records = 0
+        self.null_cells = 0
+        self.total_cells = 0
+        self.start_date: Optional[str] = None
+        self.end_date: Optional[str] = None
+
+    def update(self, chunk: pd.DataFrame):
+        if self.columns is None:
+            self.columns = chunk.columns.tolist()
+
+        self.total_records += len(chunk)
+        self.null_cells += int(chunk.isnull().sum().sum())
+        self.total_cells += chunk.size
+
+        order_dates = chunk['order_date'].dropna().astype(str)
+        if len(order_dates):
+            chunk_start, chunk_end = order_dates.min(), order_dates.max()
+            if self.start_date is None or chunk_start < self.start_date:
+                self.start_date = chunk_start
+            if self.end_date is None or chunk_end > self.end_date:
+                self.end_date = chunk_end
+
+    @property
+    def date_range(self) -> Dict[str, str]:
+        return {'start_date': self.start_date, 'end_date': self.end_date}
+
+    @property
+    def data_quality_score(self) -> float:
+        completeness = self.null_cells / self.total_cells if self.total_cells else 0
+        return round((1 - completeness) * 100, 2)
+
+def validate_columns(columns: List[str]):
+    """Raise a 400 error if any required column is missing"""
+    missing_columns = [col for col in REQUIRED_COLUMNS if col not in columns]
+    if missing_columns:
+        raise HTTPException(status_code=400, detail=f"Missing required columns: {missing_columns}")
+
+class DatasetIngestor:
+    """Feed CSV chunks of one upload into the columnar store and the customer aggregates"""
+
+    def __init__(self, dataset_id: str, part: int = 0, order_days: Optional['OrderDayKeys'] = None):
+        self.dataset_id = dataset_id
+        self.summary = IngestSummary()
+        self.writer = DatasetWriter(dataset_id, part)
+        self.aggregator = CustomerAggregator(order_days)
+
+    def ingest_chunk(self, chunk: pd.DataFrame):
+        self.summary.update(chunk)
+        chunk = normalize_transactions(chunk)
+        self.writer.write_chunk(chunk)
+        self.aggregator.update(chunk)
+
+    def abort(self):
+        self.writer.abort()
+
+async def stream_csv_upload(file: UploadFile, ingestor: DatasetIngestor, expected_columns: Optional[List[str]] = None):
+    """Parse an upload in bounded-memory chunks, ingesting each chunk while the next one is parsed"""
+    reader = pd.read_csv(file.file, chunksize=UPLOAD_CHUNK_ROWS, dtype=ID_COLUMN_DTYPES, encoding='utf-8')
+    pending = None
+    try:
+        while True:
+            chunk = await run_in_threadpool(next, reader, None)
+            if chunk is None:
+                break
+            
+            # Validate required columns on the first chunk
+            if pending is None and ingestor.summary.columns is None:
+                validate_columns(chunk.columns.tolist())
+                if expected_columns is not None and set(chunk.columns) != set(expected_columns):
+                    raise HTTPException(status_code=400, detail=f"Columns must match the existing dataset: {expected_columns}")
+            
+            if pending is not None:
+                await pending
+            pending = asyncio.ensure_future(run_in_threadpool(ingestor.ingest_chunk, chunk))
+        
+        if pending is not None:
+            await pending
+    finally:
+        if pending is not None and not pending.done():
+            await asyncio.gather(pending, return_exceptions=True)
     
-    # Calculate reference date (most recent date + 1 day)
-    reference_date = df['order_date'].max() + pd.Timedelta(days=1)
-    
-    # Calculate RFM metrics
-    rfm = df.groupby('customer_id').agg({
-        'order_date': lambda x: (reference_date - x.max()).days,  # Recency
-        'order_id': 'count',  # Frequency
-        'total_amount': 'sum'  # Monetary
-    }).rename(columns={
-        'order_date': 'recency',
-        'order_id': 'frequency', 
-        'total_amount': 'monetary'
+    if ingestor.summary.total_records == 0:
+        raise HTTPException(status_code=400, detail="Dataset contains no records")
+
+# How partial per-customer aggregates combine
+CUSTOMER_AGGREGATE_MERGE = {
+    'first_order_date': 'min',
+    'last_order_date': 'max',
+    'frequency': 'sum',
+    'monetary': 'sum',
+    'order_days': 'sum'
+}
+
+class CustomerAggregator:
+    """Per-customer aggregates merged chunk by chunk during ingestion
+    
+    Chunk partials are merged as a tree: every CUSTOMER_MERGE_FANOUT tables of one level
+    are combined into a single table of the next, so each row is merged a logarithmic
+    number of times instead of once per remaining chunk.
+    """
+
+    def __init__(self, order_days: Optional['OrderDayKeys'] = None):
+        self.order_days = order_days if order_days is not None else OrderDayKeys()
+        self._levels: List[List[pd.DataFrame]] = []
+
+    def update(self, chunk: pd.DataFrame):
+        partial = aggregate_customers(chunk)
+        new_days = self.order_days.count_new(chunk['customer_id'], chunk['order_date'])
+        partial['order_days'] = new_days.reindex(partial.index, fill_value=0).astype(np.int64)
+        self._push(partial, 0)
+
+    def _push(self, partial: pd.DataFrame, level: int):
+        if level == len(self._levels):
+            self._levels.append([])
+        self._levels[level].append(partial)
+        if len(self._levels[level]) >= CUSTOMER_MERGE_FANOUT:
+            merged = merge_customer_partials(self._levels[level])
+            self._levels[level] = []
+            self._push(merged, level + 1)
+
+    @property
+    def customers(self) -> Optional[pd.DataFrame]:
+        """The merged aggregates of every chunk seen so far"""
+        partials = [partial for level in self._levels for partial in level]
+        if not partials:
+            return None
+        merged = merge_customer_partials(partials)
+        self._levels = [[merged]]
+        return merged
+
+    def __len__(self) -> int:
+        customers = self.customers
+        return 0 if customers is None else len(customers)
+
+# Order Days
+# BG/NBD and Gamma-Gamma count purchase occasions, not line items, so every customer
+# also carries order_days: its distinct order dates. Days are deduplicated against a
+# set of hashed (customer_id, day) keys kept across chunks and appends, which makes
+# the per-chunk counts disjoint and lets them merge by sum.
+ORDER_DAY_KEY_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+def order_day_keys(customer_codes: np.ndarray, customer_ids, order_dates) -> np.ndarray:
+    """64-bit keys of (customer_id, calendar day) pairs; order_dates must not be NaT
+    
+    customer_codes index into the distinct customer_ids, so each id is hashed once.
+    """
+    customer_hashes = pd.util.hash_array(np.asarray(customer_ids, dtype=object))[customer_codes]
+    days = np.asarray(order_dates, dtype='datetime64[D]').astype(np.int64).astype(np.uint64)
+    with np.errstate(over='ignore'):
+        return pd.util.hash_array(customer_hashes ^ (days * ORDER_DAY_KEY_MULTIPLIER))
+
+class OrderDayKeys:
+    """Set of order day keys held as a few sorted arrays, merged while the newest one grows
+    
+    Each array is at most half the size of the one before it, so lookups search a
+    logarithmic number of arrays and every key is re-sorted a logarithmic number of times.
+    """
+
+    def __init__(self, keys: Optional[np.ndarray] = None):
+        self._levels: List[np.ndarray] = []
+        if keys is not None and len(keys):
+            self._levels.append(np.unique(np.asarray(keys, dtype=np.uint64)))
+
+    def contains(self, keys: np.ndarray) -> np.ndarray:
+        found = np.zeros(len(keys), dtype=bool)
+        for level in self._levels:
+            positions = np.minimum(np.searchsorted(level, keys), len(level) - 1)
+            found |= level[positions] == keys
+        return found
+
+    def add(self, keys: np.ndarray):
+        """Add sorted keys that are not in the set yet"""
+        if not len(keys):
+            return
+        self._levels.append(keys)
+        while len(self._levels) > 1 and len(self._levels[-2]) <= 2 * len(self._levels[-1]):
+            newest = self._levels.pop()
+            self._levels[-1] = np.sort(np.concatenate([self._levels[-1], newest]), kind='mergesort')
+
+    def count_new(self, customer_ids: pd.Series, order_dates: pd.Series) -> pd.Series:
+        """Register the order days of a chunk and count the unseen ones per customer"""
+        valid = order_dates.notna().to_numpy()
+        codes, uniques = pd.factorize(customer_ids.to_numpy()[valid])
+        keys, first = np.unique(order_day_keys(codes, uniques, order_dates.to_numpy()[valid]), return_index=True)
+        new = ~self.contains(keys)
+        self.add(keys[new])
+        return pd.Series(np.bincount(codes[first[new]], minlength=len(uniques)), index=uniques)
+
+    def keys(self) -> np.ndarray:
+        if not self._levels:
+            return np.empty(0, dtype=np.uint64)
+        return np.sort(np.concatenate(self._levels))
+
+    def __len__(self) -> int:
+        return sum(len(level) for level in self._levels)
+
+def scan_order_days(dataset_id: str) -> Tuple['OrderDayKeys', pd.Series]:
+    """Order day keys and per-customer counts rebuilt from the stored transactions
+    
+    Used for datasets written before order days were aggregated at ingestion.
+    """
+    order_days = OrderDayKeys()
+    counts = []
+    for path in sorted(transactions_path(dataset_id).glob('part-*.parquet')):
+        for batch in pq.ParquetFile(path).iter_batches(columns=['customer_id', 'order_date']):
+            frame = batch.to_pandas()
+            counts.append(order_days.count_new(frame['customer_id'], frame['order_date']))
+    if not counts:
+        return order_days, pd.Series(dtype=np.int64)
+    return order_days, pd.concat(counts).groupby(level=0).sum()
+
+def load_order_days(dataset_id: str, customers: pd.DataFrame) -> 'OrderDayKeys':
+    """Stored order day keys of a dataset, backfilling customers['order_days'] in place if it is missing"""
+    path = order_day_keys_path(dataset_id)
+    if path.exists() and 'order_days' in customers.columns:
+        return OrderDayKeys(pq.read_table(path, columns=['key'])['key'].to_numpy())
+    order_days, counts = scan_order_days(dataset_id)
+    customers['order_days'] = counts.reindex(customers.index, fill_value=0).astype(np.int64)
+    return order_days
+
+def aggregate_customers(df: pd.DataFrame) -> pd.DataFrame:
+    """Aggregate transactions into first/last order date, order count and monetary sum per customer"""
+    return df.groupby('customer_id', observed=True).agg(
+        first_order_date=('order_date', 'min'),
+        last_order_date=('order_date', 'max'),
+        frequency=('order_id', 'count'),
+        monetary=('total_amount', 'sum')
+    )
+
+def merge_customer_aggregates(left: Optional[pd.DataFrame], right: pd.DataFrame) -> pd.DataFrame:
+    """Combine two partial aggregate tables (min/max for dates, sum for count and monetary)"""
+    if left is None:
+        return right
+    return merge_customer_partials([left, right])
+
+def merge_customer_partials(partials: List[pd.DataFrame]) -> pd.DataFrame:
+    """Combine any number of partial aggregate tables in a single group-by"""
+    if len(partials) == 1:
+        return partials[0]
+    combined = pd.concat(partials)
+    return combined.groupby(level=0).agg({
+        col: how for col, how in CUSTOMER_AGGREGATE_MERGE.items() if col in combined.columns
     })
+
+def rfm_from_customer_aggregates(customers: pd.DataFrame) -> pd.DataFrame:
+    """Derive raw RFM values from per-customer aggregates"""
+    # Calculate reference date (most recent date + 1 day)
+    reference_date = customers['last_order_date'].max() + pd.Timedelta(days=1)
     
-    # Remove outliers using IQR method
-    Q1 = rfm.quantile(0.25)
-    Q3 = rfm.quantile(0.75)
-    IQR = Q3 - Q1
-    lower_bound = Q1 - 1.5 * IQR
-    upper_bound = Q3 + 1.5 * IQR
+    return pd.DataFrame({
+        'recency': (reference_date - customers['last_order_date']).dt.days,
+        'frequency': customers['frequency'],
+        'monetary': customers['monetary']
+    }, index=customers.index)
+
+def rfm_without_outliers(customers: pd.DataFrame, bounds=None) -> pd.DataFrame:
+    """Raw RFM values from per-customer aggregates with outliers removed"""
+    return remove_rfm_outliers(rfm_from_customer_aggregates(customers), bounds)
+
+def remove_rfm_outliers(rfm: pd.DataFrame, bounds=None) -> pd.DataFrame:
+    """Remove outliers using the IQR method, with exact quartiles unless (lower, upper) bounds are given"""
+    if bounds is not None:
+        lower_bound, upper_bound = bounds
+    else:
+        Q1 = rfm.quantile(0.25)
+        Q3 = rfm.quantile(0.75)
+        IQR = Q3 - Q1
+        lower_bound = Q1 - 1.5 * IQR
+        upper_bound = Q3 + 1.5 * IQR
     
     # Filter outliers
     rfm_clean = rfm[~((rfm < lower_bound) | (rfm > upper_bound)).any(axis=1)]
     
     return rfm_clean
 
-def perform_rfm_segmentation(rfm_df: pd.DataFrame) -> Dict[str, Any]:
+def coerce_rfm_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """Ensure proper data types for the RFM columns"""
+    df['order_date'] = pd.to_datetime(df['order_date'])
+    df['total_amount'] = pd.to_numeric(df['total_amount'], errors='coerce')
+    return df
+
+@timed('calculate_rfm')
+def calculate_rfm_metrics(df: pd.DataFrame) -> pd.DataFrame:
+    """Calculate RFM metrics with statistical rigor"""
+    rfm = rfm_from_customer_aggregates(aggregate_customers(coerce_rfm_columns(df)))
+    return remove_rfm_outliers(rfm)
+
+# Partitioned Aggregation
+# customer_id is factorized once in sorted order and transactions are sharded by its
+# code, so every customer lands in exactly one shard and only numeric columns cross
+# the process boundary. Shards are aggregated in the partition pool and concatenated
+# without any merge; sorting by code restores the order of a single groupby.
+def split_by_customer(df: pd.DataFrame, n_shards: int):
+    """Shards of the RFM columns keyed by customer code, plus the customer_id of each code"""
+    codes, customer_ids = pd.factorize(df['customer_id'], sort=True)
+    keyed = codes >= 0
+    codes = codes[keyed]
+    
+    # Only the presence of order_id matters to the order count
+    columns = {
+        'customer_id': codes,
+        'order_id': np.where(df['order_id'].notna().to_numpy()[keyed], 1.0, np.nan),
+        'order_date': df['order_date'].to_numpy()[keyed],
+        'total_amount': df['total_amount'].to_numpy()[keyed]
+    }
+    # A stable sort of 16-bit shard ids is a radix sort
+    shard_ids = (codes % n_shards).astype(np.uint16)
+    order = np.argsort(shard_ids, kind='stable')
+    bounds = np.searchsorted(shard_ids[order], np.arange(n_shards + 1))
+    shards = [pd.DataFrame({name: values[order[start:end]] for name, values in columns.items()})
+              for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+    return shards, customer_ids
+
+def combine_customer_shards(partials: List[pd.DataFrame], customer_ids: pd.Index) -> pd.DataFrame:
+    """Concatenate per-shard aggregates and map codes back to customer_id in groupby order"""
+    customers = pd.concat(partials).sort_index()
+    customers.index = customer_ids.take(customers.index).rename('customer_id')
+    return customers
+
+async def aggregate_customers_partitioned(df: pd.DataFrame, n_shards: int = RFM_PARTITIONS) -> pd.DataFrame:
+    """aggregate_customers over customer shards, one partition pool task per shard
+    
+    The result is identical to aggregate_customers(df); small inputs skip the pool.
+    """
+    if n_shards <= 1 or len(df) < RFM_PARTITION_MIN_ROWS:
+        return await run_in_threadpool(aggregate_customers, df)
+    
+    with timed_stage('partition_transactions', len(df)):
+        shards, customer_ids = await run_in_threadpool(split_by_customer, df, n_shards)
+    partials = await asyncio.gather(*[run_in_partition_pool(aggregate_customers, shard) for shard in shards])
+    with timed_stage('combine_partitions', len(customer_ids)):
+        return await run_in_threadpool(combine_customer_shards, partials, customer_ids)
+
+async def calculate_rfm_metrics_partitioned(df: pd.DataFrame) -> pd.DataFrame:
+    """calculate_rfm_metrics with the per-customer aggregation spread over the partition pool"""
+    with timed_stage('calculate_rfm', len(df)):
+        df = await run_in_threadpool(coerce_rfm_columns, df)
+        customers = await aggregate_customers_partitioned(df)
+        return await run_in_threadpool(rfm_without_outliers, customers)
+
+# Quantile Sketches
+# KLL sketches (Karnin, Lang & Liberty 2016) of the per-customer aggregates. They are
+# built chunk by chunk and merged, stored next to customers.parquet, and answer
+# quantile queries within about QUANTILE_SKETCH_ERROR in rank without sorting customers.
+class QuantileSketch:
+    """Mergeable KLL sketch of float values; missing values are counted but not sketched"""
+
+    def __init__(self, k: int = QUANTILE_SKETCH_K, seed: int = 0):
+        self.k = k
+        self.levels: List[np.ndarray] = [np.empty(0)]
+        self.count = 0
+        self.missing = 0
+        self.min = np.inf
+        self.max = -np.inf
+        self.rng = np.random.default_rng(seed)
+
+    def _capacity(self, level: int) -> int:
+        return max(2, int(np.ceil(self.k * (2 / 3) ** (len(self.levels) - 1 - level))))
+
+    def _compress(self):
+        """Compact the lowest over-full level until every level fits its capacity"""
+        while True:
+            full = [h for h, items in enumerate(self.levels) if len(items) > self._capacity(h)]
+            if not full:
+                return
+            h = full[0]
+            if h + 1 == len(self.levels):
+                self.levels.append(np.empty(0))
+            
+            # An odd item stays behind; every other one of the rest moves up with double weight
+            items = np.sort(self.levels[h])
+            odd = len(items) % 2
+            self.levels[h] = items[:odd]
+            self.levels[h + 1] = np.concatenate([self.levels[h + 1], items[odd + self.rng.integers(2)::2]])
+
+    def update(self, values) -> 'QuantileSketch':
+        values = np.asarray(values, dtype=np.float64)
+        present = values[~np.isnan(values)]
+        self.missing += len(values) - len(present)
+        if len(present):
+            self.count += len(present)
+            self.min = min(self.min, float(present.min()))
+            self.max = max(self.max, float(present.max()))
+            self.levels[0] = np.concatenate([self.levels[0], present])
+            self._compress()
+        return self
+
+    def merge(self, other: 'QuantileSketch') -> 'QuantileSketch':
+        if other.k != self.k:
+            raise ValueError(f"Cannot merge sketches with k={self.k} and k={other.k}")
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for h, items in enumerate(other.levels):
+            self.levels[h] = np.concatenate([self.levels[h], items])
+        self.count += other.count
+        self.missing += other.missing
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+        return self
+
+    def quantiles(self, qs) -> np.ndarray:
+        """Linearly interpolated quantiles; exact (as np.quantile) while nothing has been compacted"""
+        qs = np.asarray(qs, dtype=np.float64)
+        if not self.count:
+            return np.full(qs.shape, np.nan)
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(level), 2.0 ** h) for h, level in enumerate(self.levels)])
+        order = np.argsort(items, kind='stable')
+        items, weights = items[order], weights[order]
+        
+        # Each item stands for `weight` consecutive ranks; place it at their centre
+        total = weights.sum()
+        positions = np.cumsum(weights) - weights + (weights - 1) / 2
+        positions = np.concatenate([[0.0], positions, [total - 1]])
+        items = np.concatenate([[self.min], items, [self.max]])
+        return np.interp(qs * (total - 1), positions, items)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'k': self.k,
+            'count': self.count,
+            'missing': self.missing,
+            'min': self.min if self.count else None,
+            'max': self.max if self.count else None,
+            'levels': [level.tolist() for level in self.levels]
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'QuantileSketch':
+        sketch = cls(k=data['k'], seed=data['count'])
+        sketch.levels = [np.asarray(level, dtype=np.float64) for level in data['levels']]
+        sketch.count = data['count']
+        sketch.missing = data['missing']
+        sketch.min = np.inf if data['min'] is None else data['min']
+        sketch.max = -np.inf if data['max'] is None else data['max']
+        return sketch
+
+def sketch_customer_aggregates(customers: pd.DataFrame) -> Dict[str, QuantileSketch]:
+    """Sketch last order day, frequency and monetary of one table of customers"""
+    last_order = customers['last_order_date'].to_numpy(dtype='datetime64[ns]')
+    last_order_day = np.where(np.isnat(last_order), np.nan, last_order.astype('datetime64[D]').astype(np.int64))
+    return {
+        'last_order_day': QuantileSketch().update(last_order_day),
+        'frequency': QuantileSketch().update(customers['frequency'].to_numpy(dtype=np.float64, na_value=np.nan)),
+        'monetary': QuantileSketch().update(customers['monetary'].to_numpy(dtype=np.float64, na_value=np.nan))
+    }
+
+def merge_sketches(left: Optional[Dict[str, QuantileSketch]], right: Dict[str, QuantileSketch]) -> Dict[str, QuantileSketch]:
+    if left is None:
+        return right
+    return {name: left[name].merge(sketch) for name, sketch in right.items()}
+
+def build_customer_sketches(customers: pd.DataFrame,
+                            chunk_size: int = QUANTILE_SKETCH_CHUNK_SIZE) -> Dict[str, QuantileSketch]:
+    """Sketches of a customer aggregate table, built per chunk and merged"""
+    sketches = None
+    for start in range(0, max(len(customers), 1), chunk_size):
+        sketches = merge_sketches(sketches, sketch_customer_aggregates(customers.iloc[start:start + chunk_size]))
+    return sketches
+
+def write_quantile_sketches(dataset_id: str, sketches: Dict[str, QuantileSketch]):
+    """Atomically replace the stored sketches of a dataset"""
+    os.replace(*stage_quantile_sketches(dataset_id, sketches))
+
+def stage_quantile_sketches(dataset_id: str, sketches: Dict[str, QuantileSketch]) -> Tuple[Path, Path]:
+    """Write sketches to a temp file, returning (tmp, final) paths"""
+    path = quantile_sketches_path(dataset_id)
+    tmp_path = path.with_name(f'.{path.name}.tmp')
+    tmp_path.write_bytes(dump_json({name: sketch.to_dict() for name, sketch in sketches.items()}))
+    return tmp_path, path
+
+def load_quantile_sketches(dataset_id: str) -> Dict[str, QuantileSketch]:
+    """Stored sketches of a dataset, built from its customer aggregates if missing"""
+    path = quantile_sketches_path(dataset_id)
+    if not path.exists():
+        sketches = build_customer_sketches(load_customer_aggregates(dataset_id))
+        write_quantile_sketches(dataset_id, sketches)
+        return sketches
+    return {name: QuantileSketch.from_dict(data) for name, data in orjson.loads(path.read_bytes()).items()}
+
+def sketch_rfm_quantiles(sketches: Dict[str, QuantileSketch], qs) -> pd.DataFrame:
+    """RFM quantiles from the sketches; recency is read off the last order day in reverse"""
+    qs = np.asarray(qs, dtype=np.float64)
+    reference_day = sketches['last_order_day'].max + 1
+    return pd.DataFrame({
+        'recency': reference_day - sketches['last_order_day'].quantiles(1 - qs),
+        'frequency': sketches['frequency'].quantiles(qs),
+        'monetary': sketches['monetary'].quantiles(qs)
+    }, index=qs)
+
+def sketch_outlier_bounds(sketches: Dict[str, QuantileSketch]):
+    """IQR outlier bounds of remove_rfm_outliers, from the sketches"""
+    Q1, Q3 = (row for _, row in sketch_rfm_quantiles(sketches, [0.25, 0.75]).iterrows())
+    IQR = Q3 - Q1
+    return Q1 - 1.5 * IQR, Q3 + 1.5 * IQR
+
+def sketch_quartile_edges(rfm_df: pd.DataFrame, chunk_size: int = QUANTILE_SKETCH_CHUNK_SIZE) -> Dict[str, np.ndarray]:
+    """Quartile edges of each RFM dimension in one pass, sketching the frame chunk by chunk"""
+    edges = {}
+    for col in ['recency', 'frequency', 'monetary']:
+        values = rfm_df[col].to_numpy(dtype=np.float64, na_value=np.nan)
+        sketch = QuantileSketch()
+        for start in range(0, len(values), chunk_size):
+            sketch.merge(QuantileSketch().update(values[start:start + chunk_size]))
+        edges[col] = sketch.quantiles([0.25, 0.5, 0.75])
+    return edges
+
+def edge_scores(values, edges: np.ndarray, reverse: bool = False) -> np.ndarray:
+    """Scores 1-4 (4-1 when reverse) from quartile edges, right-closed as in quartile_scores; 0 for missing"""
+    values = np.asarray(values, dtype=np.float64)
+    bins = np.searchsorted(edges, values, side='left').astype(np.int8)
+    return np.where(np.isnan(values), 0, 4 - bins if reverse else bins + 1).astype(np.int8)
+
+# RFM segment rules, checked in order; any score not listed is 'Lost'
+RFM_SEGMENT_RULES = [
+    ('Champions', ['444', '434', '443', '344']),
+    ('Loyal Customers', ['334', '343', '333', '324']),
+    ('Potential Loyalists', ['431', '441', '432']),
+    ('New Customers', ['142', '143', '144', '241', '242']),
+    ('Promising', ['313', '314', '323', '413', '414', '423']),
+    ('Need Attention', ['231', '232', '233', '321', '322']),
+    ('About to Sleep', ['131', '132', '141', '221', '222']),
+    ('At Risk', ['112', '113', '121', '122', '211', '212']),
+    ('Cannot Lose Them', ['123', '124', '213', '214', '223', '224'])
+]
+RFM_SEGMENT_NAMES = np.array([name for name, _ in RFM_SEGMENT_RULES] + ['Lost'], dtype=object)
+RFM_LOST_CODE = len(RFM_SEGMENT_RULES)
+
+def rfm_score_code(r_score, f_score, m_score):
+    """Integer-code r/f/m scores (1-4 each) as 0-63"""
+    return (r_score - 1) * 16 + (f_score - 1) * 4 + (m_score - 1)
+
+def _build_segment_lookup() -> np.ndarray:
+    """64-entry table from integer-coded RFM score to segment code"""
+    lookup = np.full(64, RFM_LOST_CODE, dtype=np.int8)
+    # Fill in reverse so earlier rules win, matching first-match semantics
+    for code in reversed(range(len(RFM_SEGMENT_RULES))):
+        for score in RFM_SEGMENT_RULES[code][1]:
+            r, f, m = (int(digit) for digit in score)
+            lookup[rfm_score_code(r, f, m)] = code
+    return lookup
+
+RFM_SEGMENT_LOOKUP = _build_segment_lookup()
+
+def quartile_scores(values, reverse: bool = False) -> np.ndarray:
+    """Array equivalent of pd.qcut(values.rank(method='first'), 4, labels=[1,2,3,4])
+    
+    Returns int8 scores 1-4 (4-1 when reverse), with 0 for missing values.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    scores = np.zeros(len(values), dtype=np.int8)
+    valid = ~np.isnan(values)
+    n = int(valid.sum())
+    
+    # First-occurrence ranks are positions in a stable sort
+    order = np.argsort(values[valid], kind='stable')
+    ranks = np.empty(n, dtype=np.float64)
+    ranks[order] = np.arange(1, n + 1)
+    
+    edges = np.quantile(ranks, [0, 0.25, 0.5, 0.75, 1]) if n else np.zeros(5)
+    if len(np.unique(edges)) < len(edges):
+        raise ValueError(f"Bin edges must be unique: {edges.tolist()}")
+    
+    # Right-closed bins with the lowest edge included, as in pd.qcut
+    bins = np.searchsorted(edges[1:-1], ranks, side='left').astype(np.int8)
+    scores[valid] = 4 - bins if reverse else bins + 1
+    return scores
+
+def assign_rfm_segments(r_score: np.ndarray, f_score: np.ndarray, m_score: np.ndarray) -> np.ndarray:
+    """Map integer r/f/m scores to segment codes through the lookup table"""
+    scored = (r_score > 0) & (f_score > 0) & (m_score > 0)
+    codes = np.full(len(r_score), RFM_LOST_CODE, dtype=np.int8)
+    codes[scored] = RFM_SEGMENT_LOOKUP[rfm_score_code(
+        r_score[scored].astype(np.int16), f_score[scored].astype(np.int16), m_score[scored].astype(np.int16)
+    )]
+    return codes
+
+def perform_rfm_segmentation(rfm_df: pd.DataFrame, quantiles: str = 'exact') -> Dict[str, Any]:
     """Perform RFM segmentation using quartiles with statistical validation"""
     
-    # Calculate quartile-based scores (1-4, where 4 is best)
-    rfm_df['r_score'] = pd.qcut(rfm_df['recency'].rank(method='first'), 4, labels=[4,3,2,1])
-    rfm_df['f_score'] = pd.qcut(rfm_df['frequency'].rank(method='first'), 4, labels=[1,2,3,4])
-    rfm_df['m_score'] = pd.qcut(rfm_df['monetary'].rank(method='first'), 4, labels=[1,2,3,4])
-    
-    # Create RFM score
-    rfm_df['rfm_score'] = rfm_df['r_score'].astype(str) + rfm_df['f_score'].astype(str) + rfm_df['m_score'].astype(str)
-    
-    # Define customer segments based on RFM scores
-    def segment_customers(row):
-        if row['rfm_score'] in ['444', '434', '443', '344']:
-            return 'Champions'
-        elif row['rfm_score'] in ['334', '343', '333', '324']:
-            return 'Loyal Customers'
-        elif row['rfm_score'] in ['431', '441', '432']:
-            return 'Potential Loyalists'
-        elif row['rfm_score'] in ['142', '143', '144', '241', '242']:
-            return 'New Customers'
-        elif row['rfm_score'] in ['313', '314', '323', '413', '414', '423']:
-            return 'Promising'
-        elif row['rfm_score'] in ['231', '232', '233', '321', '322']:
-            return 'Need Attention'
-        elif row['rfm_score'] in ['131', '132', '141', '221', '222']:
-            return 'About to Sleep'
-        elif row['rfm_score'] in ['112', '113', '121', '122', '211', '212']:
-            return 'At Risk'
-        elif row['rfm_score'] in ['123', '124', '213', '214', '223', '224']:
-            return 'Cannot Lose Them'
+    with timed_stage('rfm_scoring', len(rfm_df)):
+        # Calculate quartile-based scores (1-4, where 4 is best)
+        if quantiles == 'sketch':
+            # Value edges from one sketching pass instead of ranking every customer
+            edges = sketch_quartile_edges(rfm_df)
+            rfm_df['r_score'] = edge_scores(rfm_df['recency'], edges['recency'], reverse=True)
+            rfm_df['f_score'] = edge_scores(rfm_df['frequency'], edges['frequency'])
+            rfm_df['m_score'] = edge_scores(rfm_df['monetary'], edges['monetary'])
         else:
-            return 'Lost'
-    
-    rfm_df['segment'] = rfm_df.apply(segment_customers, axis=1)
+            rfm_df['r_score'] = quartile_scores(rfm_df['recency'], reverse=True)
+            rfm_df['f_score'] = quartile_scores(rfm_df['frequency'])
+            rfm_df['m_score'] = quartile_scores(rfm_df['monetary'])
+        
+        # Define customer segments based on RFM scores
+        segment_codes = assign_rfm_segments(rfm_df['r_score'].values, rfm_df['f_score'].values, rfm_df['m_score'].values)
+        rfm_df['segment'] = RFM_SEGMENT_NAMES[segment_codes]
     
     # Calculate segment statistics
     segment_stats = rfm_df.groupby('segment').agg({
@@ -187,16 +1412,666 @@ def perform_rfm_segmentation(rfm_df: pd.DataFrame) -> Dict[str, Any]:
         }
     
     return {
-        'segment_statistics': segment_stats_dict,
-        'statistical_validation': statistical_tests,
-        'segment_distribution': rfm_df['segment'].value_counts().to_dict(),
-        'total_customers': len(rfm_df)
+        'segment_statistics': segment_stats_dict,
+        'statistical_validation': statistical_tests,
+        'segment_distribution': rfm_df['segment'].value_counts().to_dict(),
+        'total_customers': len(rfm_df)
+    }
+
+# RFM Snapshots
+# RFM as of many reference dates from one aggregation: each transaction is bucketed by
+# the first snapshot it counts towards, per-customer bucket totals are accumulated
+# across snapshots with cumsum and np.maximum.accumulate, and each snapshot is then
+# scored and segmented like a single RFM run. Customers left out of scoring (outliers,
+# or everyone in a snapshot with fewer than two customers) are 'Unscored'.
+SNAPSHOT_UNSCORED = len(RFM_SEGMENT_NAMES)
+SNAPSHOT_NOT_CUSTOMER = SNAPSHOT_UNSCORED + 1
+SNAPSHOT_STATE_NAMES = np.array(list(RFM_SEGMENT_NAMES) + ['Unscored', 'Not Yet Customer'], dtype=object)
+NO_ORDER = np.iinfo(np.int64).min
+
+def snapshot_reference_dates(last_order_date: pd.Timestamp, snapshots: int, interval: str) -> pd.DatetimeIndex:
+    """Reference dates ending the day after the last order, stepping back by interval"""
+    end = last_order_date + pd.Timedelta(days=1)
+    return pd.DatetimeIndex([end - RFM_SNAPSHOT_INTERVALS[interval] * i for i in reversed(range(snapshots))])
+
+def rfm_snapshot_arrays(df: pd.DataFrame, reference_dates: pd.DatetimeIndex):
+    """Per-customer last order time (ns), order count and monetary as of each reference date
+    
+    Returns customer_ids and three customers x snapshots arrays; customers without orders
+    before a reference date have NO_ORDER as their last order time there.
+    """
+    codes, customer_ids = pd.factorize(df['customer_id'], sort=True)
+    order_ns = df['order_date'].to_numpy(dtype='datetime64[ns]').astype(np.int64)
+    keep = (codes >= 0) & (order_ns != NO_ORDER)
+    codes, order_ns = codes[keep], order_ns[keep]
+    has_order = df['order_id'].notna().to_numpy()[keep]
+    amounts = np.nan_to_num(df['total_amount'].to_numpy(dtype=np.float64, na_value=np.nan)[keep])
+    
+    # Orders on or after a reference date fall in later buckets, or in none
+    n_customers, n_snapshots = len(customer_ids), len(reference_dates)
+    bucket = np.searchsorted(reference_dates.to_numpy(dtype='datetime64[ns]').astype(np.int64), order_ns, side='right')
+    counted = bucket < n_snapshots
+    cells = codes[counted] * n_snapshots + bucket[counted]
+    shape = (n_customers, n_snapshots)
+    
+    frequency = np.bincount(cells, weights=has_order[counted], minlength=n_customers * n_snapshots)
+    monetary = np.bincount(cells, weights=amounts[counted], minlength=n_customers * n_snapshots)
+    last_order = np.full(n_customers * n_snapshots, NO_ORDER)
+    np.maximum.at(last_order, cells, order_ns[counted])
+    return (
+        customer_ids,
+        np.maximum.accumulate(last_order.reshape(shape), axis=1),
+        frequency.reshape(shape).cumsum(axis=1).astype(np.int64),
+        monetary.reshape(shape).cumsum(axis=1)
+    )
+
+def snapshot_states(recency: np.ndarray, frequency: np.ndarray, monetary: np.ndarray) -> np.ndarray:
+    """Segment code of each customer in one snapshot, or SNAPSHOT_UNSCORED if filtered as an outlier"""
+    states = np.full(len(recency), SNAPSHOT_UNSCORED, dtype=np.int8)
+    if len(recency) < 2:
+        return states
+    rfm = remove_rfm_outliers(pd.DataFrame({'recency': recency, 'frequency': frequency, 'monetary': monetary}))
+    states[rfm.index.to_numpy()] = assign_rfm_segments(
+        quartile_scores(rfm['recency'], reverse=True), quartile_scores(rfm['frequency']), quartile_scores(rfm['monetary'])
+    )
+    return states
+
+def rfm_snapshots(df: pd.DataFrame, snapshots: int = 12, interval: str = 'month') -> Dict[str, Any]:
+    """RFM segments as of each reference date and the transitions between consecutive snapshots"""
+    with timed_stage('snapshot_aggregates', len(df)):
+        df = coerce_rfm_columns(df)
+        reference_dates = snapshot_reference_dates(df['order_date'].max(), snapshots, interval)
+        customer_ids, last_order, frequency, monetary = rfm_snapshot_arrays(df, reference_dates)
+    
+    states = np.full((len(customer_ids), snapshots), SNAPSHOT_NOT_CUSTOMER, dtype=np.int8)
+    with timed_stage('snapshot_segments', len(customer_ids) * snapshots):
+        for j, reference_date in enumerate(reference_dates):
+            active = last_order[:, j] != NO_ORDER
+            recency = (reference_date.value - last_order[active, j]) // DAY_NS
+            states[active, j] = snapshot_states(recency, frequency[active, j], monetary[active, j])
+    
+    n_states = len(SNAPSHOT_STATE_NAMES)
+    snapshot_summaries = []
+    for j, reference_date in enumerate(reference_dates):
+        counts = np.bincount(states[:, j], minlength=n_states)
+        snapshot_summaries.append({
+            'reference_date': reference_date.isoformat(),
+            'total_customers': int(len(customer_ids) - counts[SNAPSHOT_NOT_CUSTOMER]),
+            'segmented_customers': int(counts[:SNAPSHOT_UNSCORED].sum()),
+            'segment_distribution': {SNAPSHOT_STATE_NAMES[code]: int(count) for code, count in enumerate(counts[:SNAPSHOT_UNSCORED]) if count}
+        })
+    
+    transitions = []
+    for j in range(1, snapshots):
+        matrix = np.bincount(states[:, j - 1].astype(np.int64) * n_states + states[:, j], minlength=n_states * n_states)
+        transitions.append({
+            'from_date': reference_dates[j - 1].isoformat(),
+            'to_date': reference_dates[j].isoformat(),
+            'states': SNAPSHOT_STATE_NAMES.tolist(),
+            'counts': matrix.reshape(n_states, n_states).tolist()
+        })
+    
+    return {
+        'interval': interval,
+        'snapshots': snapshot_summaries,
+        'transitions': transitions,
+        'total_customers': len(customer_ids)
+    }
+
+def dataset_rfm_snapshots(dataset_id: str, snapshots: int, interval: str) -> Dict[str, Any]:
+    """rfm_snapshots over a dataset's transactions, read from the columnar store by the worker"""
+    with timed_stage('load_transactions') as stage:
+        df = load_transactions(dataset_id, RFM_COLUMNS)
+        stage['rows'] = len(df)
+        stage['memory_bytes'] = int(df.memory_usage(deep=True).sum())
+    return rfm_snapshots(df, snapshots, interval)
+
+# Cluster Quality Metrics
+def stratified_sample_indices(labels: np.ndarray, sample_size: int, random_state: int = 42) -> np.ndarray:
+    """Sample indices proportionally from every cluster, keeping at least two points per cluster"""
+    n = len(labels)
+    if sample_size >= n:
+        return np.arange(n)
+    
+    rng = np.random.default_rng(random_state)
+    _, inverse, counts = np.unique(labels, return_inverse=True, return_counts=True)
+    quotas = np.minimum(counts, np.maximum(2, np.round(counts * sample_size / n).astype(int)))
+    
+    # Shuffle, then group by cluster so each cluster's quota is a random subset
+    shuffled = rng.permutation(n)
+    shuffled = shuffled[np.argsort(inverse[shuffled], kind='stable')]
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    return np.sort(np.concatenate([shuffled[start:start + quota] for start, quota in zip(starts, quotas)]))
+
+def silhouette_values(X: np.ndarray, labels: np.ndarray, mode: str = 'auto',
+                      sample_size: Optional[int] = None, random_state: int = 42):
+    """Per-point silhouette values, exact or on a stratified sample
+    
+    Exact mode computes pairwise distances in chunks bounded by METRICS_WORKING_MEMORY_MB.
+    Returns (values, mode_used, sample_size_used).
+    """
+    sample_size = sample_size or SILHOUETTE_SAMPLE_SIZE
+    if mode == 'auto':
+        mode = 'exact' if len(X) <= SILHOUETTE_EXACT_MAX else 'sampled'
+    
+    if mode == 'sampled' and sample_size < len(X):
+        indices = stratified_sample_indices(labels, sample_size, random_state)
+        X, labels = X[indices], labels[indices]
+    else:
+        mode = 'exact'
+    
+    with config_context(working_memory=METRICS_WORKING_MEMORY_MB):
+        values = silhouette_samples(X, labels)
+    return values, mode, len(values)
+
+@timed('cluster_metrics')
+def compute_cluster_metrics(X: np.ndarray, labels: np.ndarray, mode: str = 'auto', sample_size: Optional[int] = None,
+                            bootstrap_samples: int = 0, random_state: int = 42) -> Dict[str, Any]:
+    """Silhouette (exact or sampled, optionally with a bootstrap CI), Davies-Bouldin and Calinski-Harabasz"""
+    values, mode_used, sample_size_used = silhouette_values(X, labels, mode, sample_size, random_state)
+    metrics_info = {'mode': mode_used, 'sample_size': sample_size_used, 'total_points': len(X)}
+    
+    if bootstrap_samples:
+        # Resample the per-point silhouette values; cheap compared to recomputing distances.
+        # Resamples are drawn in batches whose index matrix fits METRICS_WORKING_MEMORY_MB.
+        rng = np.random.default_rng(random_state)
+        batch_size = max(1, METRICS_WORKING_MEMORY_MB * 2 ** 20 // (16 * len(values)))
+        means = np.concatenate([
+            values[rng.integers(0, len(values), size=(min(batch_size, bootstrap_samples - start), len(values)))].mean(axis=1)
+            for start in range(0, bootstrap_samples, batch_size)
+        ])
+        metrics_info['silhouette_ci'] = {
+            'level': 0.95,
+            'lower': float(np.percentile(means, 2.5)),
+            'upper': float(np.percentile(means, 97.5)),
+            'bootstrap_samples': bootstrap_samples
+        }
+    
+    # Davies-Bouldin and Calinski-Harabasz are linear in the number of points, so always exact
+    return {
+        'silhouette_score': float(np.mean(values)),
+        'davies_bouldin_score': float(davies_bouldin_score(X, labels)),
+        'calinski_harabasz_score': float(calinski_harabasz_score(X, labels)),
+        'metrics': metrics_info
+    }
+
+def _fit_kmeans_candidate(X_scaled: np.ndarray, k: int, minibatch: bool, metrics_options: Dict[str, Any]):
+    """Fit one candidate k and score it; returns (model, labels, inertia, silhouette)"""
+    if minibatch:
+        model = MiniBatchKMeans(n_clusters=k, random_state=42, n_init=3, batch_size=4096)
+    else:
+        model = KMeans(n_clusters=k, random_state=42, n_init=10)
+    cluster_labels = model.fit_predict(X_scaled)
+    values, _, _ = silhouette_values(X_scaled, cluster_labels, **metrics_options)
+    return model, cluster_labels, float(model.inertia_), float(np.mean(values))
+
+@timed('kmeans_sweep')
+def select_kmeans_k(X_scaled: np.ndarray, k_values=KMEANS_K_RANGE, minibatch: bool = False,
+                    early_stopping_rounds: Optional[int] = None, n_jobs: Optional[int] = None,
+                    metrics_options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Fit candidate k values concurrently and keep the fitted model of the best one
+    
+    With early_stopping_rounds, candidates are fitted in waves of at most
+    early_stopping_rounds + 1 and the sweep stops once silhouette has not improved for
+    that many consecutive k values; larger waves would fit k values the stop should skip.
+    """
+    k_values = list(k_values)
+    n_jobs = max(1, min(n_jobs or ANALYSIS_MAX_WORKERS, len(k_values)))
+    if early_stopping_rounds:
+        n_jobs = min(n_jobs, early_stopping_rounds + 1)
+    wave_size = n_jobs if early_stopping_rounds else len(k_values)
+    metrics_options = {'mode': (metrics_options or {}).get('mode', 'auto'),
+                       'sample_size': (metrics_options or {}).get('sample_size')}
+    candidates = {}
+    
+    # Split the cores between concurrent fits instead of oversubscribing them
+    with threadpool_limits(limits=max(1, (os.cpu_count() or 1) // n_jobs)), ThreadPoolExecutor(max_workers=n_jobs) as pool:
+        for start in range(0, len(k_values), wave_size):
+            wave = k_values[start:start + wave_size]
+            for k, candidate in zip(wave, pool.map(lambda k: _fit_kmeans_candidate(X_scaled, k, minibatch, metrics_options), wave)):
+                candidates[k] = candidate
+            
+            evaluated = list(candidates)
+            best_position = int(np.argmax([candidates[k][3] for k in evaluated]))
+            if early_stopping_rounds and len(evaluated) - 1 - best_position >= early_stopping_rounds:
+                break
+    
+    evaluated = list(candidates)
+    silhouette_scores = [candidates[k][3] for k in evaluated]
+    optimal_k = evaluated[int(np.argmax(silhouette_scores))]
+    model, cluster_labels, _, _ = candidates[optimal_k]
+    
+    return {
+        'optimal_k': optimal_k,
+        'model': model,
+        'cluster_labels': cluster_labels,
+        'elbow_data': {
+            'k_values': evaluated,
+            'inertias': [candidates[k][2] for k in evaluated],
+            'silhouette_scores': silhouette_scores
+        }
+    }
+
+# Hierarchical Clustering
+# Exact Ward linkage needs quadratic memory, so larger inputs are first compressed
+# into BIRCH micro-clusters and Ward linkage runs over their centroids.
+def agglomerative_linkage(model: AgglomerativeClustering) -> np.ndarray:
+    """SciPy linkage matrix from an AgglomerativeClustering fitted with compute_distances"""
+    n = len(model.labels_)
+    counts = np.zeros(len(model.children_))
+    for i, (left, right) in enumerate(model.children_):
+        counts[i] = (1 if left < n else counts[left - n]) + (1 if right < n else counts[right - n])
+    return np.column_stack([model.children_, model.distances_, counts]).astype(np.float64)
+
+def dendrogram_summary(Z: np.ndarray, leaf_weights: np.ndarray, leaves: int = DENDROGRAM_LEAVES) -> Dict[str, Any]:
+    """Top of the dendrogram, truncated to the last merges, with customer counts under each leaf"""
+    n = len(leaf_weights)
+    weights = np.concatenate([leaf_weights, np.zeros(len(Z))])
+    for i, (left, right) in enumerate(Z[:, :2].astype(int)):
+        weights[n + i] = weights[left] + weights[right]
+    
+    tree = dendrogram(Z, truncate_mode='lastp', p=leaves, no_plot=True)
+    return {
+        'linkage_leaves': n,
+        'icoord': tree['icoord'],
+        'dcoord': tree['dcoord'],
+        'leaf_customers': weights[tree['leaves']].astype(int).tolist(),
+        'merge_distances': Z[-(leaves - 1):, 2][::-1].tolist()
+    }
+
+def birch_hierarchical(X_scaled: np.ndarray, n_clusters: int, random_state: int = 42):
+    """Ward linkage over BIRCH micro-clusters
+    
+    The CF-tree is built on a bounded sample, with the threshold coarsened until the
+    micro-clusters are few enough to link exactly; every customer is then assigned to
+    its nearest micro-cluster. Returns (labels, linkage, micro-cluster sizes, threshold).
+    """
+    rng = np.random.default_rng(random_state)
+    sample = X_scaled
+    if len(X_scaled) > BIRCH_SAMPLE_SIZE:
+        sample = X_scaled[rng.choice(len(X_scaled), BIRCH_SAMPLE_SIZE, replace=False)]
+    
+    threshold = BIRCH_THRESHOLD
+    birch = Birch(threshold=threshold, n_clusters=None).fit(sample)
+    while len(birch.subcluster_centers_) > BIRCH_MAX_SUBCLUSTERS:
+        threshold *= 1.5
+        birch = Birch(threshold=threshold, n_clusters=None).fit(sample)
+    
+    centers = birch.subcluster_centers_
+    if len(centers) < n_clusters:
+        raise ValueError(f"Only {len(centers)} micro-clusters found; lower BIRCH_THRESHOLD or n_clusters")
+    micro_labels = birch.predict(X_scaled)
+    Z = linkage(centers, method='ward')
+    micro_clusters = fcluster(Z, n_clusters, criterion='maxclust') - 1
+    return micro_clusters[micro_labels], Z, np.bincount(micro_labels, minlength=len(centers)), threshold
+
+@timed('hierarchical_clustering')
+def hierarchical_clustering(X_scaled: np.ndarray, n_clusters: int, mode: str = 'auto') -> Dict[str, Any]:
+    """Ward clustering, exact on small inputs and via BIRCH micro-clusters otherwise
+    
+    When the BIRCH path runs on data small enough for the exact method, its labels
+    are compared to exact Ward labels by adjusted Rand index.
+    """
+    if mode == 'auto':
+        mode = 'exact' if len(X_scaled) <= HIERARCHICAL_EXACT_MAX else 'birch'
+    
+    if mode == 'exact':
+        model = AgglomerativeClustering(n_clusters=n_clusters, linkage='ward', compute_distances=True)
+        cluster_labels = model.fit_predict(X_scaled)
+        return {
+            'hierarchical_mode': 'exact',
+            'cluster_labels': cluster_labels,
+            'dendrogram': dendrogram_summary(agglomerative_linkage(model), np.ones(len(X_scaled)))
+        }
+    
+    cluster_labels, Z, micro_sizes, threshold = birch_hierarchical(X_scaled, n_clusters)
+    results = {
+        'hierarchical_mode': 'birch',
+        'cluster_labels': cluster_labels,
+        'micro_clusters': len(micro_sizes),
+        'birch_threshold': threshold,
+        'dendrogram': dendrogram_summary(Z, micro_sizes)
+    }
+    if len(X_scaled) <= HIERARCHICAL_EXACT_MAX:
+        exact_labels = AgglomerativeClustering(n_clusters=n_clusters, linkage='ward').fit_predict(X_scaled)
+        results['label_quality'] = {
+            'reference': 'exact_ward',
+            'adjusted_rand_index': float(adjusted_rand_score(exact_labels, cluster_labels))
+        }
+    return results
+
+# Density Clustering
+# eps is read off the k-distance curve, and one radius-neighbors graph built at the
+# widest candidate eps is reused by every DBSCAN fit in the sweep.
+def k_distance_knee(k_distances: np.ndarray) -> float:
+    """Knee of the sorted k-distance curve: the point furthest below the chord from first to last"""
+    y = np.sort(k_distances)
+    span = y[-1] - y[0]
+    if span <= 0:
+        return float(y[-1])
+    x_norm = np.linspace(0, 1, len(y))
+    y_norm = (y - y[0]) / span
+    return float(y[np.argmax(x_norm - y_norm)])
+
+def radius_graph_eps_cap(sample: np.ndarray, random_state: int = 42) -> float:
+    """Largest eps whose radius graph over sample averages at most DBSCAN_MAX_MEAN_NEIGHBORS neighbors
+    
+    Estimated from the distances of a few probe points to the whole sample.
+    """
+    rng = np.random.default_rng(random_state)
+    probes = sample[rng.choice(len(sample), min(len(sample), DBSCAN_DENSITY_PROBES), replace=False)]
+    distances = euclidean_distances(probes, sample).ravel()
+    budget = DBSCAN_MAX_MEAN_NEIGHBORS * len(probes)
+    if budget >= len(distances):
+        return np.inf
+    return float(np.partition(distances, budget)[budget])
+
+def assign_to_nearest_core(X: np.ndarray, core_points: np.ndarray, core_labels: np.ndarray, eps: float) -> np.ndarray:
+    """Label each point with its nearest core point's cluster when within eps, otherwise as noise"""
+    if len(core_points) == 0:
+        return np.full(len(X), -1)
+    distances, indices = NearestNeighbors(n_neighbors=1).fit(core_points).kneighbors(X)
+    return np.where(distances[:, 0] <= eps, core_labels[indices[:, 0]], -1)
+
+@timed('density_clustering')
+def density_clustering(X_scaled: np.ndarray, eps: Optional[float] = None, min_samples: int = DBSCAN_MIN_SAMPLES,
+                       random_state: int = 42) -> Dict[str, Any]:
+    """DBSCAN with eps chosen from the k-distance curve
+    
+    Large inputs are clustered on a sample and the remaining customers are assigned to
+    their nearest core sample. Without an explicit eps, candidates around the knee are
+    compared by silhouette over non-noise points. Every eps, explicit ones included, is
+    capped so the precomputed radius graph stays within DBSCAN_MAX_MEAN_NEIGHBORS per point.
+    """
+    sample_indices = None
+    sample = X_scaled
+    if len(X_scaled) > DBSCAN_SAMPLE_SIZE:
+        sample_indices = np.sort(np.random.default_rng(random_state).choice(len(X_scaled), DBSCAN_SAMPLE_SIZE, replace=False))
+        sample = X_scaled[sample_indices]
+    
+    # The neighbor index is built once; DBSCAN counts the point itself towards min_samples
+    neighbors = NearestNeighbors(n_neighbors=min_samples - 1).fit(sample)
+    k_distances = neighbors.kneighbors()[0][:, -1]
+    knee_eps = k_distance_knee(k_distances)
+    candidates = [eps] if eps is not None else [knee_eps * factor for factor in DBSCAN_EPS_FACTORS]
+    eps_cap = radius_graph_eps_cap(sample, random_state)
+    candidates = sorted({min(candidate, eps_cap) for candidate in candidates})
+    graph = neighbors.radius_neighbors_graph(radius=max(candidates), mode='distance', sort_results=True)
+    
+    sweep = []
+    best = None
+    for candidate in candidates:
+        model = DBSCAN(eps=candidate, min_samples=min_samples, metric='precomputed').fit(graph)
+        labels = model.labels_
+        n_clusters = len(set(labels)) - (1 if -1 in labels else 0)
+        noise_fraction = float(np.mean(labels == -1))
+        silhouette = None
+        if n_clusters > 1 and noise_fraction <= DBSCAN_MAX_NOISE_FRACTION:
+            clustered = labels >= 0
+            values = silhouette_values(sample[clustered], labels[clustered], mode='sampled',
+                                       sample_size=DBSCAN_SWEEP_SILHOUETTE_SAMPLE, random_state=random_state)[0]
+            silhouette = float(np.mean(values))
+            if best is None or silhouette > best[0]:
+                best = (silhouette, candidate, model)
+        sweep.append({'eps': candidate, 'clusters': n_clusters, 'noise_fraction': noise_fraction, 'silhouette': silhouette})
+    
+    curve_positions = np.linspace(0, len(k_distances) - 1, min(K_DISTANCE_POINTS, len(k_distances))).astype(int)
+    results = {
+        'min_samples': min_samples,
+        'k_distance': {
+            'k': min_samples - 1,
+            'sorted_distances': np.sort(k_distances)[curve_positions].tolist(),
+            'knee_eps': knee_eps
+        },
+        'eps_sweep': sweep,
+        'fit_sample_size': len(sample)
+    }
+    if eps is not None and eps > eps_cap:
+        results['eps_capped'] = {'requested': eps, 'cap': eps_cap}
+    if best is None:
+        return results
+    
+    _, results['eps'], model = best
+    cluster_labels = model.labels_
+    if sample_indices is not None:
+        core = model.core_sample_indices_
+        cluster_labels = assign_to_nearest_core(X_scaled, sample[core], model.labels_[core], results['eps'])
+        cluster_labels[sample_indices] = model.labels_
+    results['cluster_labels'] = cluster_labels
+    return results
+
+def rfm_quartile_edges(rfm_df: pd.DataFrame) -> Dict[str, List[float]]:
+    """Value quartile edges of each RFM dimension, for scoring customers outside the fitted data"""
+    return {col: np.quantile(rfm_df[col].dropna(), [0.25, 0.5, 0.75]).tolist() for col in ['recency', 'frequency', 'monetary']}
+
+@timed('segmentation_model')
+def build_segmentation_model(X: pd.DataFrame, X_scaled: np.ndarray, scaler: StandardScaler, cluster_labels: np.ndarray,
+                             rfm_df: pd.DataFrame, fitted_model=None) -> Dict[str, Any]:
+    """Capture what is needed to assign new customers to the fitted clusters
+    
+    Centroid-based models keep their own centers and Gaussian mixtures their weights,
+    means and precision Cholesky factors; other methods are reduced to the mean of each
+    cluster in scaled space and assign new customers to the nearest one.
+    """
+    mixture = None
+    if isinstance(fitted_model, GaussianMixture):
+        cluster_ids = np.arange(fitted_model.n_components)
+        centroids = fitted_model.means_
+        mixture = {
+            'weights': fitted_model.weights_.tolist(),
+            'means': fitted_model.means_.tolist(),
+            'precisions_cholesky': fitted_model.precisions_cholesky_.tolist()
+        }
+    elif fitted_model is not None and hasattr(fitted_model, 'cluster_centers_'):
+        cluster_ids = np.arange(len(fitted_model.cluster_centers_))
+        centroids = fitted_model.cluster_centers_
+    else:
+        cluster_ids = np.unique(cluster_labels[cluster_labels >= 0])
+        centroids = np.vstack([X_scaled[cluster_labels == cluster].mean(axis=0) for cluster in cluster_ids])
+    
+    return {
+        'features': X.columns.tolist(),
+        'fill_values': X.median().tolist(),
+        'scaler_mean': scaler.mean_.tolist(),
+        'scaler_scale': scaler.scale_.tolist(),
+        'cluster_ids': cluster_ids.tolist(),
+        'centroids': centroids.tolist(),
+        'mixture': mixture,
+        'rfm_edges': rfm_quartile_edges(rfm_df)
+    }
+
+class SegmentationModel:
+    """Persisted scaler, centroids or mixture components and RFM quartile edges with a vectorized predict"""
+
+    def __init__(self, document: Dict[str, Any]):
+        self.id = document['id']
+        self.fill_values = np.asarray(document['fill_values'], dtype=np.float64)
+        self.scaler_mean = np.asarray(document['scaler_mean'], dtype=np.float64)
+        self.scaler_scale = np.asarray(document['scaler_scale'], dtype=np.float64)
+        self.cluster_ids = np.asarray(document['cluster_ids'])
+        self.centroids = np.asarray(document['centroids'], dtype=np.float64)
+        self.mixture = None
+        if document.get('mixture') is not None:
+            self.mixture = {name: np.asarray(values, dtype=np.float64) for name, values in document['mixture'].items()}
+        self.rfm_edges = {col: np.asarray(edges, dtype=np.float64) for col, edges in document['rfm_edges'].items()}
+
+    def predict_clusters(self, X: np.ndarray) -> np.ndarray:
+        X = np.where(np.isnan(X), self.fill_values, X)
+        X_scaled = (X - self.scaler_mean) / self.scaler_scale
+        if self.mixture is not None:
+            return self.cluster_ids[np.argmax(self._mixture_log_likelihood(X_scaled), axis=1)]
+        distances = ((X_scaled[:, None, :] - self.centroids[None, :, :]) ** 2).sum(axis=2)
+        return self.cluster_ids[np.argmin(distances, axis=1)]
+
+    def _mixture_log_likelihood(self, X_scaled: np.ndarray) -> np.ndarray:
+        """Weighted log density of each full-covariance component, as GaussianMixture.predict scores them"""
+        means = self.mixture['means']
+        precisions_cholesky = self.mixture['precisions_cholesky']
+        log_det = np.log(np.diagonal(precisions_cholesky, axis1=1, axis2=2)).sum(axis=1)
+        y = np.einsum('nd,kde->nke', X_scaled, precisions_cholesky) - np.einsum('kd,kde->ke', means, precisions_cholesky)
+        log_density = -0.5 * (X_scaled.shape[1] * np.log(2 * np.pi) + (y ** 2).sum(axis=2)) + log_det
+        return log_density + np.log(self.mixture['weights'])
+
+    def predict_segments(self, X: np.ndarray) -> np.ndarray:
+        """RFM segment names from the stored quartile edges (right-closed bins, as in quartile_scores)"""
+        r_score = (4 - np.searchsorted(self.rfm_edges['recency'], X[:, 0], side='left')).astype(np.int8)
+        f_score = (np.searchsorted(self.rfm_edges['frequency'], X[:, 1], side='left') + 1).astype(np.int8)
+        m_score = (np.searchsorted(self.rfm_edges['monetary'], X[:, 2], side='left') + 1).astype(np.int8)
+        return RFM_SEGMENT_NAMES[assign_rfm_segments(r_score, f_score, m_score)]
+
+# Customer Lifetime Value
+# BG/NBD models repeat purchases and dropout, Gamma-Gamma the spend per purchase
+# (Fader, Hardie & Lee 2005). Every function works on whole arrays of customers.
+def clv_inputs(customers: pd.DataFrame, reference_date: pd.Timestamp):
+    """Repeat purchase days x, recency t_x and age T in days, plus mean spend per purchase day
+    
+    Purchases are distinct order days, not line items, as the models assume.
+    """
+    order_days = customers['order_days'].to_numpy(dtype=np.float64)
+    x = np.maximum(order_days - 1, 0)
+    t_x = (customers['last_order_date'] - customers['first_order_date']).dt.days.to_numpy(dtype=np.float64)
+    T = (reference_date - customers['first_order_date']).dt.days.to_numpy(dtype=np.float64)
+    mean_value = customers['monetary'].to_numpy(dtype=np.float64) / np.maximum(order_days, 1)
+    return x, np.nan_to_num(t_x), np.nan_to_num(T), mean_value
+
+def _bgnbd_log_likelihood(params: np.ndarray, x: np.ndarray, t_x: np.ndarray, T: np.ndarray) -> np.ndarray:
+    r, alpha, a, b = params
+    a1 = gammaln(r + x) - gammaln(r) + r * np.log(alpha)
+    a2 = gammaln(a + b) + gammaln(b + x) - gammaln(b) - gammaln(a + b + x)
+    a3 = -(r + x) * np.log(alpha + T)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        a4 = np.where(x > 0, np.log(a) - np.log(b + x - 1) - (r + x) * np.log(alpha + t_x), -np.inf)
+    return a1 + a2 + np.logaddexp(a3, a4)
+
+def fit_bgnbd(x: np.ndarray, t_x: np.ndarray, T: np.ndarray) -> Dict[str, float]:
+    """Maximum-likelihood BG/NBD parameters, optimized in log space"""
+    def objective(log_params):
+        return -_bgnbd_log_likelihood(np.exp(log_params), x, t_x, T).mean()
+    
+    start = np.log([1.0, max(T.mean(), 1.0), 1.0, 1.0])
+    result = minimize(objective, start, method='L-BFGS-B', bounds=[(-10, 10)] * 4)
+    r, alpha, a, b = np.exp(result.x)
+    return {'r': float(r), 'alpha': float(alpha), 'a': float(a), 'b': float(b)}
+
+def _bgnbd_alive_odds(params: Dict[str, float], x: np.ndarray, t_x: np.ndarray, T: np.ndarray) -> np.ndarray:
+    r, alpha, a, b = params['r'], params['alpha'], params['a'], params['b']
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        odds = a / (b + x - 1) * ((alpha + T) / (alpha + t_x)) ** (r + x)
+    return np.where(x > 0, odds, 0.0)
+
+def bgnbd_probability_alive(params: Dict[str, float], x: np.ndarray, t_x: np.ndarray, T: np.ndarray) -> np.ndarray:
+    return 1.0 / (1.0 + _bgnbd_alive_odds(params, x, t_x, T))
+
+def bgnbd_expected_purchases(params: Dict[str, float], horizon: float, x: np.ndarray, t_x: np.ndarray,
+                             T: np.ndarray) -> np.ndarray:
+    """Expected purchases over the next horizon days given each customer's history"""
+    r, alpha, a, b = params['r'], params['alpha'], params['a'], params['b']
+    if a <= 1:
+        # The closed form needs a > 1; fall back to the Pareto/NBD-style rate times P(alive)
+        rate = (r + x) / (alpha + T)
+        return rate * horizon * bgnbd_probability_alive(params, x, t_x, T)
+    ratio = (alpha + T) / (alpha + T + horizon)
+    numerator = (a + b + x - 1) / (a - 1) * (
+        1 - ratio ** (r + x) * hyp2f1(r + x, b + x, a + b + x - 1, horizon / (alpha + T + horizon))
+    )
+    return numerator / (1.0 + _bgnbd_alive_odds(params, x, t_x, T))
+
+def fit_gamma_gamma(frequency: np.ndarray, mean_value: np.ndarray) -> Dict[str, float]:
+    """Maximum-likelihood Gamma-Gamma spend parameters over customers with repeat purchases"""
+    mask = (frequency > 1) & (mean_value > 0)
+    n, m = frequency[mask], mean_value[mask]
+    
+    def objective(log_params):
+        p, q, v = np.exp(log_params)
+        log_likelihood = (gammaln(p * n + q) - gammaln(p * n) - gammaln(q) + q * np.log(v)
+                          + (p * n - 1) * np.log(m) + p * n * np.log(n) - (p * n + q) * np.log(n * m + v))
+        return -log_likelihood.mean()
+    
+    start = np.log([1.0, 2.0, max(float(np.median(m)) if len(m) else 1.0, 1.0)])
+    result = minimize(objective, start, method='L-BFGS-B', bounds=[(-10, 15)] * 3)
+    p, q, v = np.exp(result.x)
+    return {'p': float(p), 'q': float(q), 'v': float(v)}
+
+def gamma_gamma_expected_value(params: Dict[str, float], frequency: np.ndarray, mean_value: np.ndarray) -> np.ndarray:
+    """Expected spend per purchase, shrinking each customer's mean towards the population mean"""
+    p, q, v = params['p'], params['q'], params['v']
+    population_mean = p * v / (q - 1) if q > 1 else float(np.mean(mean_value))
+    conditional = p * (v + frequency * mean_value) / (p * frequency + q - 1)
+    return np.where((frequency > 1) & (q > 1), conditional, population_mean)
+
+def score_customer_value(dataset_id: str, horizon_days: int, analysis_id: str) -> Dict[str, Any]:
+    """Fit BG/NBD and Gamma-Gamma on a sample of customers, then score every customer in chunks
+    
+    Scores are streamed to customer_scores/<analysis_id>.parquet one row group per chunk.
+    """
+    customers = load_customer_aggregates(dataset_id)
+    if 'order_days' not in customers.columns:
+        customers['order_days'] = scan_order_days(dataset_id)[1].reindex(customers.index, fill_value=0)
+    reference_date = customers['last_order_date'].max() + pd.Timedelta(days=1)
+    
+    rng = np.random.default_rng(42)
+    sample = customers.iloc[rng.choice(len(customers), min(len(customers), CLV_FIT_SAMPLE_SIZE), replace=False)]
+    x, t_x, T, mean_value = clv_inputs(sample, reference_date)
+    with timed_stage('clv_fit', len(sample)):
+        bgnbd_params = fit_bgnbd(x, t_x, T)
+        gamma_gamma_params = fit_gamma_gamma(x + 1, mean_value)
+    
+    # RFM scores over all customers give each scored customer its segment
+    rfm = rfm_from_customer_aggregates(customers)
+    r_score = quartile_scores(rfm['recency'], reverse=True)
+    f_score = quartile_scores(rfm['frequency'])
+    m_score = quartile_scores(rfm['monetary'])
+    segment_codes = assign_rfm_segments(r_score, f_score, m_score)
+    rfm_scores = np.char.add(np.char.add(r_score.astype(str), f_score.astype(str)), m_score.astype(str))
+    
+    path = customer_scores_path(dataset_id, analysis_id)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f'.{path.name}.tmp')
+    writer = None
+    total_clv = 0.0
+    churn_sum = 0.0
+    try:
+        for start in range(0, len(customers), CLV_SCORING_CHUNK_SIZE):
+            chunk = slice(start, start + CLV_SCORING_CHUNK_SIZE)
+            x, t_x, T, mean_value = clv_inputs(customers.iloc[chunk], reference_date)
+            purchases = bgnbd_expected_purchases(bgnbd_params, horizon_days, x, t_x, T)
+            clv = purchases * gamma_gamma_expected_value(gamma_gamma_params, x + 1, mean_value)
+            churn = 1.0 - bgnbd_probability_alive(bgnbd_params, x, t_x, T)
+            
+            table = pa.table({
+                'customer_id': customers.index[chunk].astype(str),
+                'segment': rfm_scores[chunk],
+                'segment_name': RFM_SEGMENT_NAMES[segment_codes[chunk]].astype(str),
+                'recency': rfm['recency'].to_numpy(dtype=np.float64)[chunk],
+                'frequency': rfm['frequency'].to_numpy(dtype=np.int64)[chunk],
+                'monetary': rfm['monetary'].to_numpy(dtype=np.float64)[chunk],
+                'clv_prediction': clv,
+                'churn_probability': churn
+            })
+            if writer is None:
+                writer = pq.ParquetWriter(tmp_path, table.schema)
+            writer.write_table(table)
+            total_clv += float(np.nansum(clv))
+            churn_sum += float(np.nansum(churn))
+    finally:
+        if writer is not None:
+            writer.close()
+    os.replace(tmp_path, path)
+    
+    return {
+        'customers_scored': len(customers),
+        'horizon_days': horizon_days,
+        'reference_date': reference_date.strftime('%Y-%m-%d'),
+        'fit_sample_size': len(sample),
+        'bgnbd_parameters': bgnbd_params,
+        'gamma_gamma_parameters': gamma_gamma_params,
+        'total_predicted_clv': total_clv,
+        'mean_predicted_clv': total_clv / len(customers),
+        'mean_churn_probability': churn_sum / len(customers)
     }
 
-def perform_advanced_clustering(rfm_df: pd.DataFrame, method: str = 'kmeans') -> Dict[str, Any]:
-    """Perform advanced clustering with multiple algorithms and validation"""
-    
-    # Prepare features for clustering
+def prepare_clustering_features(rfm_df: pd.DataFrame):
+    """Median-filled RFM features and their standardized matrix"""
     features = ['recency', 'frequency', 'monetary']
     X = rfm_df[features].copy()
     
@@ -204,71 +2079,117 @@ def perform_advanced_clustering(rfm_df: pd.DataFrame, method: str = 'kmeans') ->
     X = X.fillna(X.median())
     
     # Feature scaling
-    scaler = StandardScaler()
-    X_scaled = scaler.fit_transform(X)
+    with timed_stage('scaling', len(X)):
+        scaler = StandardScaler()
+        X_scaled = scaler.fit_transform(X)
+    return X, scaler, X_scaled
+
+@timed('gaussian_mixture')
+def gaussian_mixture_clustering(X_scaled: np.ndarray, n_components: Optional[int] = None,
+                                random_state: int = 42) -> Dict[str, Any]:
+    """Gaussian mixture fitted on a bounded sample, with the component count chosen by BIC"""
+    sample = X_scaled
+    if len(X_scaled) > GMM_SAMPLE_SIZE:
+        sample = X_scaled[np.random.default_rng(random_state).choice(len(X_scaled), GMM_SAMPLE_SIZE, replace=False)]
     
+    candidates = [n_components] if n_components else list(KMEANS_K_RANGE)
+    models = [GaussianMixture(n_components=k, covariance_type='full', random_state=random_state).fit(sample)
+              for k in candidates]
+    bic = [float(model.bic(sample)) for model in models]
+    best = int(np.argmin(bic))
+    return {
+        'model': models[best],
+        'cluster_labels': models[best].predict(X_scaled),
+        'bic_data': {'k_values': candidates, 'bic': bic}
+    }
+
+def fit_clustering_method(X_scaled: np.ndarray, method: str = 'kmeans', kmeans_mode: str = 'auto',
+                          early_stopping_rounds: Optional[int] = None, n_clusters: Optional[int] = None,
+                          hierarchical_mode: str = 'auto', eps: Optional[float] = None,
+                          min_samples: int = DBSCAN_MIN_SAMPLES, metrics_options: Optional[Dict[str, Any]] = None):
+    """Run one clustering algorithm on scaled features; returns (results, fitted model or None)"""
     results = {}
+    fitted_model = None
+    metrics_options = metrics_options or {}
     
     if method == 'kmeans':
-        # Elbow method for optimal k
-        inertias = []
-        silhouette_scores = []
-        k_range = range(2, 11)
-        
-        for k in k_range:
-            kmeans = KMeans(n_clusters=k, random_state=42, n_init=10)
-            cluster_labels = kmeans.fit_predict(X_scaled)
-            inertias.append(kmeans.inertia_)
-            silhouette_scores.append(silhouette_score(X_scaled, cluster_labels))
-        
-        # Find optimal k using elbow method
-        optimal_k = k_range[np.argmax(silhouette_scores)]
-        
-        # Final clustering
-        kmeans_final = KMeans(n_clusters=optimal_k, random_state=42, n_init=10)
-        cluster_labels = kmeans_final.fit_predict(X_scaled)
+        # Select k by silhouette over a concurrent sweep, reusing the winning fit
+        minibatch = kmeans_mode == 'minibatch' or (kmeans_mode == 'auto' and len(X_scaled) > MINIBATCH_KMEANS_THRESHOLD)
+        selection = select_kmeans_k(X_scaled, minibatch=minibatch, early_stopping_rounds=early_stopping_rounds,
+                                    metrics_options=metrics_options)
+        cluster_labels = selection['cluster_labels']
+        fitted_model = selection['model']
         
         results = {
             'method': 'K-Means',
-            'optimal_clusters': optimal_k,
-            'cluster_labels': cluster_labels.tolist(),
-            'silhouette_score': silhouette_score(X_scaled, cluster_labels),
-            'davies_bouldin_score': davies_bouldin_score(X_scaled, cluster_labels),
-            'calinski_harabasz_score': calinski_harabasz_score(X_scaled, cluster_labels),
-            'elbow_data': {'k_values': list(k_range), 'inertias': inertias, 'silhouette_scores': silhouette_scores}
+            'kmeans_mode': 'minibatch' if minibatch else 'full',
+            'optimal_clusters': selection['optimal_k'],
+            'cluster_labels': cluster_labels,
+            **compute_cluster_metrics(X_scaled, cluster_labels, **metrics_options),
+            'elbow_data': selection['elbow_data']
         }
         
     elif method == 'hierarchical':
-        # Hierarchical clustering
-        hierarchical = AgglomerativeClustering(n_clusters=5, linkage='ward')
-        cluster_labels = hierarchical.fit_predict(X_scaled)
+        # Ward hierarchical clustering, via BIRCH micro-clusters on large inputs
+        hierarchical = hierarchical_clustering(X_scaled, n_clusters or DEFAULT_N_CLUSTERS, hierarchical_mode)
+        cluster_labels = hierarchical.pop('cluster_labels')
         
         results = {
             'method': 'Hierarchical',
-            'optimal_clusters': 5,
-            'cluster_labels': cluster_labels.tolist(),
-            'silhouette_score': silhouette_score(X_scaled, cluster_labels),
-            'davies_bouldin_score': davies_bouldin_score(X_scaled, cluster_labels),
-            'calinski_harabasz_score': calinski_harabasz_score(X_scaled, cluster_labels)
+            'optimal_clusters': len(np.unique(cluster_labels)),
+            'cluster_labels': cluster_labels,
+            **compute_cluster_metrics(X_scaled, cluster_labels, **metrics_options),
+            **hierarchical
         }
         
     elif method == 'dbscan':
-        # DBSCAN clustering
-        dbscan = DBSCAN(eps=0.5, min_samples=5)
-        cluster_labels = dbscan.fit_predict(X_scaled)
-        
-        n_clusters = len(set(cluster_labels)) - (1 if -1 in cluster_labels else 0)
+        # DBSCAN with eps picked from the k-distance curve
+        density = density_clustering(X_scaled, eps=eps, min_samples=min_samples)
+        cluster_labels = density.pop('cluster_labels', None)
         
-        if n_clusters > 1:
+        if cluster_labels is not None:
             results = {
                 'method': 'DBSCAN',
-                'optimal_clusters': n_clusters,
-                'cluster_labels': cluster_labels.tolist(),
-                'silhouette_score': silhouette_score(X_scaled, cluster_labels) if n_clusters > 1 else -1,
-                'noise_points': np.sum(cluster_labels == -1)
+                'optimal_clusters': len(np.unique(cluster_labels[cluster_labels >= 0])),
+                'cluster_labels': cluster_labels,
+                **compute_cluster_metrics(X_scaled, cluster_labels, **metrics_options),
+                'noise_points': np.sum(cluster_labels == -1),
+                **density
             }
         else:
-            results = {'error': 'DBSCAN could not find meaningful clusters'}
+            results = {'error': 'DBSCAN could not find meaningful clusters', **density}
+        
+    elif method == 'gmm':
+        # Gaussian mixture with the component count chosen by BIC
+        mixture = gaussian_mixture_clustering(X_scaled, n_components=n_clusters)
+        cluster_labels = mixture['cluster_labels']
+        fitted_model = mixture['model']
+        
+        results = {
+            'method': 'Gaussian Mixture',
+            'optimal_clusters': len(np.unique(cluster_labels)),
+            'cluster_labels': cluster_labels,
+            **compute_cluster_metrics(X_scaled, cluster_labels, **metrics_options),
+            'bic_data': mixture['bic_data']
+        }
+    
+    return results, fitted_model
+
+def perform_advanced_clustering(rfm_df: pd.DataFrame, method: str = 'kmeans', kmeans_mode: str = 'auto',
+                                early_stopping_rounds: Optional[int] = None, n_clusters: Optional[int] = None,
+                                hierarchical_mode: str = 'auto', eps: Optional[float] = None,
+                                min_samples: int = DBSCAN_MIN_SAMPLES,
+                                metrics_options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Perform advanced clustering with multiple algorithms and validation"""
+    
+    # Prepare features for clustering
+    X, scaler, X_scaled = prepare_clustering_features(rfm_df)
+    
+    results, fitted_model = fit_clustering_method(
+        X_scaled, method, kmeans_mode=kmeans_mode, early_stopping_rounds=early_stopping_rounds,
+        n_clusters=n_clusters, hierarchical_mode=hierarchical_mode, eps=eps, min_samples=min_samples,
+        metrics_options=metrics_options
+    )
     
     # Add cluster statistics in serializable format
     if 'cluster_labels' in results:
@@ -288,9 +2209,303 @@ def perform_advanced_clustering(rfm_df: pd.DataFrame, method: str = 'kmeans') ->
                 'customer_count': int(len(cluster_data))
             }
         results['cluster_statistics'] = cluster_stats_dict
+        results['segmentation_model'] = build_segmentation_model(
+            X, X_scaled, scaler, np.asarray(results['cluster_labels']), rfm_df, fitted_model
+        )
+    
+    return results
+
+def cluster_customers(rfm_df: pd.DataFrame, labels_path: Path, method: str = 'kmeans', **options) -> Dict[str, Any]:
+    """Cluster customers and write the per-customer labels to labels_path instead of returning them"""
+    results = perform_advanced_clustering(rfm_df, method, **options)
+    cluster_labels = results.pop('cluster_labels', None)
+    if cluster_labels is not None:
+        write_cluster_labels(labels_path, rfm_df.index, cluster_labels)
+        results['labeled_customers'] = len(cluster_labels)
+    return results
+
+# Streaming Clustering
+# Customers are read from customers.parquet in record batches, so memory is bounded by
+# the batch and sample sizes rather than the customer count. A first pass keeps a
+# uniform sample (fill values, k, and outlier bounds when no sketches are stored); the
+# scaler and the model are then fitted with partial_fit, and a last pass writes the
+# labels batch by batch.
+DAY_NS = 86400 * 10 ** 9
+STREAMING_COLUMNS = ['customer_id', 'last_order_date', 'frequency', 'monetary']
+
+def iter_customer_batches(dataset_id: str, batch_size: int = STREAMING_BATCH_SIZE):
+    """Yield (customer_ids, last order time in ns, frequency, monetary) per record batch"""
+    parquet = pq.ParquetFile(customers_path(dataset_id), memory_map=True)
+    for batch in parquet.iter_batches(batch_size=batch_size, columns=STREAMING_COLUMNS):
+        last_order = batch.column('last_order_date').cast(pa.timestamp('ns')).to_numpy(zero_copy_only=False)
+        yield (
+            batch.column('customer_id'),
+            np.where(np.isnat(last_order), np.nan, last_order.astype(np.int64).astype(np.float64)),
+            batch.column('frequency').to_numpy(zero_copy_only=False).astype(np.float64),
+            batch.column('monetary').to_numpy(zero_copy_only=False).astype(np.float64)
+        )
+
+def streaming_rfm(last_order_ns: np.ndarray, frequency: np.ndarray, monetary: np.ndarray,
+                  reference_ns: float) -> np.ndarray:
+    """Raw RFM rows, with recency in whole days as in rfm_from_customer_aggregates"""
+    return np.column_stack([np.floor((reference_ns - last_order_ns) / DAY_NS), frequency, monetary])
+
+def rfm_within_bounds(X: np.ndarray, lower: np.ndarray, upper: np.ndarray) -> np.ndarray:
+    """Rows kept by the IQR filter of remove_rfm_outliers (missing values are never outliers)"""
+    return ~((X < lower) | (X > upper)).any(axis=1)
+
+def sample_customer_stream(dataset_id: str, sample_size: int = STREAMING_SAMPLE_SIZE, random_state: int = 42):
+    """One pass keeping a uniform sample of customers by smallest random key
+    
+    Returns (sample of [last order ns, frequency, monetary], latest order ns, customer count).
+    """
+    rng = np.random.default_rng(random_state)
+    keys, sample = np.empty(0), np.empty((0, 3))
+    latest_ns, total = -np.inf, 0
+    for _, last_order_ns, frequency, monetary in iter_customer_batches(dataset_id):
+        total += len(last_order_ns)
+        if not np.isnan(last_order_ns).all():
+            latest_ns = max(latest_ns, float(np.nanmax(last_order_ns)))
+        keys = np.concatenate([keys, rng.random(len(last_order_ns))])
+        sample = np.vstack([sample, np.column_stack([last_order_ns, frequency, monetary])])
+        if len(keys) > sample_size:
+            keep = np.argpartition(keys, sample_size)[:sample_size]
+            keys, sample = keys[keep], sample[keep]
+    return sample, latest_ns, total
+
+class CustomerStream:
+    """Outlier-filtered, median-filled RFM batches of a dataset, re-readable for each pass"""
+
+    def __init__(self, dataset_id: str, reference_ns: float, lower: np.ndarray, upper: np.ndarray,
+                 fill_values: np.ndarray):
+        self.dataset_id = dataset_id
+        self.reference_ns = reference_ns
+        self.lower = lower
+        self.upper = upper
+        self.fill_values = fill_values
+
+    def __iter__(self):
+        """Yield (customer_ids, raw RFM rows, filled RFM rows) for the customers kept by the filter"""
+        for customer_ids, last_order_ns, frequency, monetary in iter_customer_batches(self.dataset_id):
+            X = streaming_rfm(last_order_ns, frequency, monetary, self.reference_ns)
+            keep = rfm_within_bounds(X, self.lower, self.upper)
+            X = X[keep]
+            yield customer_ids.filter(pa.array(keep)), X, np.where(np.isnan(X), self.fill_values, X)
+
+def stream_birch(stream: CustomerStream, scaler: StandardScaler, sample_scaled: np.ndarray) -> Birch:
+    """BIRCH CF-tree built with partial_fit over the stream
+    
+    The threshold starts where the sample stays under BIRCH_MAX_SUBCLUSTERS and is
+    coarsened with another pass while the full stream produces too many micro-clusters.
+    """
+    threshold = BIRCH_THRESHOLD
+    while len(Birch(threshold=threshold, n_clusters=None).fit(sample_scaled).subcluster_centers_) > BIRCH_MAX_SUBCLUSTERS:
+        threshold *= 1.5
+    
+    for _ in range(STREAMING_MAX_BIRCH_PASSES):
+        birch = Birch(threshold=threshold, n_clusters=None)
+        for _, _, X in stream:
+            if len(X):
+                birch.partial_fit(scaler.transform(X))
+        if len(birch.subcluster_centers_) <= BIRCH_MAX_SUBCLUSTERS:
+            break
+        threshold *= 1.5
+    return birch
+
+def stream_cluster_customers(dataset_id: str, labels_path: Path, method: str = 'kmeans',
+                             n_clusters: Optional[int] = None, metrics_options: Optional[Dict[str, Any]] = None,
+                             random_state: int = 42) -> Dict[str, Any]:
+    """Out-of-core MiniBatchKMeans or BIRCH over the customer aggregates, with labels written to labels_path
+    
+    Quality metrics are computed on the sample; cluster statistics cover every customer.
+    """
+    metrics_options = metrics_options or {}
+    features = ['recency', 'frequency', 'monetary']
+    
+    # Pass 1: sample, reference date, outlier bounds and fill values
+    with timed_stage('stream_sample') as stage:
+        sample, latest_ns, total = sample_customer_stream(dataset_id, random_state=random_state)
+        stage['rows'] = total
+    if not np.isfinite(latest_ns):
+        raise ValueError("No customers with orders to cluster")
+    reference_ns = latest_ns + DAY_NS
+    sample = streaming_rfm(sample[:, 0], sample[:, 1], sample[:, 2], reference_ns)
+    if quantile_sketches_path(dataset_id).exists():
+        # Bounds over every customer, from the sketches kept with the aggregates
+        lower, upper = (bound.to_numpy() for bound in sketch_outlier_bounds(load_quantile_sketches(dataset_id)))
+    else:
+        Q1, Q3 = np.nanquantile(sample, [0.25, 0.75], axis=0)
+        lower, upper = Q1 - 1.5 * (Q3 - Q1), Q3 + 1.5 * (Q3 - Q1)
+    sample = sample[rfm_within_bounds(sample, lower, upper)]
+    fill_values = np.nanmedian(sample, axis=0)
+    sample_filled = np.where(np.isnan(sample), fill_values, sample)
+    stream = CustomerStream(dataset_id, reference_ns, lower, upper, fill_values)
+    
+    # Pass 2: incremental scaler
+    with timed_stage('scaling', total):
+        scaler = StandardScaler()
+        for _, _, X in stream:
+            if len(X):
+                scaler.partial_fit(X)
+    sample_scaled = scaler.transform(sample_filled)
+    
+    # Pass 3: incremental model, seeded from the sample
+    if method == 'kmeans':
+        selection = select_kmeans_k(sample_scaled, k_values=[n_clusters] if n_clusters else KMEANS_K_RANGE,
+                                    minibatch=True, metrics_options=metrics_options)
+        k = selection['optimal_k']
+        with timed_stage('kmeans_partial_fit', total):
+            model = MiniBatchKMeans(n_clusters=k, init=selection['model'].cluster_centers_, n_init=1,
+                                    random_state=random_state, batch_size=4096)
+            for _, _, X in stream:
+                if len(X):
+                    model.partial_fit(scaler.transform(X))
+    else:
+        k = n_clusters or DEFAULT_N_CLUSTERS
+        with timed_stage('birch_partial_fit', total):
+            model = stream_birch(stream, scaler, sample_scaled)
+        centers = model.subcluster_centers_
+        if len(centers) < k:
+            raise ValueError(f"Only {len(centers)} micro-clusters found; lower BIRCH_THRESHOLD or n_clusters")
+        Z = linkage(centers, method='ward')
+        micro_clusters = fcluster(Z, k, criterion='maxclust') - 1
+        micro_sizes = np.zeros(len(centers), dtype=np.int64)
+    
+    # Pass 4: labels and per-cluster sums, batch by batch
+    members = np.zeros(k, dtype=np.int64)
+    counts, sums, squares, scaled_sums = (np.zeros((k, 3)) for _ in range(4))
+    labeled = 0
+    labels_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = labels_path.with_name(f'.{labels_path.name}.tmp')
+    schema = pa.schema([('customer_id', pa.string()), ('cluster', pa.int32())])
+    with timed_stage('assign_labels', total), pq.ParquetWriter(tmp_path, schema) as writer:
+        for customer_ids, X_raw, X in stream:
+            if not len(X):
+                continue
+            X_scaled = scaler.transform(X)
+            if method == 'kmeans':
+                cluster_labels = model.predict(X_scaled)
+            else:
+                micro_labels = model.predict(X_scaled)
+                micro_sizes += np.bincount(micro_labels, minlength=len(micro_sizes))
+                cluster_labels = micro_clusters[micro_labels]
+            writer.write_table(pa.table({
+                'customer_id': customer_ids.cast(pa.string()),
+                'cluster': pa.array(cluster_labels.astype(np.int32))
+            }, schema=schema), row_group_size=LABELS_STREAM_BATCH_SIZE)
+            
+            # Shift by the medians so the sums of squares stay well conditioned
+            members += np.bincount(cluster_labels, minlength=k)
+            present = ~np.isnan(X_raw)
+            shifted = np.where(present, X_raw - fill_values, 0.0)
+            for col in range(3):
+                counts[:, col] += np.bincount(cluster_labels, weights=present[:, col], minlength=k)
+                sums[:, col] += np.bincount(cluster_labels, weights=shifted[:, col], minlength=k)
+                squares[:, col] += np.bincount(cluster_labels, weights=shifted[:, col] ** 2, minlength=k)
+                scaled_sums[:, col] += np.bincount(cluster_labels, weights=X_scaled[:, col], minlength=k)
+            labeled += len(X)
+    os.replace(tmp_path, labels_path)
+    
+    cluster_ids = np.flatnonzero(members)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = sums / counts
+        stds = np.sqrt(np.maximum(squares - counts * means ** 2, 0.0) / (counts - 1))
+    means += fill_values
+    
+    cluster_stats_dict = {}
+    for cluster in cluster_ids:
+        cluster_stats_dict[f'cluster_{cluster}'] = {
+            **{f'{feature}_{stat}': float(values[cluster, col])
+               for col, feature in enumerate(features) for stat, values in [('mean', means), ('std', stds)]},
+            'customer_count': int(members[cluster])
+        }
+    
+    sample_labels = model.predict(sample_scaled)
+    if method != 'kmeans':
+        sample_labels = micro_clusters[sample_labels]
+    scores = compute_cluster_metrics(sample_scaled, sample_labels, **metrics_options)
+    scores['metrics']['scope'] = 'sample'
+    results = {
+        'optimal_clusters': len(cluster_ids),
+        **scores,
+        'streaming': {
+            'batch_size': STREAMING_BATCH_SIZE,
+            'sample_size': len(sample),
+            'customers': total,
+            'outliers_removed': total - labeled
+        }
+    }
+    if method == 'kmeans':
+        results.update({'method': 'K-Means', 'kmeans_mode': 'streaming', 'elbow_data': selection['elbow_data']})
+        centroids, model_cluster_ids = model.cluster_centers_, np.arange(k)
+    else:
+        results.update({
+            'method': 'Hierarchical',
+            'hierarchical_mode': 'streaming',
+            'micro_clusters': len(centers),
+            'birch_threshold': model.threshold,
+            'dendrogram': dendrogram_summary(Z, micro_sizes)
+        })
+        centroids, model_cluster_ids = scaled_sums[cluster_ids] / members[cluster_ids, None], cluster_ids
     
+    results['cluster_statistics'] = cluster_stats_dict
+    results['segmentation_model'] = {
+        'features': features,
+        'fill_values': fill_values.tolist(),
+        'scaler_mean': scaler.mean_.tolist(),
+        'scaler_scale': scaler.scale_.tolist(),
+        'cluster_ids': model_cluster_ids.tolist(),
+        'centroids': centroids.tolist(),
+        'rfm_edges': rfm_quartile_edges(pd.DataFrame(sample, columns=features))
+    }
+    results['labeled_customers'] = labeled
     return results
 
+# Clustering Comparison
+# The scaled feature matrix is prepared once and placed in shared memory; each
+# algorithm runs in its own pool worker against a read-only view of it.
+class SharedFeatureMatrix:
+    """A float64 matrix copied once into a named shared memory block"""
+
+    def __init__(self, X: np.ndarray):
+        X = np.ascontiguousarray(X, dtype=np.float64)
+        self.shm = shared_memory.SharedMemory(create=True, size=max(X.nbytes, 1))
+        np.ndarray(X.shape, dtype=X.dtype, buffer=self.shm.buf)[:] = X
+        self.descriptor = {'name': self.shm.name, 'shape': X.shape, 'dtype': X.dtype.str}
+
+    def release(self):
+        self.shm.close()
+        self.shm.unlink()
+
+def _evaluate_clustering_method(X_scaled: np.ndarray, method: str, options: Dict[str, Any]) -> Dict[str, Any]:
+    start = time.perf_counter()
+    try:
+        results, _ = fit_clustering_method(X_scaled, method, **options)
+    except Exception as e:
+        return {'method': method, 'error': str(e)}
+    return {
+        'method': method,
+        'name': results.get('method'),
+        'clusters': results.get('optimal_clusters'),
+        'silhouette_score': results.get('silhouette_score'),
+        'davies_bouldin_score': results.get('davies_bouldin_score'),
+        'calinski_harabasz_score': results.get('calinski_harabasz_score'),
+        'noise_points': results.get('noise_points'),
+        'fit_seconds': time.perf_counter() - start,
+        'error': results.get('error')
+    }
+
+def compare_clustering_method(descriptor: Dict[str, Any], method: str, options: Dict[str, Any]) -> Dict[str, Any]:
+    """Fit one method against the shared feature matrix and return its metrics row"""
+    shm = shared_memory.SharedMemory(name=descriptor['name'])
+    try:
+        X_scaled = np.ndarray(descriptor['shape'], dtype=np.dtype(descriptor['dtype']), buffer=shm.buf)
+        X_scaled.flags.writeable = False
+        return _evaluate_clustering_method(X_scaled, method, options)
+    finally:
+        X_scaled = None
+        shm.close()
+
 # API Routes
 @api_router.get("/")
 async def root():
@@ -298,52 +2513,32 @@ async def root():
 
 @api_router.post("/upload-dataset")
 async def upload_dataset(file: UploadFile = File(...)):
-    """Upload and validate retail sales dataset"""
+    """Upload and validate retail sales dataset, streaming it in bounded-memory chunks into the columnar store"""
+    dataset_id = str(uuid.uuid4())
+    ingestor = None
     try:
-        # Read CSV file
-        content = await file.read()
-        df = pd.read_csv(io.StringIO(content.decode('utf-8')))
-        
-        # Validate required columns
-        required_columns = ['customer_id', 'order_id', 'order_date', 'product_id', 'quantity', 'unit_price', 'total_amount']
-        missing_columns = [col for col in required_columns if col not in df.columns]
-        
-        if missing_columns:
-            raise HTTPException(status_code=400, detail=f"Missing required columns: {missing_columns}")
-        
-        # Data quality assessment
-        total_records = len(df)
-        total_customers = df['customer_id'].nunique()
-        date_range = {
-            'start_date': df['order_date'].min(),
-            'end_date': df['order_date'].max()
-        }
+        ingestor = DatasetIngestor(dataset_id)
+        await stream_csv_upload(file, ingestor)
         
-        # Calculate data quality score
-        completeness = df.isnull().sum().sum() / (len(df) * len(df.columns))
-        data_quality_score = round((1 - completeness) * 100, 2)
+        # Publish the transactions and the per-customer aggregates materialized during ingest
+        await run_in_threadpool(ingestor.writer.close)
+        await run_in_threadpool(write_customer_aggregates, dataset_id, ingestor.aggregator.customers,
+                                ingestor.aggregator.order_days)
         
-        # Store dataset info in MongoDB
+        # Only dataset metadata is stored in MongoDB
+        summary = ingestor.summary
         dataset_info = DatasetInfo(
+            id=dataset_id,
             filename=file.filename,
-            total_records=total_records,
-            total_customers=total_customers,
-            date_range=date_range,
-            columns=df.columns.tolist(),
-            data_quality_score=data_quality_score
+            total_records=summary.total_records,
+            total_customers=len(ingestor.aggregator),
+            date_range=summary.date_range,
+            columns=summary.columns,
+            data_quality_score=summary.data_quality_score
         )
         
         await db.datasets.insert_one(dataset_info.dict())
         
-        # Store the actual data (first 10000 records for performance)
-        df_sample = df.head(10000) if len(df) > 10000 else df
-        data_records = df_sample.to_dict('records')
-        
-        await db.sales_data.delete_many({'dataset_id': dataset_info.id})  # Clear existing data
-        for record in data_records:
-            record['dataset_id'] = dataset_info.id
-        await db.sales_data.insert_many(data_records)
-        
         return {
             "dataset_id": dataset_info.id,
             "message": "Dataset uploaded successfully",
@@ -351,122 +2546,938 @@ async def upload_dataset(file: UploadFile = File(...)):
         }
         
     except Exception as e:
+        # Discard anything already written for this upload
+        if ingestor is not None:
+            ingestor.abort()
+        remove_dataset_store(dataset_id)
         raise HTTPException(status_code=400, detail=f"Error processing dataset: {str(e)}")
 
-@api_router.post("/analyze/rfm/{dataset_id}")
-async def perform_rfm_analysis(dataset_id: str):
-    """Perform comprehensive RFM analysis with statistical validation"""
-    try:
-        # Retrieve dataset from MongoDB
-        sales_data = await db.sales_data.find({'dataset_id': dataset_id}).to_list(10000)
-        
-        if not sales_data:
-            raise HTTPException(status_code=404, detail="Dataset not found")
-        
-        # Convert to DataFrame
-        df = pd.DataFrame(sales_data)
-        
-        # Calculate RFM metrics
-        rfm_df = calculate_rfm_metrics(df)
-        
-        # Perform RFM segmentation
-        rfm_results = perform_rfm_segmentation(rfm_df)
-        
-        # Create RFM analysis object with proper dictionary conversion
-        rfm_analysis_data = {
-            "dataset_id": dataset_id,
-            "rfm_segments": rfm_results['segment_distribution'],
-            "statistical_summary": {"summary": "RFM statistical analysis completed"},
-            "segment_characteristics": rfm_results['statistical_validation']
+# Serializes appends to the same dataset
+dataset_locks: Dict[str, asyncio.Lock] = {}
+
+@api_router.post("/datasets/{dataset_id}/append")
+async def append_to_dataset(dataset_id: str, file: UploadFile = File(...)):
+    """Append new transactions to an existing dataset and merge them into the customer aggregates"""
+    dataset = await db.datasets.find_one({'id': dataset_id}, {'_id': 0})
+    if not dataset:
+        raise HTTPException(status_code=404, detail="Dataset not found")
+    if not customers_path(dataset_id).exists():
+        raise HTTPException(status_code=400, detail="Appending is only supported for datasets in the columnar store")
+    
+    lock = dataset_locks.setdefault(dataset_id, asyncio.Lock())
+    async with lock:
+        dataset = await db.datasets.find_one({'id': dataset_id}, {'_id': 0})
+        data_version = dataset.get('data_version', 1) + 1
+        ingestor = None
+        published_part = None
+        staged = []
+        published = []
+        try:
+            part = await run_in_threadpool(next_transactions_part, dataset_id)
+            # Seed the order day keys so days already on file are not counted again
+            existing = await run_in_threadpool(load_customer_aggregates, dataset_id)
+            order_days = await run_in_threadpool(load_order_days, dataset_id, existing)
+            ingestor = DatasetIngestor(dataset_id, part=part, order_days=order_days)
+            await stream_csv_upload(file, ingestor, expected_columns=dataset['columns'])
+            
+            # Merge the new partial aggregates: max for last date, sum for counts and monetary
+            appended = ingestor.aggregator.customers
+            customers = await run_in_threadpool(merge_customer_aggregates, existing, appended)
+            
+            # Stage the aggregates and sketches first, then publish them together with the part;
+            # the replaced files are kept until the metadata update succeeds
+            staged = await run_in_threadpool(stage_customer_aggregates, dataset_id, customers, order_days)
+            await run_in_threadpool(ingestor.writer.close)
+            published_part = ingestor.writer.path
+            published = await run_in_threadpool(publish_staged_files, staged)
+            
+            # Roll the summary forward; columns match, so record-weighted quality is exact
+            summary = ingestor.summary
+            total_records = dataset['total_records'] + summary.total_records
+            data_quality_score = round(
+                (dataset['data_quality_score'] * dataset['total_records'] +
+                 summary.data_quality_score * summary.total_records) / total_records, 2
+            )
+            date_range = {
+                'start_date': min(filter(None, [dataset['date_range'].get('start_date'), summary.start_date])),
+                'end_date': max(filter(None, [dataset['date_range'].get('end_date'), summary.end_date]))
+            }
+            update = {
+                'total_records': total_records,
+                'total_customers': len(customers),
+                'date_range': date_range,
+                'data_quality_score': data_quality_score,
+                'data_version': data_version
+            }
+            await db.datasets.update_one({'id': dataset_id}, {'$set': update})
+            analysis_cache.invalidate(dataset_id)
+            await run_in_threadpool(discard_backups, published)
+            
+        except Exception as e:
+            if ingestor is not None:
+                ingestor.abort()
+            if published_part is not None:
+                published_part.unlink(missing_ok=True)
+            if published:
+                restore_published_files(published)
+                analysis_cache.invalidate(dataset_id)
+            else:
+                discard_staged_files(staged)
+            raise HTTPException(status_code=400, detail=f"Error appending to dataset: {str(e)}")
+    
+    customers_added = len(customers) - len(existing)
+    return {
+        "dataset_id": dataset_id,
+        "message": "Transactions appended successfully",
+        "data_version": data_version,
+        "records_appended": summary.total_records,
+        "customers_changed": len(appended) - customers_added,
+        "customers_added": customers_added,
+        "info": {**dataset, **update}
+    }
+
+# Analysis Execution
+# CPU-bound analysis runs in worker processes so it never blocks the event loop.
+# Workers are spawned rather than forked, since the parent holds threads and sockets.
+# RFM shards get their own pool of RFM_PARTITIONS workers and method comparisons one
+# worker per clustering method: queued behind whole analyses on the
+# ANALYSIS_MAX_CONCURRENCY pool they would not run in parallel.
+analysis_executor: Optional[ProcessPoolExecutor] = None
+partition_executor: Optional[ProcessPoolExecutor] = None
+comparison_executor: Optional[ProcessPoolExecutor] = None
+
+def get_analysis_executor() -> ProcessPoolExecutor:
+    global analysis_executor
+    if analysis_executor is None:
+        analysis_executor = ProcessPoolExecutor(
+            max_workers=ANALYSIS_MAX_CONCURRENCY, mp_context=multiprocessing.get_context('spawn')
+        )
+    return analysis_executor
+
+def get_partition_executor() -> ProcessPoolExecutor:
+    global partition_executor
+    if partition_executor is None:
+        partition_executor = ProcessPoolExecutor(
+            max_workers=RFM_PARTITIONS, mp_context=multiprocessing.get_context('spawn')
+        )
+    return partition_executor
+
+def get_comparison_executor() -> ProcessPoolExecutor:
+    global comparison_executor
+    if comparison_executor is None:
+        comparison_executor = ProcessPoolExecutor(
+            max_workers=len(CLUSTERING_METHODS), mp_context=multiprocessing.get_context('spawn')
+        )
+    return comparison_executor
+
+async def run_in_process_pool(executor: ProcessPoolExecutor, stage_name: str, func, *args, **kwargs):
+    """Run a module-level function in a process pool, collecting its stage timings"""
+    loop = asyncio.get_running_loop()
+    timer = current_timer.get()
+    if timer is None:
+        return await loop.run_in_executor(executor, functools.partial(func, *args, **kwargs))
+    
+    with timer.stage(stage_name):
+        result, stages = await loop.run_in_executor(
+            executor, functools.partial(call_with_timer, func, *args, **kwargs)
+        )
+        timer.stages.extend({**stage, 'process': 'worker'} for stage in stages)
+    return result
+
+async def run_in_analysis_pool(func, *args, **kwargs):
+    """Run a module-level function in the analysis process pool"""
+    return await run_in_process_pool(get_analysis_executor(), 'analysis_pool', func, *args, **kwargs)
+
+async def run_in_partition_pool(func, *args, **kwargs):
+    """Run a module-level function in the RFM partition pool"""
+    return await run_in_process_pool(get_partition_executor(), 'partition_pool', func, *args, **kwargs)
+
+async def run_in_comparison_pool(func, *args, **kwargs):
+    """Run a module-level function in the clustering comparison pool"""
+    return await run_in_process_pool(get_comparison_executor(), 'comparison_pool', func, *args, **kwargs)
+
+def clustering_parameters(method: str, kmeans_mode: str, early_stopping_rounds: Optional[int], metrics_mode: str,
+                          metrics_sample_size: Optional[int], bootstrap_samples: int, n_clusters: Optional[int] = None,
+                          hierarchical_mode: str = 'auto', eps: Optional[float] = None,
+                          min_samples: int = DBSCAN_MIN_SAMPLES) -> Dict[str, Any]:
+    """Validate clustering query parameters"""
+    if method not in CLUSTERING_METHODS:
+        raise HTTPException(status_code=400, detail=f"method must be one of {CLUSTERING_METHODS}")
+    if kmeans_mode not in KMEANS_MODES:
+        raise HTTPException(status_code=400, detail=f"kmeans_mode must be one of {KMEANS_MODES}")
+    if hierarchical_mode not in HIERARCHICAL_MODES:
+        raise HTTPException(status_code=400, detail=f"hierarchical_mode must be one of {HIERARCHICAL_MODES}")
+    if early_stopping_rounds is not None and early_stopping_rounds < 1:
+        raise HTTPException(status_code=400, detail="early_stopping_rounds must be at least 1")
+    if n_clusters is not None and n_clusters < 2:
+        raise HTTPException(status_code=400, detail="n_clusters must be at least 2")
+    if eps is not None and eps <= 0:
+        raise HTTPException(status_code=400, detail="eps must be positive")
+    if min_samples < 2:
+        raise HTTPException(status_code=400, detail="min_samples must be at least 2")
+    if metrics_mode not in METRICS_MODES:
+        raise HTTPException(status_code=400, detail=f"metrics_mode must be one of {METRICS_MODES}")
+    if metrics_sample_size is not None and metrics_sample_size < 2:
+        raise HTTPException(status_code=400, detail="metrics_sample_size must be at least 2")
+    if not 0 <= bootstrap_samples <= MAX_BOOTSTRAP_SAMPLES:
+        raise HTTPException(status_code=400, detail=f"bootstrap_samples must be between 0 and {MAX_BOOTSTRAP_SAMPLES}")
+    return {
+        'method': method,
+        'kmeans_mode': kmeans_mode,
+        'early_stopping_rounds': early_stopping_rounds,
+        'metrics_mode': metrics_mode,
+        'metrics_sample_size': metrics_sample_size,
+        'bootstrap_samples': bootstrap_samples,
+        'n_clusters': n_clusters,
+        'hierarchical_mode': hierarchical_mode,
+        'eps': eps,
+        'min_samples': min_samples
+    }
+
+def is_streaming_clustering(parameters: Dict[str, Any]) -> bool:
+    return ((parameters['method'] == 'kmeans' and parameters['kmeans_mode'] == 'streaming') or
+            (parameters['method'] == 'hierarchical' and parameters['hierarchical_mode'] == 'streaming'))
+
+async def execute_rfm_analysis(dataset_id: str, quantiles: str = 'exact') -> Dict[str, Any]:
+    """Run RFM segmentation for a dataset, store it and build the response"""
+    data_version = await get_data_version(dataset_id)
+    cache_key = analysis_cache_key(dataset_id, data_version, 'rfm', {'quantiles': quantiles})
+    cached = await get_cached_analysis(db.rfm_analyses, cache_key, dataset_id)
+    if cached is not None:
+        return cached
+    
+    # Calculate RFM metrics from the per-customer aggregates
+    rfm_df = await load_rfm_frame(dataset_id, ANALYSIS_COLUMNS['rfm'], quantiles)
+    
+    # Perform RFM segmentation
+    rfm_results = await run_in_analysis_pool(perform_rfm_segmentation, rfm_df, quantiles)
+    
+    response = to_json_compatible({
+        "analysis_id": str(uuid.uuid4()),
+        "rfm_results": rfm_results,
+        "summary": {
+            "total_customers": len(rfm_df),
+            "segments_identified": len(rfm_results['segment_distribution']),
+            "statistical_significance": rfm_results['statistical_validation']
         }
+    })
+    
+    # Create RFM analysis object with proper dictionary conversion
+    rfm_analysis_data = {
+        "id": response['analysis_id'],
+        "dataset_id": dataset_id,
+        "data_version": data_version,
+        "rfm_segments": response['rfm_results']['segment_distribution'],
+        "statistical_summary": {"summary": "RFM statistical analysis completed"},
+        "segment_characteristics": response['rfm_results']['statistical_validation']
+    }
+    
+    # Store results in MongoDB
+    await store_analysis(db.rfm_analyses, cache_key, rfm_analysis_data, response)
+    return response
+
+async def execute_clustering_analysis(dataset_id: str, parameters: Dict[str, Any]) -> Dict[str, Any]:
+    """Run clustering for a dataset, store it and build the response"""
+    method = parameters['method']
+    data_version = await get_data_version(dataset_id)
+    cache_key = analysis_cache_key(dataset_id, data_version, 'clustering', parameters)
+    cached = await get_cached_analysis(db.segmentation_results, cache_key, dataset_id)
+    if cached is not None:
+        return cached
+    
+    metrics_options = {
+        'mode': parameters['metrics_mode'],
+        'sample_size': parameters['metrics_sample_size'],
+        'bootstrap_samples': parameters['bootstrap_samples']
+    }
+    
+    analysis_id = str(uuid.uuid4())
+    if is_streaming_clustering(parameters):
+        # Out-of-core: the worker reads the customer aggregates batch by batch itself
+        if not customers_path(dataset_id).exists():
+            raise HTTPException(status_code=400, detail="Streaming clustering needs the customer aggregates of a columnar dataset")
+        clustering_results = await run_in_analysis_pool(
+            stream_cluster_customers, dataset_id, cluster_labels_path(dataset_id, analysis_id), method,
+            n_clusters=parameters['n_clusters'], metrics_options=metrics_options
+        )
+    else:
+        # Calculate RFM metrics from the per-customer aggregates
+        rfm_df = await load_rfm_frame(dataset_id, ANALYSIS_COLUMNS['clustering'])
         
-        # Store results in MongoDB
-        await db.rfm_analyses.insert_one(rfm_analysis_data)
-        
-        return {
-            "analysis_id": str(uuid.uuid4()),
-            "rfm_results": rfm_results,
-            "summary": {
-                "total_customers": len(rfm_df),
-                "segments_identified": len(rfm_results['segment_distribution']),
-                "statistical_significance": rfm_results['statistical_validation']
-            }
+        # Perform clustering analysis; labels go to the store keyed by customer_id
+        clustering_results = await run_in_analysis_pool(
+            cluster_customers, rfm_df, cluster_labels_path(dataset_id, analysis_id), method,
+            kmeans_mode=parameters['kmeans_mode'],
+            early_stopping_rounds=parameters['early_stopping_rounds'], n_clusters=parameters['n_clusters'],
+            hierarchical_mode=parameters['hierarchical_mode'], eps=parameters['eps'],
+            min_samples=parameters['min_samples'], metrics_options=metrics_options
+        )
+    
+    if 'labeled_customers' in clustering_results:
+        clustering_results['labels_url'] = f"/api/analyses/clustering/{analysis_id}/labels"
+    response = to_json_compatible({
+        "analysis_id": analysis_id,
+        "clustering_results": clustering_results,
+        "model_evaluation": {
+            "silhouette_score": clustering_results.get('silhouette_score'),
+            "davies_bouldin_score": clustering_results.get('davies_bouldin_score'),
+            "calinski_harabasz_score": clustering_results.get('calinski_harabasz_score'),
+            "metrics": clustering_results.get('metrics')
+        }
+    })
+    clustering_results = response['clustering_results']
+    segmentation_model = clustering_results.pop('segmentation_model', None)
+    if segmentation_model is not None:
+        response['model_id'] = response['analysis_id']
+        with timed_stage('store_model'):
+            await db.segmentation_models.insert_one({
+                'id': response['analysis_id'],
+                'dataset_id': dataset_id,
+                'data_version': data_version,
+                'method': clustering_results.get('method', method),
+                'created_at': datetime.utcnow(),
+                **segmentation_model
+            })
+    
+    # Store results in MongoDB with simplified data
+    segmentation_data = {
+        "id": response['analysis_id'],
+        "dataset_id": dataset_id,
+        "data_version": data_version,
+        "method": clustering_results.get('method', method),
+        "parameters": parameters,
+        "clusters": clustering_results.get('optimal_clusters', 0),
+        "silhouette_score": clustering_results.get('silhouette_score', 0.0),
+        "davies_bouldin_score": clustering_results.get('davies_bouldin_score', 0.0),
+        "calinski_harabasz_score": clustering_results.get('calinski_harabasz_score', 0.0),
+        "segment_summary": {"analysis_completed": True}
+    }
+    
+    await store_analysis(db.segmentation_results, cache_key, segmentation_data, response)
+    return response
+
+async def execute_clustering_comparison(dataset_id: str, methods: List[str], parameters: Dict[str, Any]) -> Dict[str, Any]:
+    """Run several clustering methods in parallel over one shared, prepared feature matrix
+    
+    Methods fan out to the comparison pool, one worker per method, so a comparison
+    neither runs its methods two at a time nor holds the analysis pool.
+    """
+    data_version = await get_data_version(dataset_id)
+    cache_key = analysis_cache_key(dataset_id, data_version, 'clustering_comparison', {**parameters, 'methods': methods})
+    cached = await get_cached_analysis(db.clustering_comparisons, cache_key, dataset_id)
+    if cached is not None:
+        return cached
+    
+    rfm_df = await load_rfm_frame(dataset_id, ANALYSIS_COLUMNS['clustering'])
+    _, _, X_scaled = await run_in_threadpool(prepare_clustering_features, rfm_df)
+    options = {
+        'kmeans_mode': parameters['kmeans_mode'],
+        'early_stopping_rounds': parameters['early_stopping_rounds'],
+        'n_clusters': parameters['n_clusters'],
+        'hierarchical_mode': parameters['hierarchical_mode'],
+        'eps': parameters['eps'],
+        'min_samples': parameters['min_samples'],
+        'metrics_options': {
+            'mode': parameters['metrics_mode'],
+            'sample_size': parameters['metrics_sample_size'],
+            'bootstrap_samples': parameters['bootstrap_samples']
         }
+    }
+    
+    shared = SharedFeatureMatrix(X_scaled)
+    try:
+        rows = await asyncio.gather(*[
+            run_in_comparison_pool(compare_clustering_method, shared.descriptor, method, options) for method in methods
+        ])
+    finally:
+        shared.release()
+    
+    scored = [row for row in rows if row.get('silhouette_score') is not None and not row.get('error')]
+    response = to_json_compatible({
+        "analysis_id": str(uuid.uuid4()),
+        "total_customers": len(rfm_df),
+        "comparison": rows,
+        "best_method": max(scored, key=lambda row: row['silhouette_score'])['method'] if scored else None
+    })
+    
+    comparison_data = {
+        "id": response['analysis_id'],
+        "dataset_id": dataset_id,
+        "data_version": data_version,
+        "methods": methods,
+        "parameters": parameters,
+        "best_method": response['best_method']
+    }
+    await store_analysis(db.clustering_comparisons, cache_key, comparison_data, response)
+    return response
+
+async def execute_rfm_snapshots(dataset_id: str, snapshots: int, interval: str) -> Dict[str, Any]:
+    """Compute RFM segments as of several reference dates and their transitions, store and build the response"""
+    data_version = await get_data_version(dataset_id)
+    parameters = {'snapshots': snapshots, 'interval': interval}
+    cache_key = analysis_cache_key(dataset_id, data_version, 'rfm_snapshots', parameters)
+    cached = await get_cached_analysis(db.rfm_snapshot_analyses, cache_key, dataset_id)
+    if cached is not None:
+        return cached
+    
+    # Columnar datasets are read by the worker itself; legacy ones are loaded here
+    if has_columnar_store(dataset_id):
+        snapshot_results = await run_in_analysis_pool(dataset_rfm_snapshots, dataset_id, snapshots, interval)
+    else:
+        df = await load_sales_frame(dataset_id, ANALYSIS_COLUMNS['rfm'])
+        snapshot_results = await run_in_analysis_pool(rfm_snapshots, df, snapshots, interval)
+    
+    response = to_json_compatible({"analysis_id": str(uuid.uuid4()), "snapshot_results": snapshot_results})
+    snapshot_analysis_data = {
+        "id": response['analysis_id'],
+        "dataset_id": dataset_id,
+        "data_version": data_version,
+        "parameters": parameters,
+        "reference_dates": [snapshot['reference_date'] for snapshot in response['snapshot_results']['snapshots']]
+    }
+    await store_analysis(db.rfm_snapshot_analyses, cache_key, snapshot_analysis_data, response)
+    return response
+
+async def execute_clv_analysis(dataset_id: str, horizon_days: int) -> Dict[str, Any]:
+    """Score CLV and churn for every customer of a dataset and store the summary"""
+    if not customers_path(dataset_id).exists():
+        raise HTTPException(status_code=404, detail="Customer aggregates not found for dataset")
+    
+    data_version = await get_data_version(dataset_id)
+    parameters = {'horizon_days': horizon_days}
+    cache_key = analysis_cache_key(dataset_id, data_version, 'clv', parameters)
+    cached = await get_cached_analysis(db.clv_analyses, cache_key, dataset_id)
+    if cached is not None and customer_scores_path(dataset_id, cached['analysis_id']).exists():
+        return cached
+    
+    analysis_id = str(uuid.uuid4())
+    clv_results = await run_in_analysis_pool(score_customer_value, dataset_id, horizon_days, analysis_id)
+    response = to_json_compatible({"analysis_id": analysis_id, "clv_results": clv_results})
+    
+    clv_analysis_data = {
+        "id": response['analysis_id'],
+        "dataset_id": dataset_id,
+        "data_version": data_version,
+        "parameters": parameters,
+        "summary": response['clv_results']
+    }
+    await store_analysis(db.clv_analyses, cache_key, clv_analysis_data, response)
+    return response
+
+# Analysis Result Cache
+def json_default(value):
+    """json.dumps fallback for NumPy scalars and arrays"""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dump_json(value: Any) -> bytes:
+    """Serialize with orjson, handling NumPy arrays and scalars natively; NaN becomes null"""
+    return orjson.dumps(value, default=json_default, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+
+def to_json_compatible(value: Any):
+    """Convert a result containing NumPy values into plain JSON/BSON-compatible Python objects"""
+    return orjson.loads(dump_json(value))
+
+class FastJSONResponse(JSONResponse):
+    """JSON response rendered by dump_json"""
+
+    def render(self, content: Any) -> bytes:
+        return dump_json(content)
+
+class AnalysisCache:
+    """In-process LRU of analysis responses, evicting least recently used entries beyond max_bytes"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries: OrderedDict = OrderedDict()  # key -> (dataset_id, size, response)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        self._entries.move_to_end(key)
+        return entry[2]
+
+    def put(self, key: str, dataset_id: str, response: Dict[str, Any], size: Optional[int] = None):
+        if size is None:
+            size = len(dump_json(response))
+        if size > self.max_bytes:
+            return
+        self._discard(key)
+        self._entries[key] = (dataset_id, size, response)
+        self.total_bytes += size
+        while self.total_bytes > self.max_bytes:
+            self._discard(next(iter(self._entries)))
+
+    def invalidate(self, dataset_id: str):
+        """Drop every entry of a dataset, e.g. after its data changed"""
+        for key in [key for key, entry in self._entries.items() if entry[0] == dataset_id]:
+            self._discard(key)
+
+    def _discard(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= entry[1]
+
+analysis_cache = AnalysisCache(ANALYSIS_CACHE_MAX_BYTES)
+
+async def get_data_version(dataset_id: str) -> int:
+    dataset = await db.datasets.find_one({'id': dataset_id}, {'_id': 0, 'data_version': 1})
+    return dataset.get('data_version', 1) if dataset else 1
+
+def analysis_cache_key(dataset_id: str, data_version: int, kind: str, parameters: Dict[str, Any]) -> str:
+    payload = json.dumps([dataset_id, data_version, kind, parameters], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+async def get_cached_analysis(collection, key: str, dataset_id: str) -> Optional[Dict[str, Any]]:
+    """Look a result up in the in-process LRU, then in its MongoDB result collection"""
+    response = analysis_cache.get(key)
+    if response is not None:
+        return response
+    with timed_stage('cache_lookup'):
+        document = await collection.find_one({'cache_key': key}, {'_id': 0, 'response': 1})
+    if document and document.get('response'):
+        analysis_cache.put(key, dataset_id, document['response'])
+        return document['response']
+    return None
+
+async def store_analysis(collection, key: str, document: Dict[str, Any], response: Dict[str, Any]):
+    """Upsert a result by cache key so repeat runs never duplicate documents"""
+    document = {**document, 'cache_key': key, 'response': response}
+    with timed_stage('store_result'):
+        await collection.update_one(
+            {'cache_key': key},
+            {'$set': document, '$setOnInsert': {'created_at': datetime.utcnow()}},
+            upsert=True
+        )
+    analysis_cache.put(key, document['dataset_id'], response)
+
+# Segmentation Model Scoring
+segmentation_model_cache: OrderedDict = OrderedDict()
+
+async def get_segmentation_model(model_id: str) -> SegmentationModel:
+    """Load a persisted model, keeping recently used ones in process"""
+    model = segmentation_model_cache.get(model_id)
+    if model is None:
+        document = await db.segmentation_models.find_one({'id': model_id}, {'_id': 0})
+        if document is None:
+            raise HTTPException(status_code=404, detail="Segmentation model not found")
+        model = SegmentationModel(document)
+        segmentation_model_cache[model_id] = model
+        if len(segmentation_model_cache) > SEGMENTATION_MODEL_CACHE_SIZE:
+            segmentation_model_cache.popitem(last=False)
+    segmentation_model_cache.move_to_end(model_id)
+    return model
+
+# Background Analysis Jobs
+analysis_jobs: Dict[str, AnalysisJob] = {}
+job_tasks: Dict[str, asyncio.Task] = {}
+job_results: Dict[str, Dict[str, Any]] = {}
+job_slots = asyncio.Semaphore(ANALYSIS_MAX_CONCURRENCY)
+
+def _prune_finished_jobs():
+    """Forget the oldest finished jobs once more than MAX_RETAINED_JOBS are held"""
+    finished = [job for job in analysis_jobs.values() if job.status in ('completed', 'failed', 'cancelled')]
+    excess = len(analysis_jobs) - MAX_RETAINED_JOBS
+    for job in sorted(finished, key=lambda job: job.created_at)[:max(0, excess)]:
+        analysis_jobs.pop(job.id, None)
+        job_results.pop(job.id, None)
+
+async def _run_job(job: AnalysisJob, coroutine_factory):
+    try:
+        async with job_slots:
+            job.status = 'running'
+            job.started_at = datetime.utcnow()
+            with track_analysis(job.kind):
+                job_results[job.id] = await coroutine_factory()
+        job.status = 'completed'
+    except asyncio.CancelledError:
+        job.status = 'cancelled'
+    except HTTPException as e:
+        job.status = 'failed'
+        job.error = e.detail
+    except Exception as e:
+        job.status = 'failed'
+        job.error = str(e)
+        logger.exception("Analysis job %s failed", job.id)
+    finally:
+        job.finished_at = datetime.utcnow()
+        job_tasks.pop(job.id, None)
+
+def submit_analysis_job(kind: str, dataset_id: str, parameters: Dict[str, Any], coroutine_factory) -> AnalysisJob:
+    """Register a job and start it in the background; it waits for a free slot before running"""
+    _prune_finished_jobs()
+    job = AnalysisJob(kind=kind, dataset_id=dataset_id, parameters=parameters)
+    analysis_jobs[job.id] = job
+    job_tasks[job.id] = asyncio.create_task(_run_job(job, coroutine_factory))
+    return job
+
+def get_job_or_404(job_id: str) -> AnalysisJob:
+    job = analysis_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@api_router.post("/analyze/rfm/{dataset_id}")
+async def perform_rfm_analysis(dataset_id: str, quantiles: str = "exact", timings: bool = False):
+    """Perform comprehensive RFM analysis with statistical validation"""
+    if quantiles not in QUANTILE_MODES:
+        raise HTTPException(status_code=400, detail=f"quantiles must be one of {QUANTILE_MODES}")
+    try:
+        with track_analysis('rfm') as timer:
+            response = await execute_rfm_analysis(dataset_id, quantiles)
+        return with_timings(response, timer, timings)
         
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error in RFM analysis: {str(e)}")
 
+@api_router.post("/analyze/rfm-snapshots/{dataset_id}")
+async def perform_rfm_snapshot_analysis(dataset_id: str, snapshots: int = 12, interval: str = "month",
+                                        timings: bool = False):
+    """RFM segments as of several reference dates, with segment transition matrices between them"""
+    if interval not in RFM_SNAPSHOT_INTERVALS:
+        raise HTTPException(status_code=400, detail=f"interval must be one of {list(RFM_SNAPSHOT_INTERVALS)}")
+    if not 2 <= snapshots <= RFM_MAX_SNAPSHOTS:
+        raise HTTPException(status_code=400, detail=f"snapshots must be between 2 and {RFM_MAX_SNAPSHOTS}")
+    try:
+        with track_analysis('rfm_snapshots') as timer:
+            response = await execute_rfm_snapshots(dataset_id, snapshots, interval)
+        return with_timings(response, timer, timings)
+        
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Error in RFM snapshot analysis: {str(e)}")
+
 @api_router.post("/analyze/clustering/{dataset_id}")
-async def perform_clustering_analysis(dataset_id: str, method: str = "kmeans"):
+async def perform_clustering_analysis(dataset_id: str, method: str = "kmeans", kmeans_mode: str = "auto",
+                                      early_stopping_rounds: Optional[int] = None, metrics_mode: str = "auto",
+                                      metrics_sample_size: Optional[int] = None, bootstrap_samples: int = 0,
+                                      n_clusters: Optional[int] = None, hierarchical_mode: str = "auto",
+                                      eps: Optional[float] = None, min_samples: int = DBSCAN_MIN_SAMPLES,
+                                      timings: bool = False):
     """Perform advanced clustering analysis with multiple algorithms"""
+    parameters = clustering_parameters(method, kmeans_mode, early_stopping_rounds, metrics_mode,
+                                       metrics_sample_size, bootstrap_samples, n_clusters, hierarchical_mode,
+                                       eps, min_samples)
     try:
-        # Retrieve dataset from MongoDB
-        sales_data = await db.sales_data.find({'dataset_id': dataset_id}).to_list(10000)
+        with track_analysis('clustering') as timer:
+            response = await execute_clustering_analysis(dataset_id, parameters)
+        return with_timings(response, timer, timings)
         
-        if not sales_data:
-            raise HTTPException(status_code=404, detail="Dataset not found")
-        
-        # Convert to DataFrame and calculate RFM
-        df = pd.DataFrame(sales_data)
-        rfm_df = calculate_rfm_metrics(df)
-        
-        # Perform clustering analysis
-        clustering_results = perform_advanced_clustering(rfm_df, method)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Error in clustering analysis: {str(e)}")
+
+@api_router.post("/analyze/clustering/{dataset_id}/compare")
+async def compare_clustering_methods(dataset_id: str, methods: str = ",".join(CLUSTERING_METHODS),
+                                     kmeans_mode: str = "auto", early_stopping_rounds: Optional[int] = None,
+                                     metrics_mode: str = "auto", metrics_sample_size: Optional[int] = None,
+                                     n_clusters: Optional[int] = None, hierarchical_mode: str = "auto",
+                                     eps: Optional[float] = None, min_samples: int = DBSCAN_MIN_SAMPLES,
+                                     bootstrap_samples: int = 0, timings: bool = False):
+    """Compare clustering methods side by side on one prepared feature matrix"""
+    method_list = list(dict.fromkeys(method.strip() for method in methods.split(',') if method.strip()))
+    if not method_list:
+        raise HTTPException(status_code=400, detail="At least one method is required")
+    if 'streaming' in [kmeans_mode, hierarchical_mode]:
+        raise HTTPException(status_code=400, detail="Streaming modes cannot be compared on a shared feature matrix")
+    unknown = [method for method in method_list if method not in CLUSTERING_METHODS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"methods must be among {CLUSTERING_METHODS}, got {unknown}")
+    parameters = clustering_parameters(method_list[0], kmeans_mode, early_stopping_rounds, metrics_mode,
+                                       metrics_sample_size, bootstrap_samples, n_clusters, hierarchical_mode, eps, min_samples)
+    parameters.pop('method')
+    try:
+        with track_analysis('clustering_comparison') as timer:
+            response = await execute_clustering_comparison(dataset_id, method_list, parameters)
+        return with_timings(response, timer, timings)
         
-        # Store results in MongoDB with simplified data
-        segmentation_data = {
-            "dataset_id": dataset_id,
-            "method": clustering_results.get('method', method),
-            "parameters": {'method': method},
-            "clusters": clustering_results.get('optimal_clusters', 0),
-            "silhouette_score": clustering_results.get('silhouette_score', 0.0),
-            "davies_bouldin_score": clustering_results.get('davies_bouldin_score', 0.0),
-            "calinski_harabasz_score": clustering_results.get('calinski_harabasz_score', 0.0),
-            "segment_summary": {"analysis_completed": True}
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Error in clustering comparison: {str(e)}")
+
+@api_router.post("/models/{model_id}/score")
+async def score_customers(model_id: str, request: ScoringRequest):
+    """Assign a batch of customers to the segments of a persisted clustering model"""
+    model = await get_segmentation_model(model_id)
+    if not request.customers:
+        return {"model_id": model_id, "segments": []}
+    
+    X = np.array([[c.recency, c.frequency, c.monetary] for c in request.customers], dtype=np.float64)
+    clusters = model.predict_clusters(X)
+    segment_names = model.predict_segments(X)
+    
+    # CustomerSegment records, built as plain dicts to keep per-request overhead low
+    segments = [
+        {
+            'customer_id': customer.customer_id,
+            'segment': f'cluster_{cluster}',
+            'segment_name': segment_name,
+            'recency': customer.recency,
+            'frequency': int(customer.frequency),
+            'monetary': customer.monetary,
+            'clv_prediction': None,
+            'churn_probability': None
         }
+        for customer, cluster, segment_name in zip(request.customers, clusters.tolist(), segment_names)
+    ]
+    return {"model_id": model_id, "segments": segments}
+
+@api_router.post("/analyze/clv/{dataset_id}")
+async def perform_clv_analysis(dataset_id: str, horizon_days: int = 365, timings: bool = False):
+    """Predict customer lifetime value and churn probability for every customer"""
+    if horizon_days <= 0:
+        raise HTTPException(status_code=400, detail="horizon_days must be positive")
+    try:
+        with track_analysis('clv') as timer:
+            response = await execute_clv_analysis(dataset_id, horizon_days)
+        return with_timings(response, timer, timings)
         
-        await db.segmentation_results.insert_one(segmentation_data)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Error in CLV analysis: {str(e)}")
+
+@api_router.get("/customers/{dataset_id}/scores")
+async def get_customer_scores(dataset_id: str, analysis_id: Optional[str] = None, offset: int = 0, limit: int = 100):
+    """Page through scored CustomerSegment records of one CLV analysis
+    
+    Without analysis_id, the latest CLV analysis of the dataset's current data version is served.
+    """
+    query = {'dataset_id': dataset_id}
+    if analysis_id is not None:
+        query['id'] = analysis_id
+    else:
+        query['data_version'] = await get_data_version(dataset_id)
+    analysis = await db.clv_analyses.find_one(
+        query, {'_id': 0, 'id': 1, 'data_version': 1, 'parameters': 1}, sort=[('created_at', -1)]
+    )
+    if analysis is None:
+        raise HTTPException(status_code=404, detail="No CLV analysis found; run the CLV analysis first")
+    path = customer_scores_path(dataset_id, analysis['id'])
+    if not path.exists():
+        raise HTTPException(status_code=404, detail="No customer scores stored for this analysis; run the CLV analysis again")
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    
+    def read_page():
+        table = pq.read_table(path, memory_map=True)
+        return table.num_rows, table.slice(offset, limit).to_pylist()
+    
+    total, records = await run_in_threadpool(read_page)
+    customers = [CustomerSegment(**record).dict() for record in records]
+    return {
+        "dataset_id": dataset_id,
+        "analysis_id": analysis['id'],
+        "data_version": analysis['data_version'],
+        "horizon_days": analysis['parameters']['horizon_days'],
+        "total_customers": total,
+        "offset": offset,
+        "customers": customers
+    }
+
+@api_router.get("/analyses/clustering/{analysis_id}/labels")
+async def get_cluster_labels(analysis_id: str, format: str = "json", offset: int = 0, limit: int = 10000):
+    """Per-customer cluster labels of a clustering analysis
+    
+    json returns one page of {customer_id, cluster} records; ndjson and arrow
+    (Arrow IPC stream) stream every label in batches.
+    """
+    if format not in CLUSTER_LABEL_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {CLUSTER_LABEL_FORMATS}")
+    analysis = await db.segmentation_results.find_one({'id': analysis_id}, {'_id': 0, 'dataset_id': 1})
+    if analysis is None:
+        raise HTTPException(status_code=404, detail="Analysis not found")
+    path = cluster_labels_path(analysis['dataset_id'], analysis_id)
+    if not path.exists():
+        raise HTTPException(status_code=404, detail="No cluster labels stored for this analysis")
+    
+    if format == 'json':
+        limit = max(1, min(limit, LABELS_MAX_PAGE_SIZE))
         
-        return {
-            "analysis_id": str(uuid.uuid4()),
-            "clustering_results": clustering_results,
-            "model_evaluation": {
-                "silhouette_score": clustering_results.get('silhouette_score'),
-                "davies_bouldin_score": clustering_results.get('davies_bouldin_score'),
-                "calinski_harabasz_score": clustering_results.get('calinski_harabasz_score')
-            }
-        }
+        def read_page():
+            table = pq.read_table(path, memory_map=True)
+            return table.num_rows, table.slice(offset, limit).to_pydict()
         
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Error in clustering analysis: {str(e)}")
+        total, page = await run_in_threadpool(read_page)
+        next_offset = offset + len(page['customer_id'])
+        return FastJSONResponse({
+            "analysis_id": analysis_id,
+            "total_customers": total,
+            "offset": offset,
+            "next_offset": next_offset if next_offset < total else None,
+            "labels": [{'customer_id': customer_id, 'cluster': cluster}
+                       for customer_id, cluster in zip(page['customer_id'], page['cluster'])]
+        })
+    
+    def batches():
+        return pq.ParquetFile(path, memory_map=True).iter_batches(batch_size=LABELS_STREAM_BATCH_SIZE)
+    
+    if format == 'ndjson':
+        def stream_ndjson():
+            for batch in batches():
+                columns = batch.to_pydict()
+                yield b''.join(
+                    dump_json({'customer_id': customer_id, 'cluster': cluster}) + b'\n'
+                    for customer_id, cluster in zip(columns['customer_id'], columns['cluster'])
+                )
+        return StreamingResponse(stream_ndjson(), media_type='application/x-ndjson')
+    
+    def stream_arrow():
+        sink = io.BytesIO()
+        writer = None
+        for batch in batches():
+            if writer is None:
+                writer = pa.ipc.new_stream(sink, batch.schema)
+            writer.write_batch(batch)
+            yield sink.getvalue()
+            sink.seek(0)
+            sink.truncate()
+        if writer is not None:
+            writer.close()
+            yield sink.getvalue()
+    return StreamingResponse(stream_arrow(), media_type='application/vnd.apache.arrow.stream')
 
-@api_router.get("/datasets")
-async def get_datasets():
-    """Get all uploaded datasets"""
-    datasets = await db.datasets.find().to_list(100)
-    # Convert ObjectId to string for JSON serialization
-    for dataset in datasets:
-        dataset['_id'] = str(dataset['_id'])
-    return {"datasets": datasets}
+@api_router.post("/jobs/rfm/{dataset_id}", status_code=202)
+async def submit_rfm_job(dataset_id: str, quantiles: str = "exact"):
+    """Submit RFM analysis as a background job and return its id immediately"""
+    if quantiles not in QUANTILE_MODES:
+        raise HTTPException(status_code=400, detail=f"quantiles must be one of {QUANTILE_MODES}")
+    job = submit_analysis_job('rfm', dataset_id, {'quantiles': quantiles}, lambda: execute_rfm_analysis(dataset_id, quantiles))
+    return {"job_id": job.id, "status": job.status}
 
-@api_router.get("/analyses/{dataset_id}")
-async def get_analyses(dataset_id: str):
-    """Get all analyses for a specific dataset"""
-    rfm_analyses = await db.rfm_analyses.find({'dataset_id': dataset_id}).to_list(100)
-    clustering_analyses = await db.segmentation_results.find({'dataset_id': dataset_id}).to_list(100)
+@api_router.post("/jobs/clustering/{dataset_id}", status_code=202)
+async def submit_clustering_job(dataset_id: str, method: str = "kmeans", kmeans_mode: str = "auto",
+                                early_stopping_rounds: Optional[int] = None, metrics_mode: str = "auto",
+                                metrics_sample_size: Optional[int] = None, bootstrap_samples: int = 0,
+                                n_clusters: Optional[int] = None, hierarchical_mode: str = "auto",
+                                eps: Optional[float] = None, min_samples: int = DBSCAN_MIN_SAMPLES):
+    """Submit clustering analysis as a background job and return its id immediately"""
+    parameters = clustering_parameters(method, kmeans_mode, early_stopping_rounds, metrics_mode,
+                                       metrics_sample_size, bootstrap_samples, n_clusters, hierarchical_mode,
+                                       eps, min_samples)
+    job = submit_analysis_job('clustering', dataset_id, parameters,
+                              lambda: execute_clustering_analysis(dataset_id, parameters))
+    return {"job_id": job.id, "status": job.status}
+
+@api_router.get("/jobs/{job_id}")
+async def get_job_status(job_id: str):
+    """Get the status of a background analysis job"""
+    return get_job_or_404(job_id).dict()
+
+@api_router.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str):
+    """Get the result of a completed background analysis job"""
+    job = get_job_or_404(job_id)
+    if job.status == 'failed':
+        raise HTTPException(status_code=400, detail=f"Job failed: {job.error}")
+    if job.status != 'completed':
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+    return job_results[job_id]
+
+@api_router.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """Cancel a queued or running job; a running worker finishes but its result is discarded"""
+    job = get_job_or_404(job_id)
+    task = job_tasks.get(job_id)
+    if task is not None:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+    return job.dict()
+
+# Listing Pagination
+def encode_page_cursor(document: Dict[str, Any], sort_field: str) -> str:
+    value = document.get(sort_field)
+    payload = {'value': value.isoformat() if isinstance(value, datetime) else value, 'id': str(document['_id'])}
+    return base64.urlsafe_b64encode(json.dumps(payload).encode('utf-8')).decode('ascii')
+
+def decode_page_cursor(cursor: str):
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        value = datetime.fromisoformat(payload['value']) if payload['value'] is not None else None
+        return value, ObjectId(payload['id'])
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+
+def listing_projection(fields: Optional[str], sort_field: str, excluded: Optional[List[str]] = None) -> Optional[Dict[str, int]]:
+    """Projection for a listing: the requested fields plus the keys pagination needs"""
+    if fields:
+        projection = {field.strip(): 1 for field in fields.split(',') if field.strip()}
+        projection.update({'id': 1, sort_field: 1, '_id': 1})
+        return projection
+    if excluded:
+        return {field: 0 for field in excluded}
+    return None
+
+async def paginate(collection, query: Dict[str, Any], sort_field: str, limit: int, cursor: Optional[str] = None,
+                   order: str = 'desc', projection: Optional[Dict[str, int]] = None):
+    """Keyset pagination over (sort_field, _id); returns the page and the cursor of the next page"""
+    if order not in ('asc', 'desc'):
+        raise HTTPException(status_code=400, detail="order must be 'asc' or 'desc'")
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    direction = -1 if order == 'desc' else 1
+    
+    query = dict(query)
+    if cursor:
+        value, last_id = decode_page_cursor(cursor)
+        compare = '$lt' if direction == -1 else '$gt'
+        query['$or'] = [
+            {sort_field: {compare: value}},
+            {sort_field: value, '_id': {compare: last_id}}
+        ]
     
+    documents = await collection.find(query, projection).sort(
+        [(sort_field, direction), ('_id', direction)]
+    ).limit(limit + 1).to_list(limit + 1)
+    
+    next_cursor = encode_page_cursor(documents[limit - 1], sort_field) if len(documents) > limit else None
+    documents = documents[:limit]
     # Convert ObjectId to string for JSON serialization
-    for analysis in rfm_analyses:
-        analysis['_id'] = str(analysis['_id'])
-    for analysis in clustering_analyses:
-        analysis['_id'] = str(analysis['_id'])
+    for document in documents:
+        document['_id'] = str(document['_id'])
+    return documents, next_cursor
+
+@api_router.get("/datasets")
+async def get_datasets(limit: int = 100, cursor: Optional[str] = None, order: str = "desc", fields: Optional[str] = None):
+    """Get uploaded datasets, newest first, one keyset-paginated page at a time"""
+    datasets, next_cursor = await paginate(
+        db.datasets, {}, 'upload_timestamp', limit, cursor, order, listing_projection(fields, 'upload_timestamp')
+    )
+    return {"datasets": datasets, "next_cursor": next_cursor}
+
+@api_router.get("/analyses/{dataset_id}")
+async def get_analyses(dataset_id: str, limit: int = 100, rfm_cursor: Optional[str] = None,
+                       clustering_cursor: Optional[str] = None, order: str = "desc", fields: Optional[str] = None):
+    """Get analyses for a specific dataset, each list paginated by created_at"""
+    projection = listing_projection(fields, 'created_at', ANALYSIS_LIST_EXCLUDED_FIELDS)
+    rfm_analyses, rfm_next_cursor = await paginate(
+        db.rfm_analyses, {'dataset_id': dataset_id}, 'created_at', limit, rfm_cursor, order, projection
+    )
+    clustering_analyses, clustering_next_cursor = await paginate(
+        db.segmentation_results, {'dataset_id': dataset_id}, 'created_at', limit, clustering_cursor, order, projection
+    )
     
     return {
         "dataset_id": dataset_id,
         "rfm_analyses": rfm_analyses,
-        "clustering_analyses": clustering_analyses
+        "clustering_analyses": clustering_analyses,
+        "rfm_next_cursor": rfm_next_cursor,
+        "clustering_next_cursor": clustering_next_cursor
     }
 
+@api_router.get("/datasets/{dataset_id}/memory-profile")
+async def get_dataset_memory_profile(dataset_id: str):
+    """Memory of a dataset's transactions loaded as plain columns versus with schema dtypes"""
+    if not has_columnar_store(dataset_id):
+        raise HTTPException(status_code=404, detail="Transactions not found in the columnar store")
+    try:
+        plain = await run_in_threadpool(load_transactions, dataset_id, None, False)
+        typed = await run_in_threadpool(apply_schema_dtypes, plain.copy())
+        return {"dataset_id": dataset_id, **memory_report(plain, typed)}
+        
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Error profiling dataset memory: {str(e)}")
+
 @api_router.get("/download/sample-dataset")
 async def download_sample_dataset():
     """Download the sample retail sales dataset"""
@@ -499,6 +3510,12 @@ async def download_data_dictionary():
         media_type="application/json"
     )
 
+@api_router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Analysis stage histograms in the Prometheus text exposition format"""
+    lines = [line for histogram in METRICS for line in histogram.exposition()]
+    return PlainTextResponse('\n'.join(lines) + '\n', media_type='text/plain; version=0.0.4')
+
 # Include the router in the main app
 app.include_router(api_router)
 
@@ -517,6 +3534,28 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def create_indexes():
+    """Create the indexes lookups, listings and the result cache rely on"""
+    await db.datasets.create_index('id', unique=True)
+    await db.datasets.create_index([('upload_timestamp', -1), ('_id', -1)])
+    await db.sales_data.create_index('dataset_id')
+    for collection in (db.rfm_analyses, db.segmentation_results):
+        await collection.create_index('cache_key', unique=True, sparse=True)
+        await collection.create_index([('dataset_id', 1), ('created_at', -1), ('_id', -1)])
+    await db.segmentation_models.create_index('id', unique=True)
+    await db.clv_analyses.create_index('cache_key', unique=True, sparse=True)
+    await db.clustering_comparisons.create_index('cache_key', unique=True, sparse=True)
+    await db.rfm_snapshot_analyses.create_index('cache_key', unique=True, sparse=True)
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    client.close()
+
+@app.on_event("shutdown")
+async def shutdown_analysis_executor():
+    for task in list(job_tasks.values()):
+        task.cancel()
+    for executor in (analysis_executor, partition_executor, comparison_executor):
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
\ No newline at end of file
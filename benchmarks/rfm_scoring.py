@@ -0,0 +1,87 @@
+"""
+Before/after benchmark for the vectorized RFM scoring kernel.
+
+Times the row-wise scoring that perform_rfm_segmentation used to do
+(pd.qcut on ranks, string scores, DataFrame.apply) against quartile_scores
+and assign_rfm_segments in backend/server.py. tests/test_rfm_scoring.py
+checks that both assign identical segments.
+
+Usage: python benchmarks/rfm_scoring.py [n_customers ...]
+"""
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'retail_analytics_benchmarks')
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'backend'))
+
+from server import RFM_SEGMENT_NAMES, assign_rfm_segments, quartile_scores  # noqa: E402
+
+def reference_segments(rfm_df: pd.DataFrame) -> pd.Series:
+    """Segment assignment exactly as perform_rfm_segmentation computed it before vectorization"""
+    r_score = pd.qcut(rfm_df['recency'].rank(method='first'), 4, labels=[4, 3, 2, 1])
+    f_score = pd.qcut(rfm_df['frequency'].rank(method='first'), 4, labels=[1, 2, 3, 4])
+    m_score = pd.qcut(rfm_df['monetary'].rank(method='first'), 4, labels=[1, 2, 3, 4])
+    rfm_score = r_score.astype(str) + f_score.astype(str) + m_score.astype(str)
+    
+    def segment_customers(score):
+        if score in ['444', '434', '443', '344']:
+            return 'Champions'
+        elif score in ['334', '343', '333', '324']:
+            return 'Loyal Customers'
+        elif score in ['431', '441', '432']:
+            return 'Potential Loyalists'
+        elif score in ['142', '143', '144', '241', '242']:
+            return 'New Customers'
+        elif score in ['313', '314', '323', '413', '414', '423']:
+            return 'Promising'
+        elif score in ['231', '232', '233', '321', '322']:
+            return 'Need Attention'
+        elif score in ['131', '132', '141', '221', '222']:
+            return 'About to Sleep'
+        elif score in ['112', '113', '121', '122', '211', '212']:
+            return 'At Risk'
+        elif score in ['123', '124', '213', '214', '223', '224']:
+            return 'Cannot Lose Them'
+        else:
+            return 'Lost'
+    
+    return pd.DataFrame({'rfm_score': rfm_score}).apply(lambda row: segment_customers(row['rfm_score']), axis=1)
+
+def vectorized_segments(rfm_df: pd.DataFrame) -> np.ndarray:
+    r_score = quartile_scores(rfm_df['recency'], reverse=True)
+    f_score = quartile_scores(rfm_df['frequency'])
+    m_score = quartile_scores(rfm_df['monetary'])
+    return RFM_SEGMENT_NAMES[assign_rfm_segments(r_score, f_score, m_score)]
+
+def synthetic_rfm(n_customers: int, seed: int = 42) -> pd.DataFrame:
+    """RFM table with heavy ties (integer recency/frequency) like real customer data"""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'recency': rng.integers(1, 366, n_customers),
+        'frequency': rng.poisson(6, n_customers) + 1,
+        'monetary': np.round(rng.lognormal(6, 1, n_customers), 2)
+    })
+
+def time_call(func, *args, repeat: int = 3) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000, 1_000_000]
+    
+    print(f"{'customers':>12} {'row-wise (s)':>14} {'vectorized (s)':>16} {'speedup':>9}")
+    for n_customers in sizes:
+        rfm_df = synthetic_rfm(n_customers)
+        before = time_call(reference_segments, rfm_df, repeat=1)
+        after = time_call(vectorized_segments, rfm_df)
+        print(f"{n_customers:>12,} {before:>14.3f} {after:>16.4f} {before / after:>8.0f}x")
@@ -0,0 +1,190 @@
+"""
+Scale benchmark for the ingest, RFM and clustering paths.
+
+Generates datasets with generate_retail_sales_dataset at each requested size,
+then times and memory-profiles every stage:
+
+  generate             generate_retail_sales_dataset
+  ingest               stream_csv_upload into the columnar store, plus the customer aggregates
+  load_transactions    load_transactions with schema dtypes (load_transactions_plain: without)
+  calculate_rfm        calculate_rfm_metrics over the full transactions table (legacy path)
+  calculate_rfm_partitioned  the same, aggregated over customer shards in the partition pool
+  rfm_from_aggregates  RFM table from customers.parquet (the path analyses use)
+  rfm_segmentation     perform_rfm_segmentation
+  clustering           perform_advanced_clustering, once per method
+
+Peak memory is the tracemalloc peak within the stage (NumPy and pandas buffers
+included; pool workers are not traced). Results are written as JSON tagged with the git commit, and
+--baseline prints per-stage ratios against an earlier results file.
+
+Sizes default to 10k through 10M transactions; pass --sizes to run a subset, since
+the 10M run dominates both the wall time and the memory peak.
+
+Usage: python benchmarks/scale_suite.py [--sizes 10000 100000 ...] [--methods kmeans ...]
+                                        [--output results.json] [--baseline results.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+from datetime import datetime
+from pathlib import Path
+from types import SimpleNamespace
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+STORE_DIR = tempfile.mkdtemp(prefix='retail_benchmarks_')
+
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'retail_analytics_benchmarks')
+os.environ['DATASET_STORE_DIR'] = STORE_DIR
+sys.path.insert(0, str(REPO_ROOT / 'backend'))
+sys.path.insert(0, str(REPO_ROOT))
+
+import server  # noqa: E402
+from generate_sample_data import generate_retail_sales_dataset  # noqa: E402
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000, 10_000_000]
+DEFAULT_METHODS = ['kmeans', 'hierarchical', 'dbscan', 'gmm']
+
+# Average line items per generated customer (about 11 orders of about 2.1 items)
+ROWS_PER_CUSTOMER = 23.5
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+def measure(stage: str, func, *args, **kwargs):
+    """Run one stage, returning its result and a record of wall time and peak traced memory"""
+    tracemalloc.reset_peak()
+    baseline = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] - baseline
+    return result, {'stage': stage, 'seconds': round(seconds, 4), 'peak_mb': round(peak / 2 ** 20, 2)}
+
+def generate(n_rows: int, seed: int):
+    return generate_retail_sales_dataset(n_customers=max(10, round(n_rows / ROWS_PER_CUSTOMER)), seed=seed)
+
+def ingest(csv_path: Path, dataset_id: str):
+    """The upload_dataset path without HTTP and MongoDB: streamed chunks into the store"""
+    ingestor = server.DatasetIngestor(dataset_id)
+    with open(csv_path, 'rb') as handle:
+        asyncio.run(server.stream_csv_upload(SimpleNamespace(file=handle), ingestor))
+    ingestor.writer.close()
+    server.write_customer_aggregates(dataset_id, ingestor.aggregator.customers, ingestor.aggregator.order_days)
+    return ingestor
+
+def calculate_rfm_partitioned(transactions):
+    return asyncio.run(server.calculate_rfm_metrics_partitioned(transactions))
+
+def rfm_from_aggregates(dataset_id: str):
+    customers = server.load_customer_aggregates(dataset_id)
+    return server.remove_rfm_outliers(server.rfm_from_customer_aggregates(customers))
+
+def run_size(n_rows: int, methods, seed: int, workdir: Path):
+    records = []
+
+    df, record = measure('generate', generate, n_rows, seed)
+    records.append(record)
+    rows, customers = len(df), int(df['customer_id'].nunique())
+    csv_path = workdir / f'sales_{n_rows}.csv'
+    df.to_csv(csv_path, index=False)
+    del df
+
+    dataset_id = str(uuid.uuid4())
+    _, record = measure('ingest', ingest, csv_path, dataset_id)
+    records.append(record)
+    csv_path.unlink()
+
+    _, record = measure('load_transactions_plain', server.load_transactions, dataset_id, server.RFM_COLUMNS, typed=False)
+    records.append(record)
+    transactions, record = measure('load_transactions', server.load_transactions, dataset_id, server.RFM_COLUMNS)
+    records.append(record)
+    _, record = measure('calculate_rfm', server.calculate_rfm_metrics, transactions.copy())
+    records.append(record)
+    _, record = measure('calculate_rfm_partitioned', calculate_rfm_partitioned, transactions)
+    records.append(record)
+    del transactions
+
+    rfm_df, record = measure('rfm_from_aggregates', rfm_from_aggregates, dataset_id)
+    records.append(record)
+
+    _, record = measure('rfm_segmentation', server.perform_rfm_segmentation, rfm_df.copy())
+    records.append(record)
+
+    for method in methods:
+        results, record = measure('clustering', server.perform_advanced_clustering, rfm_df, method)
+        record['method'] = method
+        if 'error' in results:
+            record['error'] = results['error']
+        records.append(record)
+
+    server.remove_dataset_store(dataset_id)
+    for record in records:
+        record.update({'target_rows': n_rows, 'rows': rows, 'customers': customers})
+    return records
+
+def record_key(record):
+    return record['target_rows'], record['stage'], record.get('method')
+
+def print_results(records, baseline=None):
+    baseline = {record_key(record): record for record in (baseline or [])}
+    print(f"{'rows':>12} {'stage':<26} {'method':<13} {'seconds':>10} {'peak MB':>10} {'vs baseline':>12}")
+    for record in records:
+        previous = baseline.get(record_key(record))
+        ratio = f"{record['seconds'] / previous['seconds']:.2f}x" if previous and previous['seconds'] else ''
+        print(f"{record['rows']:>12,} {record['stage']:<26} {record.get('method', ''):<13} "
+              f"{record['seconds']:>10.3f} {record['peak_mb']:>10.1f} {ratio:>12}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='target transaction counts')
+    parser.add_argument('--methods', nargs='+', default=DEFAULT_METHODS, choices=DEFAULT_METHODS)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', type=Path, help='results file (default benchmarks/results/<commit>.json)')
+    parser.add_argument('--baseline', type=Path, help='earlier results file to compare against')
+    args = parser.parse_args()
+
+    commit = git_commit()
+    output = args.output or REPO_ROOT / 'benchmarks' / 'results' / f'{commit[:12]}.json'
+
+    tracemalloc.start()
+    records = []
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            for n_rows in sorted(args.sizes):
+                records.extend(run_size(n_rows, args.methods, args.seed, Path(workdir)))
+    finally:
+        tracemalloc.stop()
+        for executor in (server.analysis_executor, server.partition_executor, server.comparison_executor):
+            if executor is not None:
+                executor.shutdown()
+        shutil.rmtree(STORE_DIR, ignore_errors=True)
+
+    report = {
+        'commit': commit,
+        'timestamp': datetime.utcnow().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'seed': args.seed,
+        'results': records
+    }
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+
+    baseline = json.loads(args.baseline.read_text())['results'] if args.baseline else None
+    print_results(records, baseline)
+    print(f"\nResults for commit {commit[:12]} written to {output}")
@@ -1,14 +1,163 @@
 import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
-import random
-import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+import argparse
+import json
+import os
 
-# Set random seed for reproducibility
-np.random.seed(42)
-random.seed(42)
+# Product categories and their characteristics
+PRODUCTS = {
+    'Electronics': {'price_range': (50, 2000), 'seasonal_factor': 1.3},
+    'Clothing': {'price_range': (15, 300), 'seasonal_factor': 1.5},
+    'Home & Garden': {'price_range': (10, 800), 'seasonal_factor': 0.8},
+    'Sports & Outdoors': {'price_range': (20, 500), 'seasonal_factor': 1.2},
+    'Books': {'price_range': (5, 50), 'seasonal_factor': 0.9},
+    'Beauty & Health': {'price_range': (8, 200), 'seasonal_factor': 1.1},
+    'Toys & Games': {'price_range': (10, 150), 'seasonal_factor': 2.0},
+    'Automotive': {'price_range': (25, 1500), 'seasonal_factor': 0.7}
+}
 
-def generate_retail_sales_dataset(n_customers=2500, n_transactions=12000):
+# Customer segments: share of customers, orders per customer and days since last order (inclusive ranges)
+CUSTOMER_SEGMENTS = {
+    'Champions': {'share': 0.15, 'transactions': (15, 30), 'recency_days': (1, 30)},
+    'Loyal_Customers': {'share': 0.20, 'transactions': (10, 20), 'recency_days': (15, 60)},
+    'Potential_Loyalists': {'share': 0.15, 'transactions': (5, 12), 'recency_days': (1, 45)},
+    'New_Customers': {'share': 0.10, 'transactions': (1, 3), 'recency_days': (1, 30)},
+    'Promising': {'share': 0.12, 'transactions': (3, 8), 'recency_days': (1, 40)},
+    'Need_Attention': {'share': 0.08, 'transactions': (6, 15), 'recency_days': (45, 90)},
+    'About_to_Sleep': {'share': 0.07, 'transactions': (2, 6), 'recency_days': (90, 180)},
+    'At_Risk': {'share': 0.06, 'transactions': (8, 18), 'recency_days': (60, 150)},
+    'Cannot_Lose_Them': {'share': 0.04, 'transactions': (10, 25), 'recency_days': (90, 200)},
+    'Lost': {'share': 0.03, 'transactions': (1, 5), 'recency_days': (180, 365)}
+}
+
+HISTORY_DAYS = 730
+ITEMS_PER_ORDER = np.array([1, 2, 3, 4, 5])
+ITEMS_PER_ORDER_WEIGHTS = np.array([0.4, 0.3, 0.15, 0.1, 0.05])
+QUANTITIES = np.array([1, 2, 3, 4, 5])
+QUANTITY_WEIGHTS = np.array([0.6, 0.2, 0.1, 0.06, 0.04])
+AGE_GROUPS = np.array(['18-25', '26-35', '36-45', '46-55', '56-65', '65+'])
+GENDERS = np.array(['Male', 'Female'])
+DAY_NAMES = np.array(['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'])
+
+CATEGORY_NAMES = np.array(list(PRODUCTS))
+CATEGORY_PREFIXES = np.array([name[:3].upper() + '_' for name in PRODUCTS])
+PRICE_LOW = np.array([info['price_range'][0] for info in PRODUCTS.values()], dtype=np.float64)
+PRICE_HIGH = np.array([info['price_range'][1] for info in PRODUCTS.values()], dtype=np.float64)
+
+# Seasonal price multiplier by [category, month]: holiday season uses the category factor, summer 1.1
+SEASONAL_MULTIPLIER = np.ones((len(PRODUCTS), 13))
+SEASONAL_MULTIPLIER[:, [6, 7, 8]] = 1.1
+SEASONAL_MULTIPLIER[:, [11, 12]] = np.array([info['seasonal_factor'] for info in PRODUCTS.values()])[:, None]
+
+SEGMENT_NAMES = list(CUSTOMER_SEGMENTS)
+SEGMENT_TRANSACTIONS = np.array([profile['transactions'] for profile in CUSTOMER_SEGMENTS.values()])
+SEGMENT_RECENCY = np.array([profile['recency_days'] for profile in CUSTOMER_SEGMENTS.values()])
+
+DEFAULT_CHUNK_CUSTOMERS = 50000
+
+def segment_boundaries(n_customers):
+    """Cumulative customer counts per segment; customers are numbered segment by segment"""
+    sizes = [int(n_customers * profile['share']) for profile in CUSTOMER_SEGMENTS.values()]
+    return np.cumsum(sizes)
+
+def chunk_rng(seed, chunk_index, stream):
+    """Independent, reproducible random stream for one part of one chunk"""
+    return np.random.default_rng([seed, chunk_index, stream])
+
+def customer_profiles(boundaries, start, stop, seed, chunk_index):
+    """Segment, order count and recency for customers [start, stop)"""
+    rng = chunk_rng(seed, chunk_index, 0)
+    segment = np.searchsorted(boundaries, np.arange(start, stop), side='right')
+    low, high = SEGMENT_TRANSACTIONS[segment].T
+    avg_transactions = rng.integers(low, high + 1)
+    low, high = SEGMENT_RECENCY[segment].T
+    recency_days = rng.integers(low, high + 1)
+    n_orders = np.maximum(1, rng.poisson(avg_transactions))
+    return segment, recency_days, n_orders
+
+def generate_chunk(boundaries, start, stop, order_offset, seed, chunk_index, end_date):
+    """Transactions of customers [start, stop) as a DataFrame, fully vectorized
+    
+    order_offset is the number of orders generated for all earlier chunks, so order
+    ids stay sequential across chunks generated in any order.
+    """
+    segment, recency_days, n_orders = customer_profiles(boundaries, start, stop, seed, chunk_index)
+    rng = chunk_rng(seed, chunk_index, 1)
+    n_customers = stop - start
+    
+    # Order dates: the most recent at the customer's recency, earlier ones up to 300 days before it
+    order_customer = np.repeat(np.arange(n_customers), n_orders)
+    first_order = np.ones(len(order_customer), dtype=bool)
+    first_order[1:] = np.diff(order_customer) != 0
+    recency = recency_days[order_customer]
+    days_back = np.where(
+        first_order, recency, rng.integers(recency, np.minimum(HISTORY_DAYS, recency + 300) + 1)
+    )
+    
+    # Chronological order within each customer, then sequential order ids
+    chronological = np.lexsort((-days_back, order_customer))
+    order_customer, days_back = order_customer[chronological], days_back[chronological]
+    order_dates = np.datetime64(end_date, 'D') - days_back.astype('timedelta64[D]')
+    order_numbers = order_offset + 1 + np.arange(len(order_customer))
+    
+    # Line items
+    n_items = rng.choice(ITEMS_PER_ORDER, size=len(order_customer), p=ITEMS_PER_ORDER_WEIGHTS)
+    item_order = np.repeat(np.arange(len(order_customer)), n_items)
+    n_rows = len(item_order)
+    category = rng.integers(0, len(PRODUCTS), n_rows)
+    product_number = rng.integers(1000, 10000, n_rows)
+    quantity = rng.choice(QUANTITIES, size=n_rows, p=QUANTITY_WEIGHTS)
+    base_price = PRICE_LOW[category] + (PRICE_HIGH[category] - PRICE_LOW[category]) * rng.random(n_rows)
+    
+    item_dates = order_dates[item_order]
+    months = item_dates.astype('datetime64[M]').astype(np.int64) % 12 + 1
+    years = item_dates.astype('datetime64[Y]').astype(np.int64) + 1970
+    unit_price = np.round(base_price * SEASONAL_MULTIPLIER[category, months], 2)
+    total_amount = np.round(unit_price * quantity, 2)
+    
+    # Demographics are drawn once per customer
+    age_group = rng.integers(0, len(AGE_GROUPS), n_customers)
+    gender = rng.integers(0, len(GENDERS), n_customers)
+    row_customer = order_customer[item_order]
+    
+    customer_ids = pd.Series(np.arange(start + 1, stop + 1)).map('CUST_{:06d}'.format).to_numpy()
+    order_ids = pd.Series(order_numbers).map('ORD_{:08d}'.format).to_numpy()
+    df = pd.DataFrame({
+        'customer_id': customer_ids[row_customer],
+        'order_id': order_ids[item_order],
+        'order_date': np.datetime_as_string(item_dates, unit='D'),
+        'product_id': pd.Series(CATEGORY_PREFIXES[category]) + pd.Series(product_number).astype(str),
+        'product_category': CATEGORY_NAMES[category],
+        'quantity': quantity,
+        'unit_price': unit_price,
+        'total_amount': total_amount,
+        'day_of_week': DAY_NAMES[(item_dates.astype(np.int64) + 3) % 7],
+        'month': months,
+        'year': years,
+        'customer_age_group': AGE_GROUPS[age_group[row_customer]],
+        'customer_gender': GENDERS[gender[row_customer]]
+    })
+    
+    # Shuffle the chunk to make it more realistic
+    return df.iloc[rng.permutation(n_rows)].reset_index(drop=True)
+
+def plan_chunks(n_customers, chunk_customers, seed):
+    """Customer range and order id offset of every chunk"""
+    boundaries = segment_boundaries(n_customers)
+    total_customers = int(boundaries[-1]) if len(boundaries) else 0
+    chunks = []
+    order_offset = 0
+    for chunk_index, start in enumerate(range(0, total_customers, chunk_customers)):
+        stop = min(start + chunk_customers, total_customers)
+        chunks.append((boundaries, start, stop, order_offset, seed, chunk_index))
+        order_offset += int(customer_profiles(boundaries, start, stop, seed, chunk_index)[2].sum())
+    return chunks
+
+def generate_retail_sales_dataset(n_customers=2500, n_transactions=12000, seed=42,
+                                  chunk_customers=DEFAULT_CHUNK_CUSTOMERS):
     """
     Generate a comprehensive retail sales dataset with realistic patterns
     for customer segmentation and RFM analysis.
@@ -18,193 +167,77 @@ def generate_retail_sales_dataset(n_customers=2500, n_transactions=12000):
     - Customer behavior patterns (loyal, churned, new)
     - Product categories with different price ranges
     - Geographic distribution
-    """
-    
-    # Define product categories and their characteristics
-    products = {
-        'Electronics': {'price_range': (50, 2000), 'seasonal_factor': 1.3},
-        'Clothing': {'price_range': (15, 300), 'seasonal_factor': 1.5},
-        'Home & Garden': {'price_range': (10, 800), 'seasonal_factor': 0.8},
-        'Sports & Outdoors': {'price_range': (20, 500), 'seasonal_factor': 1.2},
-        'Books': {'price_range': (5, 50), 'seasonal_factor': 0.9},
-        'Beauty & Health': {'price_range': (8, 200), 'seasonal_factor': 1.1},
-        'Toys & Games': {'price_range': (10, 150), 'seasonal_factor': 2.0},
-        'Automotive': {'price_range': (25, 1500), 'seasonal_factor': 0.7}
-    }
-    
-    # Generate customer profiles with different segments
-    customer_segments = {
-        'Champions': 0.15,      # 15% - High value, frequent, recent
-        'Loyal_Customers': 0.20, # 20% - High frequency, moderate value
-        'Potential_Loyalists': 0.15, # 15% - Recent, good frequency
-        'New_Customers': 0.10,   # 10% - Recent but low frequency
-        'Promising': 0.12,       # 12% - Recent, moderate value
-        'Need_Attention': 0.08,  # 8% - Above average frequency but declining
-        'About_to_Sleep': 0.07,  # 7% - Low recency and frequency
-        'At_Risk': 0.06,         # 6% - High value but declining activity
-        'Cannot_Lose_Them': 0.04, # 4% - High value, low activity
-        'Lost': 0.03             # 3% - Lowest recency, frequency, and value
-    }
     
-    customers = []
-    customer_id_counter = 1
-    
-    for segment, proportion in customer_segments.items():
-        segment_size = int(n_customers * proportion)
-        
-        for _ in range(segment_size):
-            customer_id = f"CUST_{customer_id_counter:06d}"
-            
-            # Define segment characteristics
-            if segment == 'Champions':
-                avg_transactions = random.randint(15, 30)
-                avg_order_value = random.uniform(200, 800)
-                recency_days = random.randint(1, 30)
-            elif segment == 'Loyal_Customers':
-                avg_transactions = random.randint(10, 20)
-                avg_order_value = random.uniform(150, 500)
-                recency_days = random.randint(15, 60)
-            elif segment == 'Potential_Loyalists':
-                avg_transactions = random.randint(5, 12)
-                avg_order_value = random.uniform(100, 400)
-                recency_days = random.randint(1, 45)
-            elif segment == 'New_Customers':
-                avg_transactions = random.randint(1, 3)
-                avg_order_value = random.uniform(80, 300)
-                recency_days = random.randint(1, 30)
-            elif segment == 'Promising':
-                avg_transactions = random.randint(3, 8)
-                avg_order_value = random.uniform(120, 350)
-                recency_days = random.randint(1, 40)
-            elif segment == 'Need_Attention':
-                avg_transactions = random.randint(6, 15)
-                avg_order_value = random.uniform(100, 300)
-                recency_days = random.randint(45, 90)
-            elif segment == 'About_to_Sleep':
-                avg_transactions = random.randint(2, 6)
-                avg_order_value = random.uniform(80, 250)
-                recency_days = random.randint(90, 180)
-            elif segment == 'At_Risk':
-                avg_transactions = random.randint(8, 18)
-                avg_order_value = random.uniform(300, 700)
-                recency_days = random.randint(60, 150)
-            elif segment == 'Cannot_Lose_Them':
-                avg_transactions = random.randint(10, 25)
-                avg_order_value = random.uniform(400, 1000)
-                recency_days = random.randint(90, 200)
-            else:  # Lost
-                avg_transactions = random.randint(1, 5)
-                avg_order_value = random.uniform(50, 200)
-                recency_days = random.randint(180, 365)
-            
-            customers.append({
-                'customer_id': customer_id,
-                'segment': segment,
-                'avg_transactions': avg_transactions,
-                'avg_order_value': avg_order_value,
-                'recency_days': recency_days
-            })
-            
-            customer_id_counter += 1
+    The number of transactions follows from the customer segment profiles;
+    n_transactions is kept for compatibility. For large datasets use
+    write_retail_sales_dataset, which streams chunks to disk.
+    """
+    end_date = datetime.now().date()
+    chunks = [generate_chunk(*chunk, end_date) for chunk in plan_chunks(n_customers, chunk_customers, seed)]
+    df = pd.concat(chunks, ignore_index=True)
     
-    # Generate transactions
-    transactions = []
-    product_list = list(products.keys())
+    # Shuffle the dataframe to make it more realistic
+    return df.sample(frac=1, random_state=seed).reset_index(drop=True)
+
+def _generate_chunk_job(args):
+    return generate_chunk(*args)
+
+def write_retail_sales_dataset(path, n_customers, output_format=None, seed=42,
+                               chunk_customers=DEFAULT_CHUNK_CUSTOMERS, workers=None):
+    """
+    Generate the dataset chunk by chunk across processes and stream it to CSV or Parquet.
     
-    # Define date range (last 2 years)
-    end_date = datetime.now()
-    start_date = end_date - timedelta(days=730)
+    Every chunk has its own seed, so the output does not depend on the number of
+    workers. At most two chunks per worker are held in memory at a time.
+    Returns summary statistics accumulated over the chunks.
+    """
+    path = Path(path)
+    output_format = output_format or ('parquet' if path.suffix == '.parquet' else 'csv')
+    workers = workers or os.cpu_count() or 1
+    end_date = datetime.now().date()
+    jobs = [(*chunk, end_date) for chunk in plan_chunks(n_customers, chunk_customers, seed)]
     
-    transaction_id_counter = 1
+    summary = {'rows': 0, 'customers': 0, 'orders': 0, 'revenue': 0.0, 'start_date': None, 'end_date': None}
+    category_stats = []
+    parquet_writer = None
     
-    for customer in customers:
-        customer_id = customer['customer_id']
-        n_orders = max(1, int(np.random.poisson(customer['avg_transactions'])))
-        
-        # Generate order dates based on recency
-        last_order_date = end_date - timedelta(days=customer['recency_days'])
-        order_dates = []
+    def write(df, first):
+        nonlocal parquet_writer
+        if output_format == 'parquet':
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if parquet_writer is None:
+                parquet_writer = pq.ParquetWriter(path, table.schema)
+            parquet_writer.write_table(table)
+        else:
+            df.to_csv(path, mode='w' if first else 'a', header=first, index=False)
         
-        for i in range(n_orders):
-            if i == 0:  # Most recent order
-                order_date = last_order_date
-            else:
-                # Previous orders distributed over the period
-                days_back = random.randint(customer['recency_days'], 
-                                         min(730, customer['recency_days'] + 300))
-                order_date = end_date - timedelta(days=days_back)
-            
-            order_dates.append(order_date)
-        
-        order_dates.sort()  # Sort chronologically
-        
-        for order_date in order_dates:
-            order_id = f"ORD_{transaction_id_counter:08d}"
-            
-            # Determine number of products in this order (1-5 items)
-            n_products = random.choices([1, 2, 3, 4, 5], weights=[0.4, 0.3, 0.15, 0.1, 0.05])[0]
-            
-            order_total = 0
-            
-            for _ in range(n_products):
-                # Select product category
-                category = random.choice(product_list)
-                product_info = products[category]
-                
-                # Generate product details
-                product_id = f"{category[:3].upper()}_{random.randint(1000, 9999)}"
-                quantity = random.choices([1, 2, 3, 4, 5], weights=[0.6, 0.2, 0.1, 0.06, 0.04])[0]
-                
-                # Base price with some variation
-                base_price = random.uniform(product_info['price_range'][0], 
-                                          product_info['price_range'][1])
-                
-                # Apply seasonal factor (higher during holiday seasons)
-                month = order_date.month
-                seasonal_multiplier = 1.0
-                if month in [11, 12]:  # Holiday season
-                    seasonal_multiplier = product_info['seasonal_factor']
-                elif month in [6, 7, 8]:  # Summer season
-                    seasonal_multiplier = 1.1
-                
-                unit_price = round(base_price * seasonal_multiplier, 2)
-                total_amount = round(unit_price * quantity, 2)
-                order_total += total_amount
-                
-                transactions.append({
-                    'customer_id': customer_id,
-                    'order_id': order_id,
-                    'order_date': order_date.strftime('%Y-%m-%d'),
-                    'product_id': product_id,
-                    'product_category': category,
-                    'quantity': quantity,
-                    'unit_price': unit_price,
-                    'total_amount': total_amount
-                })
-            
-            transaction_id_counter += 1
-    
-    # Convert to DataFrame
-    df = pd.DataFrame(transactions)
+        summary['rows'] += len(df)
+        summary['customers'] += df['customer_id'].nunique()
+        summary['orders'] += df['order_id'].nunique()
+        summary['revenue'] += float(df['total_amount'].sum())
+        dates = [summary['start_date'], summary['end_date'], df['order_date'].min(), df['order_date'].max()]
+        summary['start_date'] = min(filter(None, dates))
+        summary['end_date'] = max(filter(None, dates))
+        category_stats.append(df.groupby('product_category')['total_amount'].agg(['count', 'sum']))
     
-    # Add some additional realistic features
-    df['day_of_week'] = pd.to_datetime(df['order_date']).dt.day_name()
-    df['month'] = pd.to_datetime(df['order_date']).dt.month
-    df['year'] = pd.to_datetime(df['order_date']).dt.year
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            window = 2 * workers
+            for batch_start in range(0, len(jobs), window):
+                batch = jobs[batch_start:batch_start + window]
+                for offset, df in enumerate(executor.map(_generate_chunk_job, batch)):
+                    write(df, batch_start + offset == 0)
+    finally:
+        if parquet_writer is not None:
+            parquet_writer.close()
     
-    # Add customer demographics (simplified)
-    df['customer_age_group'] = df['customer_id'].apply(
-        lambda x: random.choice(['18-25', '26-35', '36-45', '46-55', '56-65', '65+'])
-    )
-    
-    df['customer_gender'] = df['customer_id'].apply(
-        lambda x: random.choice(['Male', 'Female'])
-    )
-    
-    # Shuffle the dataframe to make it more realistic
-    df = df.sample(frac=1, random_state=42).reset_index(drop=True)
-    
-    return df
+    categories = pd.concat(category_stats).groupby(level=0).sum() if category_stats else pd.DataFrame()
+    if len(categories):
+        categories['mean'] = categories['sum'] / categories['count']
+    summary['category_stats'] = categories.round(2)
+    return summary
 
 def generate_data_dictionary():
     """Generate a comprehensive data dictionary"""
@@ -285,34 +318,39 @@ def generate_data_dictionary():
     }
 
 if __name__ == "__main__":
-    print("Generating comprehensive retail sales dataset...")
+    parser = argparse.ArgumentParser(description="Generate the synthetic retail sales dataset")
+    parser.add_argument('--customers', type=int, default=2500)
+    parser.add_argument('--output', default='/app/sample_retail_data.csv', help='.csv or .parquet file')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--chunk-customers', type=int, default=DEFAULT_CHUNK_CUSTOMERS)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
     
-    # Generate the dataset
-    df = generate_retail_sales_dataset(n_customers=2500, n_transactions=12000)
+    print("Generating comprehensive retail sales dataset...")
     
-    # Save to CSV
-    df.to_csv('/app/sample_retail_data.csv', index=False)
+    # Generate the dataset, streaming chunks to disk
+    summary = write_retail_sales_dataset(args.output, args.customers, seed=args.seed,
+                                         chunk_customers=args.chunk_customers, workers=args.workers)
     
     # Generate and save data dictionary
     data_dict = generate_data_dictionary()
+    dictionary_path = Path(args.output).with_name('data_dictionary.json')
     
-    with open('/app/data_dictionary.json', 'w') as f:
-        import json
+    with open(dictionary_path, 'w') as f:
         json.dump(data_dict, f, indent=2)
     
     print(f"Dataset generated successfully!")
-    print(f"Total transactions: {len(df):,}")
-    print(f"Unique customers: {df['customer_id'].nunique():,}")
-    print(f"Date range: {df['order_date'].min()} to {df['order_date'].max()}")
-    print(f"Product categories: {df['product_category'].nunique()}")
-    print(f"Total revenue: ${df['total_amount'].sum():,.2f}")
+    print(f"Total transactions: {summary['rows']:,}")
+    print(f"Unique customers: {summary['customers']:,}")
+    print(f"Date range: {summary['start_date']} to {summary['end_date']}")
+    print(f"Product categories: {len(summary['category_stats'])}")
+    print(f"Total revenue: ${summary['revenue']:,.2f}")
     
     # Display sample statistics
     print("\n=== SAMPLE STATISTICS ===")
-    print(f"Average order value: ${df.groupby('order_id')['total_amount'].sum().mean():.2f}")
+    print(f"Average order value: ${summary['revenue'] / summary['orders']:.2f}")
     print(f"Customers by category:")
-    category_stats = df.groupby('product_category')['total_amount'].agg(['count', 'sum', 'mean']).round(2)
-    print(category_stats)
+    print(summary['category_stats'][['count', 'sum', 'mean']])
     
-    print("\nDataset saved as 'sample_retail_data.csv'")
-    print("Data dictionary saved as 'data_dictionary.json'")
\ No newline at end of file
+    print(f"\nDataset saved as '{args.output}'")
+    print(f"Data dictionary saved as '{dictionary_path}'")
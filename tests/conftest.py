@@ -0,0 +1,62 @@
+"""
+Shared setup for the backend tests.
+
+server.py reads MONGO_URL and DB_NAME at import time; the Motor client connects
+lazily, so the tests below never need a running MongoDB.
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'retail_analytics_tests')
+os.environ.setdefault('DATASET_STORE_DIR', tempfile.mkdtemp(prefix='retail_analytics_store_'))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'backend'))
+
+def make_transactions(n_rows: int, n_customers: int, seed: int = 0) -> pd.DataFrame:
+    """Synthetic line items with the columns and dtypes of a normalized upload"""
+    rng = np.random.default_rng(seed)
+    customer = rng.integers(0, n_customers, n_rows)
+    order = rng.integers(0, max(n_rows // 3, 1), n_rows)
+    quantity = rng.integers(1, 5, n_rows)
+    unit_price = rng.gamma(2.0, 20.0, n_rows).round(2)
+    return pd.DataFrame({
+        'customer_id': pd.Series(customer).map('C{:06d}'.format),
+        'order_id': pd.Series(customer * 1000 + order % 1000).map('O{:09d}'.format),
+        'order_date': pd.Timestamp('2023-01-01') + pd.to_timedelta(rng.integers(0, 730, n_rows), unit='D'),
+        'product_id': pd.Series(rng.integers(0, 500, n_rows)).map('P{:04d}'.format),
+        'quantity': quantity.astype(float),
+        'unit_price': unit_price,
+        'total_amount': quantity * unit_price
+    })
+
+def ingest_transactions(dataset_id: str, transactions: pd.DataFrame, chunk_rows: int = 5000):
+    """The upload_dataset path without HTTP and MongoDB: chunks into the store, then the aggregates"""
+    import server
+    
+    ingestor = server.DatasetIngestor(dataset_id)
+    for start in range(0, len(transactions), chunk_rows):
+        ingestor.ingest_chunk(transactions.iloc[start:start + chunk_rows])
+    ingestor.writer.close()
+    server.write_customer_aggregates(dataset_id, ingestor.aggregator.customers, ingestor.aggregator.order_days)
+    return ingestor
+
+@pytest.fixture
+def transactions() -> pd.DataFrame:
+    return make_transactions(20000, 1500)
+
+@pytest.fixture
+def dataset_id(transactions, request) -> str:
+    """A dataset of the transactions fixture ingested into the columnar store"""
+    import server
+    
+    dataset_id = f'test-{request.node.name}'
+    server.remove_dataset_store(dataset_id)
+    ingest_transactions(dataset_id, transactions)
+    yield dataset_id
+    server.remove_dataset_store(dataset_id)
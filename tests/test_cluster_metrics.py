@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+from fastapi import HTTPException
+
+import server
+
+@pytest.fixture
+def clustered():
+    rng = np.random.default_rng(0)
+    X = np.vstack([rng.normal(center, 0.5, size=(500, 3)) for center in (0, 3, 6)])
+    return X, np.repeat(np.arange(3), 500)
+
+def test_bootstrap_batches_match_a_single_draw(clustered, monkeypatch):
+    X, labels = clustered
+    single = server.compute_cluster_metrics(X, labels, bootstrap_samples=200)
+    monkeypatch.setattr(server, 'METRICS_WORKING_MEMORY_MB', 1)
+    batched = server.compute_cluster_metrics(X, labels, bootstrap_samples=200)
+    
+    assert batched['metrics']['silhouette_ci'] == pytest.approx(single['metrics']['silhouette_ci'])
+    ci = single['metrics']['silhouette_ci']
+    assert ci['lower'] <= single['silhouette_score'] <= ci['upper']
+
+@pytest.mark.parametrize('bootstrap_samples', [-1, server.MAX_BOOTSTRAP_SAMPLES + 1])
+def test_bootstrap_samples_are_bounded(bootstrap_samples):
+    with pytest.raises(HTTPException) as error:
+        server.clustering_parameters('kmeans', 'auto', None, 'auto', None, bootstrap_samples)
+    assert error.value.status_code == 400
+
+@pytest.mark.parametrize('metrics_sample_size', [0, 1])
+def test_metrics_sample_size_is_validated(metrics_sample_size):
+    with pytest.raises(HTTPException) as error:
+        server.clustering_parameters('kmeans', 'auto', None, 'auto', metrics_sample_size, 0)
+    assert error.value.status_code == 400
+    assert 'metrics_sample_size' in error.value.detail
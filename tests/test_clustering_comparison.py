@@ -0,0 +1,27 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+import server
+
+def test_unknown_methods_are_rejected():
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(server.compare_clustering_methods('dataset', methods='kmeans,spectral'))
+    assert error.value.status_code == 400
+    assert 'spectral' in error.value.detail
+
+def test_parameters_are_built_once_for_all_methods(monkeypatch):
+    calls = []
+    
+    async def execute(dataset_id, methods, parameters):
+        calls.append((methods, parameters))
+        return {'comparison': []}
+    
+    monkeypatch.setattr(server, 'execute_clustering_comparison', execute)
+    asyncio.run(server.compare_clustering_methods('dataset', methods='gmm, kmeans,gmm', bootstrap_samples=100))
+    
+    (methods, parameters), = calls
+    assert methods == ['gmm', 'kmeans']
+    assert 'method' not in parameters
+    assert parameters['bootstrap_samples'] == 100
@@ -0,0 +1,31 @@
+import pyarrow.parquet as pq
+import pytest
+
+import server
+
+def test_scores_are_stored_per_analysis(dataset_id):
+    summary_30 = server.score_customer_value(dataset_id, 30, 'clv-30')
+    summary_365 = server.score_customer_value(dataset_id, 365, 'clv-365')
+    
+    scores_30 = pq.read_table(server.customer_scores_path(dataset_id, 'clv-30')).to_pandas()
+    scores_365 = pq.read_table(server.customer_scores_path(dataset_id, 'clv-365')).to_pandas()
+    assert len(scores_30) == len(scores_365) == summary_30['customers_scored']
+    assert scores_30['clv_prediction'].sum() == pytest.approx(summary_30['total_predicted_clv'])
+    assert scores_365['clv_prediction'].sum() == pytest.approx(summary_365['total_predicted_clv'])
+    assert summary_365['total_predicted_clv'] > summary_30['total_predicted_clv']
+
+def test_scores_backfill_order_days(dataset_id):
+    server.score_customer_value(dataset_id, 90, 'reference')
+    customers = server.load_customer_aggregates(dataset_id)
+    server.write_customer_aggregates(dataset_id, customers.drop(columns='order_days'))
+    server.order_day_keys_path(dataset_id).unlink()
+    
+    server.score_customer_value(dataset_id, 90, 'backfilled')
+    reference = pq.read_table(server.customer_scores_path(dataset_id, 'reference')).to_pandas()
+    backfilled = pq.read_table(server.customer_scores_path(dataset_id, 'backfilled')).to_pandas()
+    assert backfilled.equals(reference)
+    
+    stale = server.load_customer_aggregates(dataset_id)
+    order_days = server.load_order_days(dataset_id, stale)
+    assert len(order_days) == customers['order_days'].sum()
+    assert stale['order_days'].equals(customers['order_days'])
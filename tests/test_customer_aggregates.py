@@ -0,0 +1,88 @@
+import asyncio
+
+import pandas as pd
+import pytest
+
+import server
+from server import CustomerAggregator, aggregate_customers
+
+@pytest.mark.parametrize('fanout', [2, 3, 8])
+def test_tree_merge_matches_single_aggregation(transactions, monkeypatch, fanout):
+    monkeypatch.setattr(server, 'CUSTOMER_MERGE_FANOUT', fanout)
+    aggregator = CustomerAggregator()
+    for start in range(0, len(transactions), 997):
+        aggregator.update(transactions.iloc[start:start + 997])
+    
+    expected = aggregate_customers(transactions)
+    # Monetary sums are added in a different order, so compare them to rounding error
+    customers = aggregator.customers.drop(columns='order_days').sort_index()
+    pd.testing.assert_frame_equal(customers, expected, rtol=1e-12)
+    assert len(aggregator) == len(expected)
+
+def test_empty_aggregator():
+    aggregator = CustomerAggregator()
+    assert aggregator.customers is None
+    assert len(aggregator) == 0
+
+def test_restore_published_aggregates(transactions):
+    dataset_id = 'restore-published'
+    before = aggregate_customers(transactions.iloc[:5000])
+    server.dataset_store_path(dataset_id).mkdir(parents=True, exist_ok=True)
+    server.write_customer_aggregates(dataset_id, before)
+    sketches_before = server.quantile_sketches_path(dataset_id).read_bytes()
+    
+    staged = server.stage_customer_aggregates(dataset_id, aggregate_customers(transactions))
+    published = server.publish_staged_files(staged)
+    assert len(server.load_customer_aggregates(dataset_id)) > len(before)
+    
+    server.restore_published_files(published)
+    pd.testing.assert_frame_equal(server.load_customer_aggregates(dataset_id), before)
+    assert server.quantile_sketches_path(dataset_id).read_bytes() == sketches_before
+    assert not any(path.name.endswith(('.tmp', '.bak')) for path in server.dataset_store_path(dataset_id).iterdir())
+
+def expected_order_days(transactions: pd.DataFrame) -> pd.Series:
+    days = transactions['order_date'].dt.normalize()
+    return days.groupby(transactions['customer_id']).nunique()
+
+def test_order_days_are_distinct_across_chunks(transactions):
+    aggregator = CustomerAggregator()
+    for start in range(0, len(transactions), 1234):
+        aggregator.update(transactions.iloc[start:start + 1234])
+    
+    order_days = aggregator.customers['order_days'].sort_index()
+    pd.testing.assert_series_equal(order_days, expected_order_days(transactions), check_names=False, check_dtype=False)
+    assert len(aggregator.order_days) == order_days.sum()
+    assert (order_days < aggregator.customers['frequency'].sort_index()).any()
+
+def test_order_days_seeded_from_previous_upload(transactions):
+    first, second = transactions.iloc[:12000], transactions.iloc[12000:]
+    previous = CustomerAggregator()
+    previous.update(first)
+    
+    keys = server.OrderDayKeys(previous.order_days.keys())
+    appended = CustomerAggregator(order_days=keys)
+    appended.update(second)
+    merged = server.merge_customer_aggregates(previous.customers, appended.customers)
+    
+    pd.testing.assert_series_equal(
+        merged['order_days'].sort_index(), expected_order_days(transactions), check_names=False, check_dtype=False
+    )
+
+def test_clv_inputs_use_order_days(transactions):
+    aggregator = CustomerAggregator()
+    aggregator.update(transactions)
+    customers = aggregator.customers
+    x, _, _, mean_value = server.clv_inputs(customers, customers['last_order_date'].max())
+    
+    assert (x == customers['order_days'] - 1).all()
+    assert mean_value == pytest.approx((customers['monetary'] / customers['order_days']).to_numpy())
+
+def test_partitioned_aggregation_matches_single(transactions, monkeypatch):
+    monkeypatch.setattr(server, 'RFM_PARTITION_MIN_ROWS', 0)
+    df = server.coerce_rfm_columns(transactions[server.RFM_COLUMNS].copy())
+    try:
+        partitioned = asyncio.run(server.aggregate_customers_partitioned(df, n_shards=3))
+    finally:
+        server.get_partition_executor().shutdown()
+        server.partition_executor = None
+    pd.testing.assert_frame_equal(partitioned, aggregate_customers(df), check_exact=True)
@@ -0,0 +1,27 @@
+import numpy as np
+import pytest
+from sklearn.neighbors import NearestNeighbors
+
+import server
+
+@pytest.fixture
+def X_scaled():
+    rng = np.random.default_rng(0)
+    return np.vstack([rng.normal(center, 0.3, size=(1500, 3)) for center in (0, 2, 4)])
+
+def test_explicit_eps_is_capped_to_bounded_graph(X_scaled, monkeypatch):
+    monkeypatch.setattr(server, 'DBSCAN_MAX_MEAN_NEIGHBORS', 50)
+    results = server.density_clustering(X_scaled, eps=100.0)
+    
+    cap = results['eps_capped']['cap']
+    assert results['eps_capped']['requested'] == 100.0
+    assert [entry['eps'] for entry in results['eps_sweep']] == [cap]
+    graph = NearestNeighbors().fit(X_scaled).radius_neighbors_graph(radius=cap)
+    assert graph.nnz / len(X_scaled) < 2 * 50
+
+def test_knee_candidates_are_kept_below_the_cap(X_scaled):
+    results = server.density_clustering(X_scaled)
+    
+    assert 'eps_capped' not in results
+    knee = results['k_distance']['knee_eps']
+    assert [entry['eps'] for entry in results['eps_sweep']] == pytest.approx([knee * f for f in server.DBSCAN_EPS_FACTORS])
@@ -0,0 +1,31 @@
+import time
+
+import numpy as np
+
+import server
+
+def allocate(n_bytes: int):
+    block = np.ones(n_bytes // 8)
+    time.sleep(0.05)
+    return float(block[-1])
+
+def test_stage_memory_is_measured_per_stage():
+    timer = server.StageTimer()
+    with timer.stage('large'):
+        allocate(200 * 2 ** 20)
+    with timer.stage('small'):
+        allocate(2 * 2 ** 20)
+    
+    large, small = timer.stages
+    assert large['rss_delta_bytes'] >= 150 * 2 ** 20
+    assert small['rss_delta_bytes'] < 50 * 2 ** 20
+    assert small['peak_rss_bytes'] < large['peak_rss_bytes']
+    assert timer.summary()['peak_rss_bytes'] == large['peak_rss_bytes']
+
+def test_sampler_catches_peaks_freed_before_stage_end():
+    window = server.rss_sampler.open()
+    allocate(200 * 2 ** 20)
+    server.rss_sampler.close(window)
+    
+    assert window['peak'] - window['start'] >= 150 * 2 ** 20
+    assert server.current_rss_bytes() < window['peak']
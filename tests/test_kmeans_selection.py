@@ -0,0 +1,24 @@
+import numpy as np
+import pytest
+from fastapi import HTTPException
+
+import server
+
+@pytest.fixture
+def X_scaled():
+    rng = np.random.default_rng(0)
+    return np.vstack([rng.normal(center, 0.2, size=(300, 3)) for center in (0, 4)])
+
+def test_early_stopping_skips_fits_with_many_workers(X_scaled):
+    full = server.select_kmeans_k(X_scaled, n_jobs=16)
+    stopped = server.select_kmeans_k(X_scaled, early_stopping_rounds=1, n_jobs=16)
+    
+    assert full['elbow_data']['k_values'] == list(server.KMEANS_K_RANGE)
+    assert stopped['elbow_data']['k_values'] == [2, 3]
+    assert stopped['optimal_k'] == full['optimal_k'] == 2
+
+@pytest.mark.parametrize('early_stopping_rounds', [-1, 0])
+def test_early_stopping_rounds_must_be_positive(early_stopping_rounds):
+    with pytest.raises(HTTPException) as error:
+        server.clustering_parameters('kmeans', 'auto', early_stopping_rounds, 'auto', None, 0)
+    assert error.value.status_code == 400
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+import server
+from server import QuantileSketch
+
+QS = np.linspace(0.01, 0.99, 99)
+
+def rank_error(values: np.ndarray, estimates: np.ndarray) -> float:
+    """Largest distance between the target quantiles and the normalized ranks of the estimates"""
+    ordered = np.sort(values)
+    low = np.searchsorted(ordered, estimates, side='left') / len(values)
+    high = np.searchsorted(ordered, estimates, side='right') / len(values)
+    return float(np.max(np.maximum(low - QS, 0) + np.maximum(QS - high, 0)))
+
+@pytest.mark.parametrize('seed', range(3))
+def test_merged_sketch_stays_within_error_bound(seed):
+    rng = np.random.default_rng(seed)
+    values = np.concatenate([rng.lognormal(5, 1.2, 150000), rng.integers(1, 50, 150000).astype(float)])
+    rng.shuffle(values)
+    
+    sketch = QuantileSketch(seed=seed)
+    for start in range(0, len(values), 20000):
+        sketch.merge(QuantileSketch(seed=start).update(values[start:start + 20000]))
+    
+    assert sketch.count == len(values)
+    assert sum(len(level) for level in sketch.levels) < len(values) / 20
+    assert rank_error(values, sketch.quantiles(QS)) <= server.QUANTILE_SKETCH_ERROR
+
+def test_sketch_is_exact_before_compaction():
+    values = np.random.default_rng(0).normal(size=server.QUANTILE_SKETCH_K // 2)
+    np.testing.assert_allclose(QuantileSketch().update(values).quantiles(QS), np.quantile(values, QS))
+
+def test_sketch_round_trips_and_counts_missing():
+    values = np.random.default_rng(1).normal(size=50000)
+    values[::10] = np.nan
+    sketch = QuantileSketch().update(values)
+    restored = QuantileSketch.from_dict(server.to_json_compatible(sketch.to_dict()))
+    
+    assert restored.missing == sketch.missing == 5000
+    np.testing.assert_array_equal(restored.quantiles(QS), sketch.quantiles(QS))
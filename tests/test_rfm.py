@@ -0,0 +1,21 @@
+import asyncio
+import threading
+
+import pandas as pd
+
+import server
+
+def test_load_rfm_frame_runs_off_the_event_loop(dataset_id, transactions, monkeypatch):
+    threads = []
+    rfm_without_outliers = server.rfm_without_outliers
+    
+    def recording(*args, **kwargs):
+        threads.append(threading.current_thread())
+        return rfm_without_outliers(*args, **kwargs)
+    
+    monkeypatch.setattr(server, 'rfm_without_outliers', recording)
+    rfm = asyncio.run(server.load_rfm_frame(dataset_id))
+    
+    assert threads and threading.main_thread() not in threads
+    expected = server.calculate_rfm_metrics(transactions.copy())
+    pd.testing.assert_frame_equal(rfm.sort_index(), expected.sort_index(), check_names=False, rtol=1e-12)
@@ -0,0 +1,23 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.rfm_scoring import reference_segments, synthetic_rfm, vectorized_segments
+
+def assert_parity(rfm_df: pd.DataFrame):
+    expected = reference_segments(rfm_df).to_numpy()
+    np.testing.assert_array_equal(vectorized_segments(rfm_df), expected)
+
+@pytest.mark.parametrize('n_customers', [2, 7, 1000, 50000])
+def test_vectorized_segments_match_row_wise(n_customers):
+    assert_parity(synthetic_rfm(n_customers))
+
+def test_all_ties():
+    assert_parity(pd.DataFrame({'recency': [5] * 9, 'frequency': [1] * 9, 'monetary': [10.0] * 9}))
+
+def test_missing_value_only_affects_its_customer():
+    # The row-wise version turned the whole dimension's categorical scores into '4.0'-style strings
+    with_missing = synthetic_rfm(1000)
+    with_missing.loc[::17, 'recency'] = np.nan
+    assert (vectorized_segments(with_missing)[::17] == 'Lost').all()
+    assert_parity(with_missing.dropna())
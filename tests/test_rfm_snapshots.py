@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+
+import server
+
+def recompute_distribution(transactions: pd.DataFrame, reference_date: pd.Timestamp):
+    """RFM segment counts from only the transactions before reference_date, computed directly"""
+    before = transactions[transactions['order_date'] < reference_date]
+    customers = server.aggregate_customers(before)
+    rfm = server.remove_rfm_outliers(pd.DataFrame({
+        'recency': (reference_date - customers['last_order_date']).dt.days,
+        'frequency': customers['frequency'],
+        'monetary': customers['monetary']
+    }))
+    codes = server.assign_rfm_segments(
+        server.quartile_scores(rfm['recency'], reverse=True),
+        server.quartile_scores(rfm['frequency']),
+        server.quartile_scores(rfm['monetary'])
+    )
+    names, counts = np.unique(server.RFM_SEGMENT_NAMES[codes], return_counts=True)
+    return len(customers), dict(zip(names, counts.tolist()))
+
+def test_snapshots_match_per_date_recompute(transactions):
+    results = server.rfm_snapshots(transactions.copy(), snapshots=6, interval='quarter')
+    
+    for snapshot in results['snapshots']:
+        total, distribution = recompute_distribution(transactions, pd.Timestamp(snapshot['reference_date']))
+        assert snapshot['total_customers'] == total
+        assert snapshot['segment_distribution'] == distribution
+
+def test_last_snapshot_matches_single_rfm_run(transactions):
+    results = server.rfm_snapshots(transactions.copy(), snapshots=3, interval='month')
+    segmented = server.perform_rfm_segmentation(server.calculate_rfm_metrics(transactions.copy()))
+    
+    assert results['snapshots'][-1]['segment_distribution'] == segmented['segment_distribution']
+
+def test_transitions_follow_customers_between_snapshots(transactions):
+    results = server.rfm_snapshots(transactions.copy(), snapshots=4, interval='quarter')
+    
+    for transition, before, after in zip(results['transitions'], results['snapshots'], results['snapshots'][1:]):
+        counts = np.asarray(transition['counts'])
+        not_customer = transition['states'].index('Not Yet Customer')
+        assert counts.sum() == results['total_customers']
+        assert counts.sum(axis=1)[not_customer] == results['total_customers'] - before['total_customers']
+        assert counts.sum(axis=0)[not_customer] == results['total_customers'] - after['total_customers']
+        assert counts[:not_customer, not_customer].sum() == 0
@@ -0,0 +1,38 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import pandas as pd
+
+import server
+
+class FakeCursor:
+    """Motor cursor stand-in serving documents in fixed-size batches"""
+
+    def __init__(self, documents):
+        self.documents = documents
+
+    async def to_list(self, length):
+        batch, self.documents = self.documents[:length], self.documents[length:]
+        return batch
+
+def test_load_sales_columns_decodes_batches_off_the_event_loop(transactions, monkeypatch):
+    documents = transactions[server.RFM_COLUMNS].astype({'order_date': str}).to_dict('records')
+    fake_db = SimpleNamespace(sales_data=SimpleNamespace(find=lambda *args, **kwargs: FakeCursor(documents)))
+    monkeypatch.setattr(server, 'db', fake_db)
+    
+    threads = []
+    columns_from_batch = server._columns_from_batch
+    
+    def recording(*args):
+        threads.append(threading.current_thread())
+        return columns_from_batch(*args)
+    
+    monkeypatch.setattr(server, '_columns_from_batch', recording)
+    df = asyncio.run(server.load_sales_columns('legacy', server.RFM_COLUMNS, batch_size=3000))
+    
+    assert len(threads) == -(-len(transactions) // 3000)
+    assert threading.main_thread() not in threads
+    pd.testing.assert_series_equal(df['total_amount'], transactions['total_amount'])
+    pd.testing.assert_series_equal(df['order_date'], transactions['order_date'], check_dtype=False)
+    assert (df['customer_id'].astype(str) == transactions['customer_id']).all()
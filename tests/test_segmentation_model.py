@@ -0,0 +1,17 @@
+import numpy as np
+import pytest
+
+import server
+
+@pytest.fixture
+def rfm_df(transactions):
+    return server.calculate_rfm_metrics(transactions.copy())
+
+@pytest.mark.parametrize('method', ['kmeans', 'gmm'])
+def test_model_reproduces_fitted_labels(rfm_df, method):
+    results = server.perform_advanced_clustering(rfm_df, method, n_clusters=4)
+    model = server.SegmentationModel({'id': method, **results['segmentation_model']})
+    
+    X = rfm_df[['recency', 'frequency', 'monetary']].to_numpy(dtype=np.float64)
+    np.testing.assert_array_equal(model.predict_clusters(X), results['cluster_labels'])
+    assert (model.mixture is not None) == (method == 'gmm')